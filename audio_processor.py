@@ -1,35 +1,56 @@
 # audio_processor.py
-from moviepy.editor import AudioFileClip, concatenate_audioclips
+import os
+from collections import namedtuple
+from media_probe import probe_media
+from ffmpeg_tools import run_ffmpeg
 import logging
 
 logger = logging.getLogger(__name__)
 
-def load_audio_clip(path, mode="cut", video_duration=0, fade_in_duration=1.0, fade_out_duration=1.0):
-    try:
-        logger.info("Загрузка аудио: %s", path)
-        clip = AudioFileClip(path)
-        logger.debug("Длительность исходного аудио: %.2f сек", clip.duration)
-
-        if mode == "cut":
-            if clip.duration > video_duration:
-                logger.debug("Аудио будет обрезано до %.2f сек", video_duration)
-                clip = clip.subclip(0, video_duration)
-            clip = clip.audio_fadein(fade_in_duration).audio_fadeout(fade_out_duration)
-            logger.info("Применен режим обработки аудио: cut, с эффектами fade-in и fade-out")
-
-        elif mode == "loop":
-            repeat_count = int(video_duration // clip.duration) + 1
-            logger.debug("Аудио повторено %d раз", repeat_count)
-            clips = [clip] * repeat_count
-            clip = concatenate_audioclips(clips).subclip(0, video_duration)
-            clip = clip.audio_fadein(fade_in_duration).audio_fadeout(fade_out_duration)
-            logger.info("Применен режим обработки аудио: loop, с эффектами fade-in и fade-out")
-
-        else:
-            logger.warning("Неизвестный режим обработки аудио: %s", mode)
-
-        return clip
-
-    except Exception as e:
-        logger.exception("Ошибка при обработке аудиофайла: %s", e)
-        raise
+# Готовая аудиодорожка: файл, который склеивается с видео без перекодирования, и её длительность в видео
+AudioTrack = namedtuple("AudioTrack", ["path", "duration"])
+
+# Кодеки, которые контейнер MP4 принимает при копировании потока (-c copy)
+MP4_AUDIO_CODECS = {"aac", "mp3", "alac", "ac3", "eac3"}
+
+
+def audio_filter_chain(duration, fade_in_duration=1.0, fade_out_duration=1.0):
+    """Цепочка фильтров ffmpeg: обрезка до duration и fade-in/out (нулевая длительность — без эффекта)."""
+    steps = ["atrim=0:%g" % duration, "asetpts=PTS-STARTPTS"]
+    if fade_in_duration > 0:
+        steps.append("afade=t=in:st=0:d=%g" % fade_in_duration)
+    if fade_out_duration > 0:
+        steps.append("afade=t=out:st=%g:d=%g" % (max(duration - fade_out_duration, 0), fade_out_duration))
+    return ",".join(steps)
+
+
+def render_audio_track(path, mode="cut", video_duration=0, workdir=".", fade_in_duration=1.0,
+                       fade_out_duration=1.0):
+    """
+    Готовит итоговую аудиодорожку один раз, отдельным процессом ffmpeg, до кодирования видео.
+    Видео затем кодируется без звука, а дорожка добавляется при склейке копированием потока.
+
+    Если обработка не нужна (нет fade, аудио не зацикливается) и кодек допустим в MP4,
+    возвращается исходный файл без изменений — его обрезает до длины видео сама склейка.
+    Иначе обрезка/зацикливание и fade выполняются фильтрами, результат — AAC в workdir.
+    Возвращает AudioTrack.
+    """
+    info = probe_media(path)
+    if mode not in ("cut", "loop"):
+        logger.warning("Неизвестный режим обработки аудио: %s", mode)
+        mode, fade_in_duration, fade_out_duration = "cut", 0, 0
+
+    loop = mode == "loop" and info.duration < video_duration
+    duration = video_duration if loop else min(info.duration, video_duration)
+
+    if not loop and not fade_in_duration and not fade_out_duration and info.codec in MP4_AUDIO_CODECS:
+        logger.info("Аудио используется без перекодирования (%s): %s", info.codec, path)
+        return AudioTrack(path, duration)
+
+    output_path = os.path.join(workdir, "audio.m4a")
+    args = ["-stream_loop", "-1"] if loop else []
+    args += ["-i", path, "-vn", "-af", audio_filter_chain(duration, fade_in_duration, fade_out_duration),
+             "-c:a", "aac", output_path]
+    run_ffmpeg(args)
+    logger.info("Аудиодорожка подготовлена (%s, %.2f сек): %s", mode, duration, output_path)
+    return AudioTrack(output_path, duration)
@@ -0,0 +1,247 @@
+# benchmarks/suite.py
+"""
+Бенчмарк горячих путей рендера на синтетических данных: загрузка изображений, zoom-in/zoom-out,
+переходы slide/push (moviepy и TransitionRenderer) и полный run_vvm.
+
+Каждый этап выполняется в отдельном процессе, поэтому пиковая память (RSS) относится к этапу.
+Результат пишется в JSON; при заданном --baseline этапы, ставшие медленнее (или тяжелее)
+больше чем на --threshold, считаются регрессией, и процесс завершается с кодом 1.
+
+Запуск: python -m benchmarks.suite [--images N] [--source-size 4000x3000] [--output results.json]
+                                     [--baseline baseline.json] [--threshold 0.2]
+"""
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from cli import parse_resolution
+from metrics import peak_rss_bytes
+
+STAGES = ("load_images", "zoom_in", "zoom_out", "slide", "push", "render")
+
+# Метрики, по которым ищутся регрессии (больше — хуже)
+COMPARED_METRICS = ("seconds", "peak_rss_mb")
+
+
+def make_images(directory, count, size, seed=0):
+    """Синтетические JPEG: плавный градиент с шумом (сжимается как фотография, а не как заливка)."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    paths = []
+    for idx in range(count):
+        small = rng.integers(0, 256, (max(height // 16, 1), max(width // 16, 1), 3), dtype=np.uint8)
+        noise = np.asarray(Image.fromarray(small).resize(size, Image.BILINEAR), dtype=np.float32)
+        pixels = np.clip(0.5 * noise + 0.5 * gradient, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, "image_%03d.jpg" % idx)
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def make_audio(path, seconds, rate=44100):
+    """Синтетический стерео WAV: тон 440 Гц."""
+    t = np.arange(int(seconds * rate)) / rate
+    tone = (0.3 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(np.repeat(tone[:, None], 2, axis=1).tobytes())
+    return path
+
+
+def _peak_rss_mb():
+    # Пик процесса этапа или его самого крупного дочернего процесса (ffmpeg); None — платформа не сообщает
+    peaks = [peak for peak in (peak_rss_bytes(), peak_rss_bytes(children=True)) if peak is not None]
+    return round(max(peaks) / 1024.0 ** 2, 1) if peaks else None
+
+
+def _frames_metrics(seconds, frames):
+    return {"seconds": round(seconds, 4), "frames": frames, "frames_per_sec": round(frames / seconds, 2)}
+
+
+def _stage_load_images(config):
+    from image_processor import load_and_process_images
+    start = time.perf_counter()
+    images = load_and_process_images(config["image_dir"], text="Benchmark", size=config["resolution"])
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 4), "images": len(images),
+            "seconds_per_image": round(seconds / max(len(images), 1), 4)}
+
+
+def _prepared_images(config, count):
+    from image_processor import load_and_process_images
+    return load_and_process_images(config["image_dir"], size=config["resolution"])[:count]
+
+
+def _stage_zoom(config, factory_name):
+    import video_maker
+    factory = getattr(video_maker, factory_name)
+    img = _prepared_images(config, 1)[0]
+    duration, fps = config["duration"], config["fps"]
+    frames = int(duration * fps)
+
+    start = time.perf_counter()
+    make_frame = factory(img, None, 0.2, duration, config["resolution"])
+    for k in range(frames):
+        make_frame(k / fps)
+    return _frames_metrics(time.perf_counter() - start, frames)
+
+
+def _stage_transition(config, name):
+    from moviepy.editor import ImageClip
+    from utils import slide_transition, push_transition, TransitionRenderer
+    old, new = (np.asarray(img) for img in _prepared_images(config, 2))
+    td, fps = config["transition_duration"], config["fps"]
+    times = np.arange(int(td * fps)) / fps
+    make = slide_transition if name == "slide" else push_transition
+
+    clip = make(ImageClip(old).set_duration(td), ImageClip(new).set_duration(td), duration=td)
+    start = time.perf_counter()
+    for t in times:
+        clip.get_frame(t)
+    result = _frames_metrics(time.perf_counter() - start, len(times))
+
+    renderer = TransitionRenderer()
+    start = time.perf_counter()
+    for t in times:
+        renderer.render(name, old, new, t, td)
+    result["renderer_frames_per_sec"] = _frames_metrics(time.perf_counter() - start, len(times))["frames_per_sec"]
+    return result
+
+
+def _stage_render(config):
+    from cli import parse_args
+    from runner import run_vvm
+    output = os.path.join(config["workdir"], "render.mp4")
+    argv = ["--images", config["image_dir"], "--duration", str(config["duration"]), "--fps", str(config["fps"]),
+            "--resolution", "%dx%d" % tuple(config["resolution"]), "--transition", "slide",
+            "--zoom", "0.2", "--text", "Benchmark", "--no-frame-cache", "--output", output]
+    if config.get("audio"):
+        argv += ["--audio", config["audio"]]
+    start = time.perf_counter()
+    run_vvm(parse_args(argv))
+    seconds = time.perf_counter() - start
+    frames = int(round(config["images"] * config["duration"] * config["fps"]))
+    result = _frames_metrics(seconds, frames)
+    result["seconds_per_image"] = round(seconds / config["images"], 4)
+    return result
+
+
+def run_stage(name, config):
+    """Выполняет один этап и возвращает его метрики (вызывается в отдельном процессе)."""
+    if name == "load_images":
+        result = _stage_load_images(config)
+    elif name == "zoom_in":
+        result = _stage_zoom(config, "make_zoom_in_frame_factory")
+    elif name == "zoom_out":
+        result = _stage_zoom(config, "make_zoom_out_frame_factory")
+    elif name in ("slide", "push"):
+        result = _stage_transition(config, name)
+    elif name == "render":
+        result = _stage_render(config)
+    else:
+        raise ValueError("Неизвестный этап бенчмарка: %s" % name)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def run_suite(config, stages=STAGES, isolated=True):
+    """Выполняет этапы по очереди; isolated=True — каждый этап в новом процессе (честная пиковая память)."""
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in stages:
+        if isolated:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[name] = executor.submit(run_stage, name, config).result()
+        else:
+            results[name] = run_stage(name, config)
+        print("%-12s %s" % (name, json.dumps(results[name], ensure_ascii=False)), flush=True)
+    return results
+
+
+def compare_results(current, baseline, threshold=0.2):
+    """
+    Сравнивает этапы с базовым прогоном. Возвращает список регрессий
+    (stage, metric, baseline_value, current_value, ratio) для метрик, выросших больше чем на threshold.
+    """
+    regressions = []
+    for stage, base_metrics in baseline.get("stages", {}).items():
+        metrics = current.get("stages", {}).get(stage)
+        if not metrics:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = base_metrics.get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            if ratio > 1 + threshold:
+                regressions.append((stage, metric, before, after, round(ratio, 3)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов рендера на синтетических данных")
+    parser.add_argument("--images", type=int, default=6, help="Число синтетических изображений")
+    parser.add_argument("--source-size", type=parse_resolution, default=(4000, 3000),
+                        help="Размер синтетических изображений ШИРИНАxВЫСОТА")
+    parser.add_argument("--resolution", type=parse_resolution, default=(1080, 1920), help="Разрешение видео")
+    parser.add_argument("--duration", type=float, default=3.0, help="Длительность показа одного изображения")
+    parser.add_argument("--transition-duration", type=float, default=0.5, help="Длительность перехода")
+    parser.add_argument("--fps", type=int, default=24, help="Кадров в секунду")
+    parser.add_argument("--audio-seconds", type=float, default=0.0,
+                        help="Длительность синтетического аудио для полного рендера (0 — без аудио)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Этапы для запуска")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="Файл результатов JSON")
+    parser.add_argument("--baseline", type=str, help="Базовый JSON для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимый рост времени и памяти относительно базового прогона (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        image_dir = os.path.join(workdir, "images")
+        os.makedirs(image_dir)
+        make_images(image_dir, args.images, args.source_size)
+        audio = make_audio(os.path.join(workdir, "audio.wav"), args.audio_seconds) if args.audio_seconds else None
+
+        config = dict(image_dir=image_dir, workdir=workdir, images=args.images, source_size=args.source_size,
+                      resolution=args.resolution, duration=args.duration, fps=args.fps,
+                      transition_duration=args.transition_duration, audio=audio)
+        stages = run_suite(config, args.stages)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in config.items() if key not in ("image_dir", "workdir", "audio")},
+        "stages": stages,
+    }
+    results["config"]["audio_seconds"] = args.audio_seconds
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print("Результаты записаны: %s" % args.output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for stage, metric, before, after, ratio in regressions:
+            print("РЕГРЕССИЯ %-12s %-12s %10s -> %-10s (x%.2f)" % (stage, metric, before, after, ratio))
+        if regressions:
+            return 1
+        print("Регрессий нет (порог %.0f%%)" % (args.threshold * 100))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
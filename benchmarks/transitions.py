@@ -0,0 +1,54 @@
+# benchmarks/transitions.py
+"""
+Сравнение стоимости кадра перехода: moviepy (CompositeVideoClip для slide/push,
+fadein/fadeout для fade) и TransitionRenderer (для fade — crossfade).
+
+Запуск: python -m benchmarks.transitions [--frames N]
+"""
+import argparse
+import time
+import numpy as np
+from moviepy.editor import ImageClip
+from image_processor import TARGET_SIZE
+from utils import slide_transition, push_transition, TransitionRenderer
+
+
+def _ms_per_frame(render, times):
+    start = time.perf_counter()
+    for t in times:
+        render(t)
+    return (time.perf_counter() - start) * 1000 / len(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк переходов slide/push/crossfade")
+    parser.add_argument("--frames", type=int, default=30, help="Число кадров перехода")
+    parser.add_argument("--duration", type=float, default=0.5, help="Длительность перехода")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    shape = (TARGET_SIZE[1], TARGET_SIZE[0], 3)
+    old, new = (rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(2))
+    times = np.linspace(0, args.duration, args.frames, endpoint=False)
+
+    def fade(old_clip, new_clip, duration):
+        # Текущий fade: затемнение каждого клипа через float-умножение moviepy
+        return old_clip.fadein(duration).fadeout(duration)
+
+    print("Переход      moviepy      массивы   массивы (повтор круга)")
+    for name, make in (("slide", slide_transition), ("push", push_transition), ("crossfade", fade)):
+        clip = make(ImageClip(old).set_duration(args.duration), ImageClip(new).set_duration(args.duration),
+                    duration=args.duration)
+        before = _ms_per_frame(clip.get_frame, times)
+
+        renderer = TransitionRenderer()
+        after = _ms_per_frame(lambda t: renderer.render(name, old, new, t, args.duration), times)
+        # Первый круг заполняет память переходов, второй берёт кадры из неё
+        _ms_per_frame(lambda t: renderer.render(name, old, new, t, args.duration, key=(0, 1)), times)
+        memo = _ms_per_frame(lambda t: renderer.render(name, old, new, t, args.duration, key=(0, 1)), times)
+
+        print("%-9s %9.2f мс %9.2f мс %14.3f мс" % (name, before, after, memo))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,86 @@
 # cli.py
 import argparse
 import logging
+from frame_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
-def parse_args():
+# Множители суффиксов размера: 512M, 1.5G и т.п.
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value):
+    """Преобразует строку размера (например, '500M', '1.5G') в число байт."""
+    text = str(value).strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    number = text[:-1] if unit else text
+    try:
+        size = int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError("Некорректный размер: %s" % value)
+    if size < 0:
+        raise argparse.ArgumentTypeError("Размер не может быть отрицательным: %s" % value)
+    return size
+
+
+def parse_resolution(value):
+    """Преобразует строку разрешения вида '1080x1920' в кортеж (ширина, высота)."""
+    try:
+        width, height = (int(part) for part in str(value).lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Некорректное разрешение: %s (ожидается ШИРИНАxВЫСОТА)" % value)
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError("Разрешение должно быть положительным: %s" % value)
+    return width, height
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Vertical Video Maker")
 
     parser.add_argument("--images", type=str, required=True, help="Путь к каталогу с изображениями")
+    parser.add_argument("--image-workers", type=int, default=1,
+                        help="Количество процессов для параллельной обработки изображений (по умолчанию 1 — последовательно)")
+    parser.add_argument("--lazy-images", action="store_true",
+                        help="Загружать изображения по требованию, не держа все кадры в памяти")
+    parser.add_argument("--frame-cache", type=str, nargs="?", const=DEFAULT_CACHE_DIR, default=None,
+                        help="Включить дисковый кэш подготовленных кадров; без значения — каталог %s"
+                             % DEFAULT_CACHE_DIR.replace("%", "%%"))
+    parser.add_argument("--frame-cache-size", type=parse_size, default=DEFAULT_CACHE_SIZE,
+                        help="Максимальный размер кэша кадров, например 500M или 2G")
+    parser.add_argument("--no-frame-cache", action="store_true", help="Отключить кэш кадров")
+    parser.add_argument("--spill-frames", action="store_true",
+                        help="Экономия памяти: хранить подготовленные кадры во временном каталоге (memory map)")
+    parser.add_argument("--memory-budget", type=parse_size,
+                        help="Бюджет памяти рендера, например 1.5G: кадры выгружаются на диск, число процессов ограничивается")
     parser.add_argument("--audio", type=str, help="Путь к аудиофайлу")
+    parser.add_argument("--audio-fade", type=float, default=1.0,
+                        help="Длительность fade-in/fade-out аудио в секундах (0 — без затухания, дорожка копируется как есть)")
     parser.add_argument("--duration", type=float, default=5.0, help="Длительность показа одного изображения в секундах")
     parser.add_argument("--fps", type=int, default=24, help="Кадров в секунду")
+    parser.add_argument("--resolution", type=parse_resolution, default=(1080, 1920),
+                        help="Разрешение видео ШИРИНАxВЫСОТА (по умолчанию 1080x1920)")
+    parser.add_argument("--preview", action="store_true",
+                        help="Черновой рендер: разрешение в 4 раза меньше, быстрый ресэмплинг, не больше 12 fps, пресет ultrafast")
     parser.add_argument("--bgcolor", type=str, default="black", help="Цвет фона для изображений")
     parser.add_argument("--output", type=str, default="output.mp4", help="Имя выходного видеофайла")
     parser.add_argument("--bitrate", type=str, help="Битрейт, например, 8000k")
     parser.add_argument("--crf", type=int, help="CRF-параметр качества, например, 28")
-    parser.add_argument("--transition", type=str, choices=["none", "fade", "slide", "push"], default="fade", help="Тип перехода между изображениями")
+    parser.add_argument("--transition", type=str, choices=["none", "fade", "crossfade", "slide", "push"], default="fade", help="Тип перехода между изображениями")
     parser.add_argument("--transition-duration", type=float, default=0.5, help="Длительность перехода в секундах")
     parser.add_argument("--mode", type=str, choices=["basic", "images_loop"], default="basic",
                         help="Режим синхронизации: basic или images_loop")
+    parser.add_argument("--backend", type=str, choices=["moviepy", "ffmpeg"], default="moviepy",
+                        help="Движок рендера: moviepy (кадры в Python) или ffmpeg (один граф фильтров filter_complex)")
+    parser.add_argument("--encode-workers", type=int, default=1,
+                        help="Количество процессов для параллельного рендера и кодирования клипов (по умолчанию 1)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Хранить закодированные клипы рядом с --output и при повторном запуске кодировать только изменившиеся")
+    parser.add_argument("--resume", action="store_true",
+                        help="Возобновляемый рендер: готовые клипы и журнал пишутся рядом с --output, после сбоя повторный запуск продолжает работу")
+    parser.add_argument("--reuse-loops", action="store_true",
+                        help="images_loop: кодировать круг изображений один раз и повторять склейкой без перекодирования")
+    parser.add_argument("--still-fastpath", action="store_true",
+                        help="Кодировать неподвижные отрезки одним удерживаемым кадром (переменная частота кадров)")
     parser.add_argument("--zoom", type=float, help="Zoom-in эффект (указать скорость масштабирования, например, 0.1)")
     parser.add_argument("--zoom-out", type=float, help="Zoom-out эффект (указать скорость масштабирования, например, 0.1)")
     parser.add_argument("--text", type=str, help="Текст для наложения на изображение")
@@ -34,6 +96,18 @@ def parse_args():
     parser.add_argument("--autocover", nargs="?", const=True, default=None,
                         help="Автоматически создать обложку (без значения — первый кадр, с числом — секунда, например 25)")
 
-    args = parser.parse_args()
+    # Метрики этапов для планировщика
+    parser.add_argument("--metrics-json", type=str,
+                        help="Записать в JSON время, процессорное время и пиковую память этапов и гистограммы времени кадра")
+
+    # Профилирование генерации кадров (cProfile + collapsed-стеки рядом с выходным файлом)
+    parser.add_argument("--profile", action="store_true",
+                        help="Профилировать генерацию кадров: <output>.prof (pstats) и <output>.collapsed (flame graph)")
+    parser.add_argument("--profile-frames", type=int, default=100,
+                        help="Окно профилирования: число кадров (по умолчанию 100, 0 — без ограничения)")
+    parser.add_argument("--profile-seconds", type=float,
+                        help="Окно профилирования: секунды генерации кадров (что наступит раньше)")
+
+    args = parser.parse_args(argv)
     logger.debug("Аргументы командной строки: %s", vars(args))
     return args
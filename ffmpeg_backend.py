@@ -0,0 +1,161 @@
+# ffmpeg_backend.py
+import os
+import math
+import tempfile
+import logging
+from image_processor import TARGET_SIZE
+from ffmpeg_tools import run_ffmpeg, concat_copy
+from audio_processor import render_audio_track
+
+logger = logging.getLogger(__name__)
+
+# Переходы, которые выполняет фильтр xfade (остальные — через fade и concat)
+XFADE_TRANSITIONS = {"crossfade": "fade", "slide": "coverleft", "push": "slideleft"}
+
+
+def count_clips(num_images, duration, total_duration):
+    """Число клипов таймлайна, покрывающих total_duration (изображения идут по кругу)."""
+    return max(num_images, int(math.ceil(total_duration / duration - 1e-6)))
+
+
+def clip_length(idx, duration, transition, transition_duration):
+    """Длина входа клипа: при xfade каждый следующий клип начинается на transition_duration раньше."""
+    if transition in XFADE_TRANSITIONS and idx > 0:
+        return duration + transition_duration
+    return duration
+
+
+def _zoom_filter(duration, fps, size, zoom_factor, zoom_out_factor):
+    frames = duration * fps
+    if zoom_factor:
+        zoom = "1+%g*on/%g" % (zoom_factor, frames)
+    elif zoom_out_factor:
+        zoom = "1+%g*(1-on/%g)" % (zoom_out_factor, frames)
+    else:
+        return None
+    return ("zoompan=z='%s':x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':d=1:s=%dx%d:fps=%s"
+            % (zoom, size[0], size[1], fps))
+
+
+def build_clip_graph(duration, fps, transition="fade", transition_duration=0.5, zoom_factor=0.0,
+                     zoom_out_factor=0.0, length=None, has_next=True, overlay_input=None, size=TARGET_SIZE):
+    """
+    Строит filter_complex для одного клипа таймлайна: вход 0 — изображение длиной length (clip_length),
+    вход 1 — следующее изображение, если клип заканчивается переходом xfade (has_next).
+
+    Выход [vout] — отрезок таймлайна длиной duration, как в рендере moviepy: fade — затемнение
+    (кроме последнего клипа); crossfade/slide/push — xfade в последние transition_duration секунд;
+    zoom — zoompan. Начало входа, уже показанное в переходе из предыдущего клипа, отрезается.
+    Оверлей (текст/логотип) накладывается поверх.
+    """
+    td = transition_duration
+    length = length or duration
+    zoom = _zoom_filter(duration, fps, size, zoom_factor, zoom_out_factor)
+    steps = [zoom] if zoom else []
+    steps += ["settb=AVTB", "setsar=1", "format=yuv420p"]
+    xfade = transition in XFADE_TRANSITIONS and has_next
+
+    first = list(steps)
+    if transition == "fade" and has_next:
+        first += ["fade=t=in:st=0:d=%g" % td, "fade=t=out:st=%g:d=%g" % (duration - td, td)]
+    chains = ["[0:v]%s[v0]" % ",".join(first)]
+    video = "v0"
+    if xfade:
+        chains.append("[1:v]%s[v1]" % ",".join(steps))
+        chains.append("[v0][v1]xfade=transition=%s:duration=%g:offset=%g[x]"
+                      % (XFADE_TRANSITIONS[transition], td, length - td))
+        video = "x"
+
+    chains.append("[%s]trim=start=%g:end=%g,setpts=PTS-STARTPTS[cut]" % (video, length - duration, length))
+    video = "cut"
+    if overlay_input is not None:
+        chains.append("[%s][%d:v]overlay=0:0[ov]" % (video, overlay_input))
+        video = "ov"
+    chains.append("[%s]format=yuv420p[vout]" % video)
+    return ";\n".join(chains)
+
+
+def _encode_args(fps, crf, bitrate, preset):
+    args = ["-c:v", "libx264", "-preset", preset, "-pix_fmt", "yuv420p", "-r", str(fps)]
+    if crf is not None:
+        args += ["-crf", str(crf)]
+    elif bitrate is not None:
+        args += ["-b:v", bitrate]
+    return args
+
+
+def render_with_ffmpeg(images, duration, fps, output_path, bitrate=None, crf=None, audio_path=None,
+                       audio_mode="cut", total_duration=None, transition="fade", transition_duration=0.5,
+                       zoom_factor=0.0, zoom_out_factor=0.0, overlay=None, audio_fade=1.0, size=TARGET_SIZE,
+                       preset="medium"):
+    """
+    Рендерит видео графами фильтров ffmpeg без кадров в Python: каждый клип (изображение,
+    zoom, оверлей и переход к следующему) кодируется отдельным вызовом ffmpeg не более чем
+    с тремя входами, поэтому память не растёт с длиной таймлайна. Одинаковые клипы разных
+    кругов кодируются один раз; клипы склеиваются без перекодирования вместе с аудио.
+    audio_mode="loop" зацикливает аудио до total_duration (как render_audio_track),
+    audio_fade — длительность fade-in/out аудио (0 — без затухания).
+    size — размер кадра (изображения и оверлей подготовлены в этом размере), preset — пресет x264.
+    """
+    if not images:
+        logger.error("Список изображений пуст.")
+        return
+
+    num_images = len(images)
+    if total_duration is None:
+        total_duration = num_images * duration
+    num_clips = count_clips(num_images, duration, total_duration)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Подготовленные изображения сохраняются без сжатия: ffmpeg перечитывает их на каждом кадре
+        paths = []
+        for idx in range(num_images):
+            path = os.path.join(workdir, "image_%03d.bmp" % idx)
+            images[idx].convert("RGB").save(path)
+            paths.append(path)
+
+        overlay_args = []
+        if overlay is not None:
+            overlay_path = os.path.join(workdir, "overlay.png")
+            overlay.save(overlay_path)
+            overlay_args = ["-i", overlay_path]
+
+        # Клип определяется изображением, следующим изображением (переход), длиной входа
+        # и длиной на таймлайне: последний видимый клип обрезается по total_duration
+        visible = min(num_clips, int(math.ceil(total_duration / duration - 1e-6)))
+        parts, rendered = [], {}
+        for idx in range(visible):
+            has_next = idx < num_clips - 1
+            length = clip_length(idx, duration, transition, transition_duration)
+            tail = min(duration, total_duration - idx * duration)
+            key = (idx % num_images, (idx + 1) % num_images if has_next else None, length, tail)
+            if key in rendered:
+                parts.append(rendered[key])
+                continue
+
+            args = ["-loop", "1", "-framerate", str(fps), "-t", "%g" % length, "-i", paths[key[0]]]
+            xfade = transition in XFADE_TRANSITIONS and has_next
+            if xfade:
+                args += ["-loop", "1", "-framerate", str(fps), "-t", "%g" % transition_duration,
+                         "-i", paths[key[1]]]
+            graph = build_clip_graph(duration, fps, transition, transition_duration, zoom_factor,
+                                     zoom_out_factor, length, has_next,
+                                     (2 if xfade else 1) if overlay_args else None, size)
+            part_path = os.path.join(workdir, "clip_%04d.mp4" % len(rendered))
+            args += overlay_args + ["-filter_complex", graph, "-map", "[vout]", "-an"]
+            args += _encode_args(fps, crf, bitrate, preset)
+            if tail < duration:
+                args += ["-t", "%.3f" % tail]
+            args.append(part_path)
+            run_ffmpeg(args)
+            rendered[key] = part_path
+            parts.append(part_path)
+
+        logger.info("Клипов на таймлайне: %d, закодировано ffmpeg: %d", visible, len(rendered))
+
+        track = None
+        if audio_path:
+            track = render_audio_track(audio_path, audio_mode, total_duration, workdir, audio_fade, audio_fade)
+
+        logger.info("Экспорт видео через ffmpeg: %s", output_path)
+        concat_copy(parts, output_path, audio_path=track.path if track else None, duration=total_duration)
@@ -0,0 +1,122 @@
+# ffmpeg_tools.py
+import os
+import subprocess
+import logging
+import numpy as np
+from moviepy.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+def ffmpeg_binary():
+    """Путь к ffmpeg — тот же, что использует moviepy."""
+    return get_setting("FFMPEG_BINARY")
+
+
+def run_ffmpeg(args):
+    """Запускает ffmpeg с переданными аргументами; при ошибке выбрасывает RuntimeError с выводом stderr."""
+    cmd = [ffmpeg_binary(), "-y", "-loglevel", "error"] + [str(arg) for arg in args]
+    logger.debug("ffmpeg: %s", " ".join(cmd))
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError("ffmpeg завершился с ошибкой (%d): %s"
+                           % (result.returncode, result.stderr.decode("utf-8", "replace").strip()))
+
+
+def write_concat_list(paths, list_path, durations=None):
+    """
+    Создаёт список файлов для concat-демультиплексора ffmpeg.
+    durations — точные длительности файлов: по ним считается смещение следующего файла
+    (длительность, записанная в контейнере, у отрезков с неподвижным кадром неточна).
+    """
+    with open(list_path, "w", encoding="utf-8") as f:
+        for idx, path in enumerate(paths):
+            # Одинарные кавычки в пути экранируются по правилам concat-демультиплексора
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write("file '%s'\n" % escaped)
+            if durations is not None:
+                f.write("duration %.6f\n" % durations[idx])
+    return list_path
+
+
+def concat_copy(paths, output_path, audio_path=None, duration=None, durations=None):
+    """
+    Склеивает видеофайлы с одинаковыми параметрами кодирования без перекодирования (-c copy).
+    Если задан audio_path — дорожка добавляется тем же проходом, duration обрезает результат.
+    """
+    list_path = output_path + ".concat.txt"
+    write_concat_list(paths, list_path, durations)
+
+    args = ["-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        args += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+    args += ["-c", "copy"]
+    if duration is not None:
+        args += ["-t", "%.3f" % duration]
+    args.append(output_path)
+
+    try:
+        run_ffmpeg(args)
+    finally:
+        os.remove(list_path)
+    logger.info("Склеено без перекодирования: %d файлов -> %s", len(paths), output_path)
+
+
+def mux_audio(video_path, audio_path, output_path, duration=None):
+    """
+    Объединяет видео без звука с готовой аудиодорожкой копированием обоих потоков.
+    duration обрезает результат (дорожка может быть длиннее видео).
+    """
+    args = ["-i", video_path, "-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c", "copy"]
+    if duration is not None:
+        args += ["-t", "%.3f" % duration]
+    args.append(output_path)
+    run_ffmpeg(args)
+    logger.info("Аудиодорожка добавлена без перекодирования: %s", output_path)
+
+
+def encode_frames(frames, size, fps, output_path, codec="libx264", bitrate=None,
+                  ffmpeg_params=None, preset="medium", hold_frames=None):
+    """
+    Кодирует сырые RGB-кадры (numpy uint8, H x W x 3) в видеофайл с теми же параметрами, что и moviepy.
+
+    hold_frames=n — режим неподвижного кадра длиной n кадров: кодируются две копии первого кадра
+    с метками времени 0 и n-1 (переменная частота кадров), и плеер удерживает изображение между ними.
+    Ни Python, ни x264 не обрабатывают n одинаковых кадров. Третья копия не используется:
+    B-кадр между удалёнными метками ломает расчёт длительности при склейке.
+    """
+    cmd = [ffmpeg_binary(), "-y", "-loglevel", "error",
+           "-f", "rawvideo", "-vcodec", "rawvideo",
+           "-s", "%dx%d" % (size[0], size[1]), "-pix_fmt", "rgb24",
+           "-r", "%.02f" % fps, "-an", "-i", "-"]
+    copies = None
+    if hold_frames:
+        copies = min(hold_frames, 2)
+        cmd += ["-vf", "setpts='if(eq(N,0),0,N+%d)'" % (hold_frames - copies), "-vsync", "passthrough"]
+    cmd += ["-vcodec", codec, "-preset", preset]
+    if ffmpeg_params:
+        cmd += list(ffmpeg_params)
+    if bitrate is not None:
+        cmd += ["-b", bitrate]
+    if codec == "libx264" and size[0] % 2 == 0 and size[1] % 2 == 0:
+        cmd += ["-pix_fmt", "yuv420p"]
+    cmd.append(output_path)
+
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for frame in frames:
+            data = np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+            if copies:
+                proc.stdin.write(data * copies)
+                break
+            proc.stdin.write(data)
+    except BrokenPipeError:
+        pass  # Причина будет в stderr
+    finally:
+        proc.stdin.close()
+        error = proc.stderr.read()
+        proc.wait()
+
+    if proc.returncode != 0:
+        raise RuntimeError("ffmpeg завершился с ошибкой (%d) при записи %s: %s"
+                           % (proc.returncode, output_path, error.decode("utf-8", "replace").strip()))
@@ -0,0 +1,139 @@
+# frame_cache.py
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Версия формата кэша: меняется при изменении алгоритма подготовки кадров
+CACHE_VERSION = 1
+
+# Каталог и лимит кэша по умолчанию
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vvm", "frames")
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Возвращает SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FrameCache:
+    """
+    Дисковый кэш подготовленных кадров с адресацией по содержимому.
+
+    Ключ — хэш содержимого исходного файла плюс параметры подготовки.
+    Кадры хранятся несжатыми RGB-массивами (.npy) и читаются через memory map,
+    поэтому при повторном запуске декодирование не выполняется.
+    При превышении max_bytes удаляются давно не использованные кадры (LRU по mtime).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._approx_size = None
+        self._digests = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def make_key(self, path, params):
+        """Строит ключ кадра по содержимому файла и параметрам обработки."""
+        params = dict(params)
+        for name, digest_name in (("logo_path", "logo_digest"), ("font_path", "font_digest")):
+            # Логотип и шрифт влияют на результат — учитываем их содержимое, а не только путь
+            asset_path = params.get(name)
+            if asset_path and os.path.isfile(asset_path):
+                params[digest_name] = self._digest(asset_path)
+
+        payload = json.dumps({"version": CACHE_VERSION, "source": self._digest(path), "params": params},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _digest(self, path):
+        # Хэш файла запоминается по (путь, mtime, размер), чтобы не перечитывать файл
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if memo_key not in self._digests:
+            self._digests[memo_key] = file_digest(path)
+        return self._digests[memo_key]
+
+    def _path_for(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def get(self, key):
+        """Возвращает кадр (memory-mapped массив только для чтения) или None."""
+        path = self._path_for(key)
+        try:
+            frame = np.load(path, mmap_mode="r")
+            os.utime(path, None)  # Отмечаем использование для LRU
+            return frame
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Повреждённая запись кэша кадров %s: %s", path, e)
+            self._remove(path)
+            return None
+
+    def put(self, key, frame):
+        """Сохраняет кадр атомарно: запись во временный файл и переименование."""
+        path = self._path_for(key)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(frame, dtype=np.uint8))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Не удалось записать кадр в кэш %s: %s", path, e)
+            self._remove(tmp_path)
+            return
+
+        if self._approx_size is None:
+            self._approx_size = self.total_size()
+        else:
+            self._approx_size += os.path.getsize(path)
+        if self._approx_size > self.max_bytes:
+            self.evict()
+
+    def total_size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self):
+        """Удаляет самые старые по использованию кадры, пока кэш не уложится в лимит."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        self._approx_size = total
+        if removed:
+            logger.info("Кэш кадров: удалено %d записей, занято %.1f МБ", removed, total / 1024 ** 2)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Запись удалена параллельным процессом
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
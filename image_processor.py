@@ -1,21 +1,47 @@
 # image_processor.py
 import os
+import math
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+import numpy as np
 from PIL import Image, ImageOps, ImageDraw, ImageFont, ImageColor
 from tqdm import tqdm
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Целевой размер выходного изображения (видео формат 9:16)
+# Целевой размер выходного изображения по умолчанию (видео формат 9:16).
+# Положение и размер текста и логотипа задаются для этого размера и масштабируются под другие
 TARGET_SIZE = (1080, 1920)
 
+# Файлы больше этого числа пикселей не декодируются (защита от «декомпрессионной бомбы»)
+MAX_SOURCE_PIXELS = 150_000_000
+
+# Наибольший запас разрешения для zoom: дальше кадр растёт квадратично, а выигрыш в резкости мал
+MAX_HEADROOM = 2.0
+
 def load_and_process_images(directory, bgcolor="black", text=None, text_position="bottom",
                             font_size=40, font_color="white", font_path=None,
                             logo_path=None, logo_scale=0.2, logo_coords=None,
-                            skip_overlay=False):
+                            skip_overlay=False, workers=1, lazy=False, cache=None,
+                            size=TARGET_SIZE, resample=Image.Resampling.LANCZOS, max_resident=3,
+                            headroom=1.0):
     """
     Загружает изображения из указанного каталога, подгоняет их под нужный размер,
     наносит текст и логотип (если не активен skip_overlay).
+
+    При workers > 1 файлы обрабатываются параллельно в пуле процессов,
+    результат возвращается в исходном (отсортированном) порядке.
+
+    При lazy=True возвращается LazyImageSource: файлы обрабатываются по требованию,
+    и в памяти одновременно находится лишь max_resident готовых кадров.
+
+    cache — необязательный FrameCache: готовые кадры берутся с диска без декодирования.
+    size — размер кадра (ширина, высота), resample — фильтр вписывания изображения в кадр.
+    headroom — запас разрешения для zoom: кадры готовятся размером headroom_size(size, headroom),
+    чтобы увеличение не растягивало пиксели.
     """
 
     # Преобразуем цвет фона в RGB. Если указан неверно — используем чёрный.
@@ -25,142 +51,401 @@ def load_and_process_images(directory, bgcolor="black", text=None, text_position
         logger.warning("Неверный цвет '%s', используется по умолчанию — 'black'", bgcolor)
         color = (0, 0, 0)
 
-    images = []
-
-    # Перебираем все файлы в каталоге
-    for filename in tqdm(sorted(os.listdir(directory))):
-        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
-            path = os.path.join(directory, filename)
-            try:
-                # Загружаем изображение и адаптируем под целевой размер (с фоном)
-                img = Image.open(path).convert("RGB")
-                img = ImageOps.pad(img, (1080, 1920), method=Image.Resampling.LANCZOS, color=color)
-
-                # Добавляем текст, если задан и overlay не отключён
-                if text and not skip_overlay:
-                    draw = ImageDraw.Draw(img)
-                    try:
-                        font = ImageFont.truetype(font_path if font_path else "arial.ttf", font_size)
-                    except Exception as e:
-                        font = ImageFont.load_default()
-                        logger.warning("Шрифт по пути '%s' не найден. Используется шрифт по умолчанию. Ошибка: %s", font_path, e)
-
-                    try:
-                        # Вычисляем размеры текста и размещаем его в нужной позиции
-                        bbox = draw.textbbox((0, 0), text, font=font)
-                        text_width = bbox[2] - bbox[0]
-                        text_height = bbox[3] - bbox[1]
-
-                        if text_position == "top":
-                            position = ((img.width - text_width) // 2, 50)
-                        elif text_position == "center":
-                            position = ((img.width - text_width) // 2, (img.height - text_height) // 2)
-                        else:  # default: bottom
-                            position = ((img.width - text_width) // 2, img.height - text_height - 50)
-
-                        draw.text(position, text, fill=font_color, font=font)
-                        logger.info("Добавлен текст: '%s' на позицию %s", text, text_position)
-                    except Exception as e:
-                        logger.warning("Не удалось отрисовать текст '%s': %s", text, e)
-
-                # Добавляем логотип, если указан и overlay не отключён
-                if logo_path and not skip_overlay:
-                    try:
-                        logo = Image.open(logo_path).convert("RGBA")
-
-                        # Масштабируем логотип пропорционально ширине изображения
-                        logo_width = int(img.width * logo_scale)
-                        logo_ratio = logo_width / logo.width
-                        logo_height = int(logo.height * logo_ratio)
-                        logo_resized = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-
-                        # Позиция по умолчанию: правый нижний угол
-                        logo_pos = (img.width - logo_width - 20, img.height - logo_height - 20)
-
-                        # Переопределение координат, если заданы
-                        if logo_coords:
-                            try:
-                                if isinstance(logo_coords, str):
-                                    x_str, y_str = logo_coords.split(",")
-                                    logo_pos = (int(x_str.strip()), int(y_str.strip()))
-                                elif isinstance(logo_coords, (list, tuple)) and len(logo_coords) == 2:
-                                    logo_pos = tuple(map(int, logo_coords))
-                            except Exception:
-                                logger.warning("Ошибка преобразования координат логотипа: %s", logo_coords)
-
-                        img.paste(logo_resized, logo_pos, logo_resized)
-                        logger.info("Добавлен логотип в координаты: %s", logo_pos)
-                    except Exception as e:
-                        logger.warning("Не удалось загрузить логотип '%s': %s", logo_path, e)
-
-                images.append(img)
-
-            except Exception as e:
-                logger.warning("Не удалось обработать изображение %s: %s", filename, e)
+    paths = list_image_files(directory)
+
+    params = dict(color=color, text=text, text_position=text_position,
+                  font_size=font_size, font_color=font_color, font_path=font_path,
+                  logo_path=logo_path, logo_scale=logo_scale, logo_coords=logo_coords,
+                  skip_overlay=skip_overlay, size=tuple(size), resample=resample, headroom=headroom)
+
+    if lazy:
+        # Сразу отсеиваем файлы, которые не открываются как изображения
+        valid_paths = [path for path in paths if _is_readable_image(path)]
+        logger.info("Найдено изображений: %d (ленивая загрузка)", len(valid_paths))
+        return LazyImageSource(valid_paths, params, max_resident=max_resident, cache=cache)
+
+    if workers and workers > 1 and len(paths) > 1:
+        results = _process_images_parallel(paths, params, min(workers, len(paths)), cache)
+    else:
+        results = (load_image_cached(path, params, cache) for path in tqdm(paths))
+
+    # Файлы, которые не удалось обработать, пропускаются
+    images = [img for img in results if img is not None]
+
+    if cache is not None:
+        cache.evict()
 
     logger.info("Найдено изображений: %d", len(images))
     return images
 
 
+def list_image_files(directory):
+    """Файлы изображений каталога (PNG, JPEG) в алфавитном порядке."""
+    return [os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+            if filename.lower().endswith((".png", ".jpg", ".jpeg"))]
+
+
+def process_image_file(path, color=(0, 0, 0), text=None, text_position="bottom",
+                       font_size=40, font_color="white", font_path=None,
+                       logo_path=None, logo_scale=0.2, logo_coords=None,
+                       skip_overlay=False, size=TARGET_SIZE, resample=Image.Resampling.LANCZOS, headroom=1.0):
+    """
+    Обрабатывает один файл: подгоняет под размер кадра size и наносит текст и логотип.
+    С headroom > 1 (zoom) изображение вписывается в кадр, увеличенный в headroom раз.
+    Возвращает изображение или None, если файл обработать не удалось.
+    """
+    filename = os.path.basename(path)
+    try:
+        # Загружаем изображение и адаптируем под целевой размер (с фоном)
+        img = open_image(path, size, headroom)
+        img = ImageOps.pad(img, headroom_size(size, headroom), method=resample, color=color)
+
+        # Текст и логотип одинаковы для всех изображений: слой готовится один раз и накладывается
+        if (text or logo_path) and not skip_overlay:
+            layer = overlay_layer(text, text_position, font_size, font_color, font_path,
+                                  logo_path, logo_scale, logo_coords, img.size)
+            if layer.box is not None:
+                img.paste(layer.pixels, layer.box, layer.pixels)
+
+        return img
+
+    except Exception as e:
+        logger.warning("Не удалось обработать изображение %s: %s", filename, e)
+        return None
+
+
+def headroom_size(size, headroom=1.0):
+    """Размер подготовленного кадра: size, увеличенный в headroom раз (запас разрешения для zoom)."""
+    if headroom == 1.0:
+        return tuple(size)
+    return tuple(max(int(round(side * headroom)), 1) for side in size)
+
+
+def open_image(path, size=TARGET_SIZE, headroom=1.0):
+    """
+    Открывает изображение и декодирует его в уменьшенном разрешении — наименьшем,
+    при котором оно после вписывания в size (как в ImageOps.pad) остаётся не меньше size * headroom.
+
+    JPEG уменьшается при декодировании (DCT-масштабирование через draft: 1/2, 1/4, 1/8),
+    остальные форматы — через reduce после декодирования. Размер проверяется по заголовку
+    до декодирования: файл больше MAX_SOURCE_PIXELS отклоняется с ValueError.
+    """
+    img = Image.open(path)
+    width, height = img.size
+    if width * height > MAX_SOURCE_PIXELS:
+        img.close()
+        raise ValueError("Изображение слишком большое: %dx%d (больше %d пикселей)"
+                         % (width, height, MAX_SOURCE_PIXELS))
+
+    # Масштаб вписывания в кадр и нужный размер декодирования с запасом
+    fit = min(size[0] / width, size[1] / height) * headroom
+    needed = (max(int(math.ceil(width * fit)), 1), max(int(math.ceil(height * fit)), 1))
+
+    if img.format == "JPEG":
+        img.draft("RGB", needed)
+    img = img.convert("RGB")
+
+    factor = min(img.width // needed[0], img.height // needed[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != (width, height):
+        logger.debug("Декодировано %s: %dx%d -> %dx%d", os.path.basename(path), width, height, *img.size)
+    return img
+
+
+def _cache_params(params):
+    """Параметры, от которых зависит результат обработки (для ключа кэша)."""
+    key_params = dict(params, decode="reduced")
+    if params.get("skip_overlay"):
+        # Текст и логотип не наносятся — их параметры не влияют на кадр
+        for name in ("text", "text_position", "font_size", "font_color", "font_path",
+                     "logo_path", "logo_scale", "logo_coords"):
+            key_params.pop(name, None)
+    return key_params
+
+
+def load_image_cached(path, params, cache=None):
+    """
+    Возвращает обработанное изображение, используя дисковый кэш кадров (если задан).
+    При промахе файл обрабатывается как обычно, и результат сохраняется в кэш.
+    """
+    if cache is None:
+        return process_image_file(path, **params)
+
+    try:
+        key = cache.make_key(path, _cache_params(params))
+    except OSError as e:
+        logger.warning("Не удалось вычислить ключ кэша для %s: %s", os.path.basename(path), e)
+        return process_image_file(path, **params)
+
+    frame = cache.get(key)
+    if frame is not None:
+        logger.debug("Кадр взят из кэша: %s", path)
+        return Image.fromarray(frame)
+
+    img = process_image_file(path, **params)
+    if img is not None:
+        cache.put(key, np.asarray(img))
+    return img
+
+
+def _is_readable_image(path):
+    """Проверяет заголовок файла без полного декодирования."""
+    try:
+        with Image.open(path):
+            return True
+    except Exception as e:
+        logger.warning("Не удалось обработать изображение %s: %s", os.path.basename(path), e)
+        return False
+
+
+class LazyImageSource:
+    """
+    Индексируемый источник изображений с обработкой по требованию.
+
+    Хранит только пути и параметры обработки; готовые кадры (PIL и numpy)
+    кэшируются в пределах max_resident последних запрошенных индексов.
+    """
+
+    def __init__(self, paths, params, max_resident=3, cache=None):
+        self.paths = list(paths)
+        self.params = params
+        self.max_resident = max_resident
+        self.cache = cache
+        self._images = OrderedDict()
+        self._arrays = OrderedDict()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __getitem__(self, idx):
+        idx = self._normalize_index(idx)
+        if idx in self._images:
+            self._images.move_to_end(idx)
+            return self._images[idx]
+
+        img = load_image_cached(self.paths[idx], self.params, self.cache)
+        if img is None:
+            # Файл повреждён после проверки заголовка — подставляем пустой кадр, чтобы не сбить тайминг
+            size = headroom_size(self.params.get("size", TARGET_SIZE), self.params.get("headroom", 1.0))
+            img = Image.new("RGB", size, self.params.get("color", (0, 0, 0)))
+
+        self._remember(self._images, idx, img)
+        return img
+
+    def get_array(self, idx):
+        """Возвращает кадр в виде numpy-массива (H, W, 3), кэшируя результат."""
+        idx = self._normalize_index(idx)
+        if idx in self._arrays:
+            self._arrays.move_to_end(idx)
+            return self._arrays[idx]
+
+        arr = np.asarray(self[idx].convert("RGB"))
+        self._remember(self._arrays, idx, arr)
+        return arr
+
+    def _normalize_index(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("LazyImageSource index out of range")
+        return idx
+
+    def _remember(self, cache, idx, value):
+        cache[idx] = value
+        while len(cache) > self.max_resident:
+            cache.popitem(last=False)
+
+
+class _ForwardToLoggerHandler(logging.Handler):
+    """Передаёт записи, полученные от рабочих процессов, в одноимённые логгеры основного процесса."""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def _init_worker(log_queue, log_level):
+    # В рабочем процессе все записи лога отправляются в очередь основного процесса
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(log_level)
+
+
+def _process_file_task(task):
+    path, params, cache = task
+    return load_image_cached(path, params, cache)
+
+
+def _process_images_parallel(paths, params, workers, cache=None):
+    """Обрабатывает файлы в пуле процессов, сохраняя исходный порядок."""
+    logger.info("Параллельная обработка изображений: %d процессов", workers)
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, _ForwardToLoggerHandler())
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(log_queue, logger.getEffectiveLevel())) as executor:
+            # executor.map возвращает результаты в порядке входных файлов
+            tasks = ((path, params, cache) for path in paths)
+            return list(tqdm(executor.map(_process_file_task, tasks), total=len(paths)))
+    finally:
+        listener.stop()
+
+
 def generate_overlay(text=None, text_position="bottom",
                      font_size=40, font_color="white", font_path=None,
-                     logo_path=None, logo_scale=0.2, logo_coords=None):
+                     logo_path=None, logo_scale=0.2, logo_coords=None, size=TARGET_SIZE):
     """
-    Генерирует отдельный прозрачный слой (оверлей) с текстом и/или логотипом,
+    Генерирует отдельный прозрачный слой (оверлей) размера size с текстом и/или логотипом,
     который можно наложить на любое изображение.
     """
-    overlay = Image.new("RGBA", TARGET_SIZE, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
+    layer = overlay_layer(text, text_position, font_size, font_color, font_path,
+                          logo_path, logo_scale, logo_coords, size)
+    overlay = Image.new("RGBA", tuple(size), (0, 0, 0, 0))
+    if layer.box is not None:
+        # Слой копируется без маски: его альфа уже итоговая, маска умножила бы её на себя второй раз
+        overlay.paste(layer.pixels, layer.box)
+    return overlay
 
-    # Наносим текст (если указан)
-    if text:
+
+# === КЭШ РЕСУРСОВ ОВЕРЛЕЯ ===
+# Шрифты, масштабированные логотипы и готовые слои текст+логотип не зависят от изображения:
+# каждый загружается и рисуется один раз на процесс (в пуле — один раз на рабочий процесс)
+
+# Готовый слой: непрозрачная часть (RGBA) и её место на кадре; box=None — слой пуст
+OverlayLayer = namedtuple("OverlayLayer", ["pixels", "box"])
+
+_fonts = {}
+_logos = {}
+_layers = {}
+
+
+def _file_key(path):
+    """Ключ файла ресурса: путь и время изменения (правка файла даёт новый ключ)."""
+    path = os.path.abspath(path)
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None
+
+
+def load_font(font_path, font_size):
+    """Шрифт нужного размера; при ошибке загрузки — шрифт по умолчанию (предупреждение выводится один раз)."""
+    key = (font_path, font_size)
+    if key not in _fonts:
         try:
-            font = ImageFont.truetype(font_path if font_path else "arial.ttf", font_size)
+            _fonts[key] = ImageFont.truetype(font_path if font_path else "arial.ttf", font_size)
         except Exception as e:
-            font = ImageFont.load_default()
-            logger.warning("Ошибка загрузки шрифта '%s': %s. Используется шрифт по умолчанию.", font_path, e)
+            _fonts[key] = ImageFont.load_default()
+            logger.warning("Шрифт по пути '%s' не найден. Используется шрифт по умолчанию. Ошибка: %s", font_path, e)
+    return _fonts[key]
+
+
+def load_logo(logo_path, width):
+    """Логотип (RGBA), пропорционально масштабированный до ширины width. Ошибка чтения выбрасывается."""
+    key = _file_key(logo_path) + (width,)
+    if key not in _logos:
+        logo = Image.open(logo_path).convert("RGBA")
+        height = int(logo.height * width / logo.width)
+        _logos[key] = logo.resize((width, height), Image.Resampling.LANCZOS)
+    return _logos[key]
+
+
+def layout_scale(size):
+    """Во сколько раз кадр size меньше (больше) TARGET_SIZE — для отступов, шрифта и координат логотипа."""
+    return min(size[0] / TARGET_SIZE[0], size[1] / TARGET_SIZE[1])
+
+
+def _logo_position(logo_coords, size, logo_size):
+    # Позиция по умолчанию: правый нижний угол; координаты переопределяются, если заданы
+    scale = layout_scale(size)
+    margin = round(20 * scale)
+    position = (size[0] - logo_size[0] - margin, size[1] - logo_size[1] - margin)
+    if logo_coords:
+        try:
+            if isinstance(logo_coords, str):
+                x_str, y_str = logo_coords.split(",")
+                coords = (int(x_str.strip()), int(y_str.strip()))
+            elif isinstance(logo_coords, (list, tuple)) and len(logo_coords) == 2:
+                coords = tuple(map(int, logo_coords))
+            else:
+                coords = None
+            if coords:
+                position = (round(coords[0] * scale), round(coords[1] * scale))
+        except Exception:
+            logger.warning("Ошибка преобразования координат логотипа: %s", logo_coords)
+    return position
 
+
+def overlay_layer(text=None, text_position="bottom", font_size=40, font_color="white", font_path=None,
+                  logo_path=None, logo_scale=0.2, logo_coords=None, size=TARGET_SIZE):
+    """
+    Слой с текстом и логотипом для кадра размера size, нарисованный один раз на набор параметров.
+
+    Прозрачная часть слоя имеет цвет текста, поэтому наложение слоя (paste с альфой)
+    даёт тот же результат, что и рисование текста и логотипа прямо на изображении.
+    Размер шрифта, отступы и координаты логотипа заданы для TARGET_SIZE и масштабируются под size.
+    Возвращает OverlayLayer с обрезанной по непрозрачной области частью слоя.
+    """
+    key = (text, text_position, font_size, str(font_color), font_path,
+           _file_key(logo_path) if logo_path else None, logo_scale, str(logo_coords), tuple(size))
+    if key in _layers:
+        return _layers[key]
+
+    try:
+        ink = ImageColor.getrgb(font_color)[:3]
+    except (ValueError, AttributeError):
+        ink = (0, 0, 0)
+    layer = Image.new("RGBA", tuple(size), ink + (0,))
+
+    if text:
+        scale = layout_scale(size)
+        margin = round(50 * scale)
+        font = load_font(font_path, max(round(font_size * scale), 1))
         try:
+            # Вычисляем размеры текста и размещаем его в нужной позиции
+            draw = ImageDraw.Draw(layer)
             bbox = draw.textbbox((0, 0), text, font=font)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
 
             if text_position == "top":
-                position = ((TARGET_SIZE[0] - text_width) // 2, 50)
+                position = ((size[0] - text_width) // 2, margin)
             elif text_position == "center":
-                position = ((TARGET_SIZE[0] - text_width) // 2, (TARGET_SIZE[1] - text_height) // 2)
-            else:
-                position = ((TARGET_SIZE[0] - text_width) // 2, TARGET_SIZE[1] - text_height - 50)
+                position = ((size[0] - text_width) // 2, (size[1] - text_height) // 2)
+            else:  # default: bottom
+                position = ((size[0] - text_width) // 2, size[1] - text_height - margin)
 
             draw.text(position, text, fill=font_color, font=font)
-            logger.info("Overlay: добавлен текст '%s' на позицию %s", text, text_position)
+            logger.info("Добавлен текст: '%s' на позицию %s", text, text_position)
         except Exception as e:
-            logger.warning("Overlay: ошибка при отрисовке текста '%s': %s", text, e)
+            logger.warning("Не удалось отрисовать текст '%s': %s", text, e)
 
-    # Наносим логотип (если указан)
     if logo_path:
         try:
-            logo = Image.open(logo_path).convert("RGBA")
-            logo_width = int(TARGET_SIZE[0] * logo_scale)
-            logo_ratio = logo_width / logo.width
-            logo_height = int(logo.height * logo_ratio)
-            logo_resized = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-
-            logo_pos = (TARGET_SIZE[0] - logo_width - 20, TARGET_SIZE[1] - logo_height - 20)
-
-            if logo_coords:
-                try:
-                    if isinstance(logo_coords, str):
-                        x_str, y_str = logo_coords.split(",")
-                        logo_pos = (int(x_str.strip()), int(y_str.strip()))
-                    elif isinstance(logo_coords, (list, tuple)) and len(logo_coords) == 2:
-                        logo_pos = tuple(map(int, logo_coords))
-                except Exception:
-                    logger.warning("Overlay: ошибка преобразования координат логотипа: %s", logo_coords)
-
-            overlay.paste(logo_resized, logo_pos, logo_resized)
-            logger.info("Overlay: добавлен логотип в координаты: %s", logo_pos)
+            logo = load_logo(logo_path, int(size[0] * logo_scale))
+            position = _logo_position(logo_coords, size, logo.size)
+            canvas = Image.new("RGBA", tuple(size), (0, 0, 0, 0))
+            canvas.paste(logo, position)
+            layer = Image.alpha_composite(layer, canvas)
+            logger.info("Добавлен логотип в координаты: %s", position)
         except Exception as e:
-            logger.warning("Overlay: не удалось загрузить логотип '%s': %s", logo_path, e)
+            logger.warning("Не удалось загрузить логотип '%s': %s", logo_path, e)
 
-    return overlay
+    box = layer.getchannel("A").getbbox()
+    result = OverlayLayer(layer.crop(box) if box else None, box)
+    _layers[key] = result
+    return result
+
+
+def clear_asset_cache():
+    """Очищает кэш шрифтов, логотипов и слоёв."""
+    _fonts.clear()
+    _logos.clear()
+    _layers.clear()
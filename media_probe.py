@@ -0,0 +1,84 @@
+# media_probe.py
+import os
+import re
+import subprocess
+import logging
+from collections import namedtuple
+from ffmpeg_tools import ffmpeg_binary
+
+logger = logging.getLogger(__name__)
+
+# Метаданные медиафайла, прочитанные из заголовков (без декодирования)
+MediaInfo = namedtuple("MediaInfo", ["duration", "sample_rate", "channels", "codec"])
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_AUDIO_RE = re.compile(r"Stream #\S+.*?: Audio: (\w+)[^,\n]*(?:, (\d+) Hz)?(?:, ([^,\n]+))?")
+
+# Раскладки каналов в выводе ffmpeg
+_LAYOUT_CHANNELS = {"mono": 1, "stereo": 2, "2.1": 3, "3.0": 3, "quad": 4, "4.0": 4,
+                    "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+
+_cache = {}
+
+
+def parse_probe_output(text):
+    """
+    Разбирает вывод `ffmpeg -i` (stderr) в MediaInfo.
+    Поля, которых нет в выводе (например, дорожки аудио у изображения), равны None.
+    """
+    match = _DURATION_RE.search(text)
+    duration = None
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    sample_rate = channels = codec = None
+    match = _AUDIO_RE.search(text)
+    if match:
+        codec = match.group(1)
+        if match.group(2):
+            sample_rate = int(match.group(2))
+        layout = (match.group(3) or "").strip()
+        if layout in _LAYOUT_CHANNELS:
+            channels = _LAYOUT_CHANNELS[layout]
+        else:
+            found = re.match(r"(\d+) channels", layout)
+            channels = int(found.group(1)) if found else None
+
+    return MediaInfo(duration, sample_rate, channels, codec)
+
+
+def probe_media(path):
+    """
+    Читает длительность, частоту дискретизации, число каналов и кодек аудио из заголовков файла
+    одним запуском ffmpeg. Результат кэшируется по (путь, mtime, размер): повторные вызовы
+    для неизменённого файла не запускают процесс.
+    Если файл не читается или длительность не определена — RuntimeError.
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise RuntimeError("Не удалось прочитать медиафайл %s: %s" % (path, e)) from e
+
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    info = _cache.get(key)
+    if info is not None:
+        return info
+
+    # Без выходного файла ffmpeg завершается с кодом 1, но заголовки уже выведены в stderr
+    result = subprocess.run([ffmpeg_binary(), "-hide_banner", "-i", path],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    text = result.stderr.decode("utf-8", "replace")
+    info = parse_probe_output(text)
+    if info.duration is None:
+        raise RuntimeError("Не удалось определить длительность %s: %s" % (path, text.strip()))
+
+    logger.debug("Метаданные %s: %s", path, info)
+    _cache[key] = info
+    return info
+
+
+def clear_probe_cache():
+    """Очищает кэш метаданных."""
+    _cache.clear()
@@ -0,0 +1,88 @@
+# memory_budget.py
+import logging
+from collections import namedtuple
+from metrics import peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# План рендера под бюджет памяти:
+# spill — подготовленные кадры загружаются по одному и выгружаются в memory-mapped хранилище;
+# max_resident — сколько декодированных кадров (PIL-копий) держать одновременно;
+# image_workers / encode_workers — допустимое число процессов; memo_bytes — лимит кэша кадров переходов
+MemoryPlan = namedtuple("MemoryPlan", ["budget", "frame_bytes", "spill", "max_resident",
+                                       "image_workers", "encode_workers", "memo_bytes"])
+
+# Доля бюджета под кадры изображений; остальное — интерпретатор, moviepy и буферы ffmpeg
+FRAME_SHARE = 0.5
+
+# Исходник декодируется с запасом до двух размеров кадра по каждой стороне (open_image) — до 4 кадров
+DECODE_FRAMES = 4
+
+# Оценка памяти рабочего процесса кодирования сверх его кадров (интерпретатор, moviepy, ffmpeg)
+WORKER_BYTES = 200 * 1024 ** 2
+
+# Кадров на рабочий процесс кодирования: два изображения клипа, кадры zoom и буферы перехода
+WORKER_FRAMES = 6
+
+# Пределы числа одновременно декодированных кадров
+MIN_RESIDENT = 2
+MAX_RESIDENT = 8
+
+# Лимит кэша кадров переходов без бюджета (TransitionRenderer) и его доля от бюджета
+DEFAULT_MEMO_BYTES = 256 * 1024 ** 2
+MEMO_SHARE = 0.1
+
+
+def frame_bytes(size):
+    """Размер RGB-кадра size (ширина, высота) в байтах."""
+    return size[0] * size[1] * 3
+
+
+def plan_memory(budget, num_images, size, image_workers=1, encode_workers=1):
+    """
+    Подбирает режим рендера под бюджет budget (байт) для num_images изображений в кадре size.
+
+    Обычный рендер держит каждое изображение дважды (PIL-кадр и массив). Если это не умещается
+    в долю бюджета FRAME_SHARE, кадры загружаются по одному и выгружаются на диск (memory map),
+    а декодированными одновременно остаются только max_resident кадров. Число процессов загрузки
+    и кодирования уменьшается так, чтобы их кадры тоже помещались в бюджет.
+    """
+    per_frame = frame_bytes(size)
+    frames_budget = int(budget * FRAME_SHARE)
+    resident_bytes = num_images * per_frame * 2
+    spill = resident_bytes > frames_budget
+
+    max_resident = max(MIN_RESIDENT, min(MAX_RESIDENT, frames_budget // (per_frame * 3)))
+
+    if spill:
+        # Загрузка по требованию последовательна: в работе одно декодируемое изображение
+        image_workers = 1
+    else:
+        spare = frames_budget - resident_bytes
+        image_workers = max(1, min(image_workers or 1, spare // (per_frame * DECODE_FRAMES)))
+
+    worker_cost = WORKER_BYTES + per_frame * WORKER_FRAMES
+    encode_workers = max(1, min(encode_workers or 1, (budget - frames_budget) // worker_cost))
+
+    memo_bytes = min(DEFAULT_MEMO_BYTES, int(budget * MEMO_SHARE))
+    return MemoryPlan(budget, per_frame, spill, int(max_resident), int(image_workers), int(encode_workers),
+                      memo_bytes)
+
+
+def report_peak_usage(budget):
+    """
+    Пишет в журнал пиковую память основного процесса относительно бюджета; при превышении — предупреждение.
+    Дочерние процессы (ffmpeg, процессы кодирования) в сравнение не входят: в журнал выводится
+    только пик самого крупного из них. Возвращает пик в байтах или None, если платформа его не сообщает.
+    """
+    peak, children = peak_rss_bytes(), peak_rss_bytes(children=True)
+    if peak is None:
+        logger.info("Пиковая память недоступна на этой платформе (бюджет %.1f МБ)", budget / 1024.0 ** 2)
+        return None
+    mb = 1024.0 ** 2
+    logger.info("Пиковая память основного процесса: %.1f МБ из бюджета %.1f МБ (%.0f%%); дочерние процессы "
+                "не учитываются, крупнейший из них: до %.1f МБ",
+                peak / mb, budget / mb, 100.0 * peak / budget, children / mb)
+    if peak > budget:
+        logger.warning("Бюджет памяти превышен основным процессом на %.1f МБ", (peak - budget) / mb)
+    return peak
@@ -0,0 +1,185 @@
+# metrics.py
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+from collections import namedtuple
+
+try:
+    import resource
+except ImportError:  # Windows: пиковая память процесса недоступна
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Замер этапа: время (wall), процессорное время (включая завершённые дочерние процессы — ffmpeg)
+# и пиковая память процесса и дочерних процессов к концу этапа, МБ (None, если платформа её не сообщает)
+Span = namedtuple("Span", ["name", "wall", "cpu", "peak_rss_mb", "peak_children_rss_mb"])
+
+# Границы корзин гистограммы времени кадра, мс (последняя корзина — всё, что дольше)
+FRAME_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Активный сбор метрик (None — выключен, фабрики кадров не оборачиваются)
+_active = None
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def peak_rss_bytes(children=False):
+    """
+    Пиковый RSS в байтах: текущего процесса или (children=True) самого крупного завершённого
+    дочернего процесса. None, если платформа его не сообщает (нет модуля resource, Windows).
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss в macOS — в байтах, в Linux и других Unix — в килобайтах
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def peak_rss_mb(children=False):
+    """Пиковый RSS в МБ (см. peak_rss_bytes) или None."""
+    peak = peak_rss_bytes(children)
+    return round(peak / 1024.0 ** 2, 1) if peak is not None else None
+
+
+class FrameHistogram:
+    """Распределение времени генерации кадра: число, сумма, минимум, максимум и корзины FRAME_BUCKETS_MS."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(FRAME_BUCKETS_MS) + 1)
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+        self.buckets[bisect.bisect_left(FRAME_BUCKETS_MS, ms)] += 1
+
+    def merge(self, other):
+        """Добавляет замеры другой гистограммы (например, собранной в рабочем процессе)."""
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "min_ms": round(self.min, 3) if self.min is not None else None,
+            "max_ms": round(self.max, 3) if self.max is not None else None,
+            "buckets_ms": list(FRAME_BUCKETS_MS),
+            "bucket_counts": list(self.buckets),
+        }
+
+
+class RunMetrics:
+    """Метрики одного запуска: этапы (Span) в порядке завершения и гистограммы времени кадра по фабрикам."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+        self.frames = {}
+
+    @contextmanager
+    def span(self, name):
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        try:
+            yield
+        finally:
+            record = Span(name, round(time.perf_counter() - wall, 4), round(_cpu_seconds() - cpu, 4),
+                          peak_rss_mb(), peak_rss_mb(children=True))
+            self.spans.append(record)
+            logger.debug("Этап %s: %.2f сек (CPU %.2f сек), пик памяти %s МБ",
+                         name, record.wall, record.cpu, record.peak_rss_mb)
+
+    def timed_frames(self, name, make_frame):
+        """Оборачивает make_frame: время каждого вызова попадает в гистограмму name."""
+        histogram = self.frames.setdefault(name, FrameHistogram())
+
+        def timed(t):
+            start = time.perf_counter()
+            frame = make_frame(t)
+            histogram.add(time.perf_counter() - start)
+            return frame
+
+        return timed
+
+    def to_dict(self):
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "total_seconds": round(time.time() - self.started, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_children_rss_mb": peak_rss_mb(children=True),
+            "stages": [record._asdict() for record in self.spans],
+            "frames": {name: histogram.to_dict() for name, histogram in self.frames.items()},
+        }
+
+    def summary(self):
+        """Строка для журнала: этапы и их время."""
+        return ", ".join("%s %.2f сек" % (record.name, record.wall) for record in self.spans)
+
+    def write_json(self, path, **extra):
+        data = dict(extra, **self.to_dict())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        logger.info("Метрики записаны: %s", path)
+
+
+def start_run():
+    """Включает сбор метрик для текущего процесса и возвращает RunMetrics."""
+    global _active
+    _active = RunMetrics()
+    return _active
+
+
+def stop_run():
+    """Выключает сбор метрик."""
+    global _active
+    _active = None
+
+
+@contextmanager
+def span(name):
+    """Замер этапа в активном сборе; без активного сбора ничего не делает."""
+    if _active is None:
+        yield
+        return
+    with _active.span(name):
+        yield
+
+
+def timed_frames(name, make_frame):
+    """Оборачивает фабрику кадров для гистограммы; без активного сбора возвращает make_frame как есть."""
+    if _active is None:
+        return make_frame
+    return _active.timed_frames(name, make_frame)
+
+
+def collecting():
+    """True, если сбор метрик включён в текущем процессе."""
+    return _active is not None
+
+
+def merge_frames(frames):
+    """Добавляет гистограммы {имя: FrameHistogram} в активный сбор; без активного сбора ничего не делает."""
+    if _active is None:
+        return
+    for name, histogram in frames.items():
+        _active.frames.setdefault(name, FrameHistogram()).merge(histogram)
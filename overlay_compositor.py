@@ -0,0 +1,72 @@
+# overlay_compositor.py
+import hashlib
+import logging
+import numpy as np
+from PIL import Image
+from image_processor import TARGET_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _runs(mask):
+    """Непрерывные отрезки [start, end) индексов, где mask истинна."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def opaque_regions(alpha):
+    """
+    Прямоугольники (top, bottom, left, right), покрывающие все непрозрачные пиксели alpha.
+    Строки делятся на полосы по пустым промежуткам, внутри полосы — столбцы (текст и логотип отдельно).
+    """
+    regions = []
+    for top, bottom in _runs(alpha.any(axis=1)):
+        band = alpha[top:bottom]
+        for left, right in _runs(band.any(axis=0)):
+            regions.append((int(top), int(bottom), int(left), int(right)))
+    return regions
+
+
+class OverlayCompositor:
+    """
+    Оверлей (текст/логотип), подготовленный для быстрого наложения на кадры.
+
+    Слой из generate_overlay один раз переводится в numpy с предумноженной альфой,
+    и хранятся только области с непрозрачными пикселями. Кадр смешивается на месте
+    внутри этих областей, так что стоимость наложения зависит от площади текста и логотипа,
+    а не от размера кадра.
+    """
+
+    def __init__(self, overlay, size=TARGET_SIZE):
+        overlay = overlay.convert("RGBA")
+        if overlay.size != tuple(size):
+            overlay = overlay.resize(size, Image.LANCZOS)
+
+        rgba = np.asarray(overlay)
+        alpha = rgba[..., 3]
+        self.regions = []
+        for top, bottom, left, right in opaque_regions(alpha):
+            a = alpha[top:bottom, left:right, None].astype(np.uint16)
+            premultiplied = (rgba[top:bottom, left:right, :3] * a + 127) // 255
+            self.regions.append((slice(top, bottom), slice(left, right),
+                                 premultiplied.astype(np.uint16), 255 - a))
+
+        area = sum((r[0].stop - r[0].start) * (r[1].stop - r[1].start) for r in self.regions)
+        logger.debug("Оверлей: %d областей, %.1f%% кадра", len(self.regions), 100.0 * area / (size[0] * size[1]))
+
+    def fingerprint(self):
+        """SHA-256 подготовленного оверлея (области и их пиксели) — для отпечатков клипов."""
+        digest = hashlib.sha256()
+        for rows, cols, premultiplied, inverse_alpha in self.regions:
+            digest.update(repr((rows.start, rows.stop, cols.start, cols.stop)).encode("ascii"))
+            digest.update(premultiplied.tobytes())
+            digest.update(inverse_alpha.tobytes())
+        return digest.hexdigest()
+
+    def apply(self, frame):
+        """Накладывает оверлей на RGB-кадр (uint8, H x W x 3) на месте и возвращает его."""
+        for rows, cols, premultiplied, inverse_alpha in self.regions:
+            dst = frame[rows, cols]
+            dst[...] = (dst * inverse_alpha + 127) // 255 + premultiplied
+        return frame
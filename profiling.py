@@ -0,0 +1,156 @@
+# profiling.py
+import os
+import time
+import signal
+import cProfile
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Окно профилирования по умолчанию: первые N кадров итогового видео
+DEFAULT_PROFILE_FRAMES = 100
+
+# Интервал сэмплирования стека для collapsed-файла, сек процессорного времени
+SAMPLE_INTERVAL = 0.005
+
+# Активный профилировщик (None — выключен, кадры не оборачиваются)
+_active = None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class FrameProfiler:
+    """
+    Профилирует генерацию кадров в ограниченном окне: первые `frames` кадров
+    или `seconds` секунд их генерации (что наступит раньше).
+
+    Внутри окна работает cProfile (результат — pstats), и, где есть SIGPROF, параллельно
+    сэмплируется стек Python по таймеру процессорного времени (результат — collapsed-стеки
+    для flame graph: по строке «кадр;кадр;... вес» на уникальный стек, вес — в интервалах
+    SAMPLE_INTERVAL). После окна обёртка кадра сводится к одной проверке флага.
+    """
+
+    def __init__(self, frames=DEFAULT_PROFILE_FRAMES, seconds=None, interval=SAMPLE_INTERVAL):
+        self.frames_left = frames
+        self.seconds_left = seconds
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self.frames = 0
+        self.done = False
+        self._running = False
+        self._last_sample = 0.0
+        self._previous_handler = None
+        self.sampling = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        if self.sampling:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+
+    def _sample(self, signum, frame):
+        if not self._running:
+            return  # запоздавший сигнал после закрытия окна
+        # Сигнал обрабатывается только между инструкциями Python: за долгий вызов C-кода (PIL, numpy)
+        # несколько тиков сливаются в один, поэтому вес сэмпла — прошедшее процессорное время в интервалах
+        now = time.process_time()
+        weight = max(1, int(round((now - self._last_sample) / self.interval)))
+        self._last_sample = now
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += weight
+
+    def _start(self):
+        self._last_sample = time.process_time()
+        self.profile.enable()
+        if self.sampling:
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def _stop(self):
+        if self.sampling:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        self.profile.disable()
+
+    def wrap(self, make_frame):
+        """Оборачивает make_frame: вызовы внутри окна профилируются (вложенные — в составе внешнего)."""
+
+        def profiled(t):
+            if self.done or self._running:
+                return make_frame(t)
+            self._running = True
+            start = time.perf_counter()
+            self._start()
+            try:
+                return make_frame(t)
+            finally:
+                self._stop()
+                self._running = False
+                self._advance(time.perf_counter() - start)
+
+        return profiled
+
+    def _advance(self, seconds):
+        self.frames += 1
+        if self.frames_left is not None:
+            self.frames_left -= 1
+        if self.seconds_left is not None:
+            self.seconds_left -= seconds
+        if (self.frames_left is not None and self.frames_left <= 0) or \
+                (self.seconds_left is not None and self.seconds_left <= 0):
+            self.done = True
+            logger.info("Окно профилирования закрыто: %d кадров", self.frames)
+
+    def close(self):
+        """Останавливает сэмплирование и восстанавливает обработчик SIGPROF."""
+        self.done = True
+        if self.sampling:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+            self.sampling = False
+
+    def save(self, base_path):
+        """
+        Пишет base_path.prof (pstats) и base_path.collapsed (collapsed-стеки; пустой, если стек
+        не сэмплировался — нет SIGPROF или окно короче интервала сэмплирования).
+        Возвращает список записанных файлов; без профилированных кадров ничего не пишет.
+        """
+        if not self.frames:
+            logger.warning("Профилирование: ни один кадр не попал в окно, результат не сохранён")
+            return []
+        paths = [base_path + ".prof", base_path + ".collapsed"]
+        self.profile.dump_stats(paths[0])
+        with open(paths[1], "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write("%s %d\n" % (stack, count))
+        if not self.stacks:
+            logger.warning("Профилирование: стек не сэмплировался (нет SIGPROF или окно короче %.0f мс "
+                           "процессорного времени), файл %s пуст", self.interval * 1000, paths[1])
+        logger.info("Профиль %d кадров сохранён: %s", self.frames, ", ".join(paths))
+        return paths
+
+
+def start_profile(frames=DEFAULT_PROFILE_FRAMES, seconds=None):
+    """Включает профилирование кадров в текущем процессе и возвращает FrameProfiler."""
+    global _active
+    _active = FrameProfiler(frames, seconds)
+    return _active
+
+
+def stop_profile():
+    """Выключает профилирование (результат остаётся в возвращённом start_profile объекте)."""
+    global _active
+    if _active is not None:
+        _active.close()
+    _active = None
+
+
+def profiled_clip(clip):
+    """Оборачивает make_frame клипа для профилирования; без активного профилировщика клип не меняется."""
+    if _active is not None:
+        clip.make_frame = _active.wrap(clip.make_frame)
+    return clip
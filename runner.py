@@ -2,12 +2,70 @@
 import time
 import logging
 import os
-from moviepy.editor import AudioFileClip
-from image_processor import load_and_process_images, generate_overlay
-from audio_processor import load_audio_clip
+import tempfile
+from PIL import Image
+from image_processor import (load_and_process_images, generate_overlay, list_image_files, headroom_size,
+                             MAX_HEADROOM)
+from audio_processor import render_audio_track
+from media_probe import probe_media
 from video_maker import create_video_from_images
+from ffmpeg_backend import render_with_ffmpeg
+from frame_cache import FrameCache
+from metrics import start_run, stop_run, span
+from profiling import start_profile, stop_profile
+from memory_budget import plan_memory, report_peak_usage
+
+# Черновой рендер: во сколько раз уменьшается кадр и предельная частота кадров
+PREVIEW_SCALE = 4
+PREVIEW_FPS = 12
+
+
+def preview_size(size):
+    """Размер кадра чернового рендера: в PREVIEW_SCALE раз меньше, стороны чётные (требование yuv420p)."""
+    return tuple(max(2, int(round(side / PREVIEW_SCALE / 2)) * 2) for side in size)
+
 
 def run_vvm(args):
+    """
+    Запускает рендер и собирает метрики этапов (время, процессорное время, пиковая память)
+    и гистограммы времени кадра. Сводка по этапам пишется в журнал, с --metrics-json — ещё и в JSON.
+    С --profile окно генерации кадров профилируется, результат сохраняется рядом с выходным файлом.
+    """
+    logger = logging.getLogger(__name__)
+    metrics = start_run()
+    profiler = None
+    if args.profile:
+        if args.backend == "ffmpeg":
+            logger.warning("Профилирование кадров доступно только для moviepy: с --backend ffmpeg кадры строит ffmpeg")
+        else:
+            if (args.encode_workers or 1) > 1:
+                logger.warning("С --encode-workers > 1 клипы рендерятся в рабочих процессах и в профиль не попадают: "
+                               "для профилирования кадров запустите рендер с --encode-workers 1")
+            profiler = start_profile(args.profile_frames or None, args.profile_seconds)
+    status = "error"
+    try:
+        _run_vvm(args)
+        status = "ok"
+    finally:
+        stop_run()
+        if profiler:
+            stop_profile()
+            try:
+                profiler.save(os.path.splitext(args.output)[0])
+            except OSError as e:
+                logger.warning("Не удалось сохранить профиль: %s", e)
+        logger.info("Этапы: %s", metrics.summary())
+        if args.memory_budget:
+            report_peak_usage(args.memory_budget)
+        if args.metrics_json:
+            try:
+                metrics.write_json(args.metrics_json, status=status, output=args.output,
+                                   memory_budget=args.memory_budget)
+            except OSError as e:
+                logger.warning("Не удалось записать метрики (%s): %s", args.metrics_json, e)
+
+
+def _run_vvm(args):
     # === ИНИЦИАЛИЗАЦИЯ ===
     logger = logging.getLogger(__name__)
     logger.info("==== Запуск VVM через runner.py ====")
@@ -41,29 +99,52 @@ def run_vvm(args):
 
     args.output = output_path
 
+    # Каталог клипов (и журнал) инкрементального и возобновляемого рендера хранится рядом с выходным файлом
+    parts_dir = os.path.splitext(output_path)[0] + ".parts" if args.incremental or args.resume else None
+
+    # === РАЗРЕШЕНИЕ И ЧЕРНОВОЙ РЕНДЕР ===
+    # Черновик отличается только размером кадра, фильтром, частотой кадров и пресетом x264:
+    # длительности заданы в секундах, поэтому тайминг совпадает с итоговым рендером
+    size, fps = tuple(args.resolution), args.fps
+    resample, preset = Image.Resampling.LANCZOS, "medium"
+    if args.preview:
+        size, fps = preview_size(size), min(fps, PREVIEW_FPS)
+        resample, preset = Image.Resampling.BILINEAR, "ultrafast"
+        logger.info("Черновой рендер: %dx%d, %d fps, пресет %s", size[0], size[1], fps, preset)
+
     # === ОБРАБОТКА ИЗОБРАЖЕНИЙ ===
     logger.info("Загрузка изображений из каталога: %s", args.images)
     skip_overlay = args.zoom or args.zoom_out  # Если включён zoom — наложение текста/лого позже
+    # Для zoom изображения готовятся с запасом разрешения: увеличенный кадр не растягивает пиксели
+    headroom = min(1 + (args.zoom or args.zoom_out), MAX_HEADROOM) if skip_overlay else 1.0
 
-    images = load_and_process_images(
-        args.images,
-        bgcolor=args.bgcolor,
-        text=args.text,
-        text_position=args.text_position,
-        font_size=args.font_size,
-        font_color=args.font_color,
-        font_path=args.font_path,
-        logo_path=args.logo_path,
-        logo_scale=args.logo_scale,
-        logo_coords=args.logo_coords,
-        skip_overlay=skip_overlay
-    )
+    # Дисковый кэш подготовленных кадров (повторные запуски не декодируют изображения)
+    frame_cache = None
+    if not args.no_frame_cache and args.frame_cache:
+        try:
+            frame_cache = FrameCache(args.frame_cache, args.frame_cache_size)
+            logger.info("Кэш кадров: %s (лимит %.1f МБ)", args.frame_cache, args.frame_cache_size / 1024 ** 2)
+        except OSError as e:
+            logger.warning("Кэш кадров недоступен (%s): %s", args.frame_cache, e)
 
-    # === ПОДГОТОВКА ОВЕРЛЕЯ (если зум включён) ===
-    overlays = None
-    if skip_overlay:
-        logger.info("Zoom-режим активен — текст и логотип будут наложены через оверлеи")
-        overlay_img = generate_overlay(
+    # === БЮДЖЕТ ПАМЯТИ ===
+    # Режим хранения кадров и число процессов выбираются по числу файлов до загрузки
+    memory_plan = None
+    image_workers, encode_workers = args.image_workers, args.encode_workers
+    if args.memory_budget:
+        memory_plan = plan_memory(args.memory_budget, len(list_image_files(args.images)),
+                                  headroom_size(size, headroom),
+                                  image_workers, encode_workers)
+        image_workers, encode_workers = memory_plan.image_workers, memory_plan.encode_workers
+        logger.info("Бюджет памяти %.1f МБ: выгрузка кадров на диск — %s, кадров в памяти — %d, "
+                    "процессов загрузки — %d, кодирования — %d",
+                    args.memory_budget / 1024 ** 2, "да" if memory_plan.spill else "нет",
+                    memory_plan.max_resident, image_workers, encode_workers)
+
+    with span("load_images"):
+        images = load_and_process_images(
+            args.images,
+            bgcolor=args.bgcolor,
             text=args.text,
             text_position=args.text_position,
             font_size=args.font_size,
@@ -71,8 +152,33 @@ def run_vvm(args):
             font_path=args.font_path,
             logo_path=args.logo_path,
             logo_scale=args.logo_scale,
-            logo_coords=args.logo_coords
+            logo_coords=args.logo_coords,
+            skip_overlay=skip_overlay,
+            workers=image_workers,
+            lazy=args.lazy_images or bool(memory_plan and memory_plan.spill),
+            cache=frame_cache,
+            size=size,
+            resample=resample,
+            max_resident=memory_plan.max_resident if memory_plan else 3,
+            headroom=headroom
         )
+
+    # === ПОДГОТОВКА ОВЕРЛЕЯ (если зум включён) ===
+    overlays = None
+    if skip_overlay:
+        logger.info("Zoom-режим активен — текст и логотип будут наложены через оверлеи")
+        with span("overlay"):
+            overlay_img = generate_overlay(
+                text=args.text,
+                text_position=args.text_position,
+                font_size=args.font_size,
+                font_color=args.font_color,
+                font_path=args.font_path,
+                logo_path=args.logo_path,
+                logo_scale=args.logo_scale,
+                logo_coords=args.logo_coords,
+                size=size
+            )
         overlays = [overlay_img] * len(images)  # Один и тот же оверлей для всех изображений
 
     if not images:
@@ -90,6 +196,8 @@ def run_vvm(args):
 
             idx = max(0, min(idx, len(images) - 1))  # Корректировка индекса
             cover_image = images[idx]
+            if headroom != 1.0:
+                cover_image = cover_image.resize(tuple(size), resample)  # Кадр с запасом для zoom
 
             # Определение пути для сохранения обложки
             if args.output:
@@ -111,7 +219,8 @@ def run_vvm(args):
     audio_duration = 0
     if args.audio:
         try:
-            audio_duration = AudioFileClip(args.audio).duration
+            with span("audio_probe"):
+                audio_duration = probe_media(args.audio).duration
         except Exception as e:
             logger.warning("Не удалось определить длительность аудио: %s", e)
 
@@ -131,33 +240,87 @@ def run_vvm(args):
 
     logger.info("Режимы: mode=%s, image_mode=%s, audio_mode=%s", args.mode, image_mode, audio_mode)
 
-    # === ЗАГРУЗКА И ОБРАБОТКА АУДИО ===
-    audio_clip = None
-    if args.audio:
-        try:
-            audio_clip = load_audio_clip(
-                path=args.audio,
-                mode=audio_mode,
-                video_duration=total_image_duration
+    # === РЕНДЕР ЧЕРЕЗ FFMPEG (каждый клип своим графом фильтров, склейка без перекодирования) ===
+    if args.backend == "ffmpeg":
+        ignored = [flag for flag, enabled in (
+            ("--encode-workers", (args.encode_workers or 1) > 1),
+            ("--incremental", args.incremental),
+            ("--resume", args.resume),
+            ("--still-fastpath", args.still_fastpath),
+            ("--reuse-loops", args.reuse_loops),
+            ("--spill-frames", args.spill_frames),
+        ) if enabled]
+        for flag in ignored:
+            logger.warning("Опция %s относится только к движку moviepy и не действует с --backend ffmpeg", flag)
+        with span("render"):
+            render_with_ffmpeg(
+                images=images,
+                duration=args.duration,
+                fps=fps,
+                output_path=args.output,
+                bitrate=args.bitrate,
+                crf=args.crf,
+                audio_path=args.audio,
+                audio_mode=audio_mode,
+                total_duration=total_image_duration,
+                transition=args.transition,
+                transition_duration=args.transition_duration,
+                zoom_factor=args.zoom,
+                zoom_out_factor=args.zoom_out,
+                overlay=overlays[0] if overlays else None,
+                audio_fade=args.audio_fade,
+                size=size,
+                preset=preset
+            )
+        logger.info("Видео успешно создано: %s", args.output)
+        logger.info("Общее время выполнения: %.2f сек", time.time() - start_time)
+        return
+
+    # === ПОДГОТОВКА АУДИОДОРОЖКИ ===
+    # Дорожка готовится один раз отдельным процессом ffmpeg; видео кодируется без звука
+    # и объединяется с ней копированием потоков
+    with tempfile.TemporaryDirectory() as audio_dir:
+        audio_track = None
+        if args.audio:
+            try:
+                with span("audio_render"):
+                    audio_track = render_audio_track(
+                        path=args.audio,
+                        mode=audio_mode,
+                        video_duration=total_image_duration,
+                        workdir=audio_dir,
+                        fade_in_duration=args.audio_fade,
+                        fade_out_duration=args.audio_fade
+                    )
+            except Exception as e:
+                logger.error("Ошибка при обработке аудиофайла: %s", e)
+
+        # === СОЗДАНИЕ ВИДЕО ===
+        with span("create_video"):
+            create_video_from_images(
+                images=images,
+                duration=args.duration,
+                fps=fps,
+                output_path=args.output,
+                bitrate=args.bitrate,
+                crf=args.crf,
+                audio_clip=audio_track,
+                transition=args.transition,
+                transition_duration=args.transition_duration,
+                zoom_factor=args.zoom,
+                zoom_out_factor=args.zoom_out,
+                overlays=overlays,
+                spill_frames=args.spill_frames,
+                reuse_loops=args.reuse_loops,
+                still_fastpath=args.still_fastpath,
+                encode_workers=encode_workers,
+                parts_dir=parts_dir,
+                keep_parts=args.incremental,
+                size=size,
+                resample=resample,
+                preset=preset,
+                memory_plan=memory_plan
             )
-        except Exception as e:
-            logger.error("Ошибка при обработке аудиофайла: %s", e)
-
-    # === СОЗДАНИЕ ВИДЕО ===
-    create_video_from_images(
-        images=images,
-        duration=args.duration,
-        fps=args.fps,
-        output_path=args.output,
-        bitrate=args.bitrate,
-        crf=args.crf,
-        audio_clip=audio_clip,
-        transition=args.transition,
-        transition_duration=args.transition_duration,
-        zoom_factor=args.zoom,
-        zoom_out_factor=args.zoom_out,
-        overlays=overlays
-    )
 
     # === ЗАВЕРШЕНИЕ ===
     end_time = time.time()
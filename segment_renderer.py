@@ -0,0 +1,230 @@
+# segment_renderer.py
+import os
+import json
+import math
+import hashlib
+import logging
+from collections import namedtuple
+import numpy as np
+from ffmpeg_tools import encode_frames, concat_copy
+
+logger = logging.getLogger(__name__)
+
+# Версия формата манифеста и отпечатков клипов: меняется при изменении алгоритма рендера
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+JOURNAL_NAME = "journal.jsonl"
+
+# Отрезок таймлайна в кадрах [start_frame, end_frame); static — изображение на отрезке не меняется
+Segment = namedtuple("Segment", ["start_frame", "end_frame", "static"])
+
+# Клип таймлайна номер clip: изображение image с переходом к next_image (None — последний клип)
+# и его кадры [start_frame, end_frame) на общей сетке кадров
+ClipChunk = namedtuple("ClipChunk", ["clip", "image", "next_image", "start_frame", "end_frame"])
+
+
+def frame_index(t, fps):
+    """Номер первого кадра, время которого не меньше t (сетка кадров как у moviepy)."""
+    return int(math.ceil(t * fps - 1e-6))
+
+
+def plan_segments(num_clips, duration, fps, transition, transition_duration, animated,
+                  total_duration, last_has_transition=False):
+    """
+    Делит таймлайн из num_clips изображений по duration секунд на отрезки по границам кадров.
+
+    Неподвижные отрезки: всё изображение при transition="none" и для последнего клипа,
+    «плато» между fade-in и fade-out, часть перед slide/push/crossfade. При zoom (animated) меняется каждый кадр.
+    Соседние динамические отрезки объединяются, всё обрезается по total_duration.
+    """
+    td = transition_duration
+    ranges = []
+    for idx in range(num_clips):
+        start, end = idx * duration, (idx + 1) * duration
+        is_last = idx == num_clips - 1 and not last_has_transition
+
+        if animated:
+            ranges.append((start, end, False))
+        elif is_last or transition == "none":
+            ranges.append((start, end, True))
+        elif transition == "fade" and duration > 2 * td:
+            ranges += [(start, start + td, False), (start + td, end - td, True), (end - td, end, False)]
+        elif transition in ("slide", "push", "crossfade") and duration > td:
+            ranges += [(start, end - td, True), (end - td, end, False)]
+        else:
+            ranges.append((start, end, False))
+
+    segments = []
+    for start, end, static in ranges:
+        start_frame = frame_index(start, fps)
+        end_frame = frame_index(min(end, total_duration), fps)
+        if end_frame <= start_frame:
+            continue
+        previous = segments[-1] if segments else None
+        if previous and not static and not previous.static and previous.end_frame == start_frame:
+            segments[-1] = previous._replace(end_frame=end_frame)
+        else:
+            segments.append(Segment(start_frame, end_frame, static))
+    return segments
+
+
+def plan_clip_chunks(num_images, num_clips, duration, fps, total_duration):
+    """
+    Делит таймлайн из num_clips клипов (изображения идут по кругу) на части по границам изображений.
+    Каждая часть кодируется отдельно и начинается с ключевого кадра; всё обрезается по total_duration.
+    """
+    chunks = []
+    for clip in range(num_clips):
+        start_frame = frame_index(clip * duration, fps)
+        end_frame = frame_index(min((clip + 1) * duration, total_duration), fps)
+        if end_frame <= start_frame:
+            continue
+        next_image = (clip + 1) % num_images if clip + 1 < num_clips else None
+        chunks.append(ClipChunk(clip, clip % num_images, next_image, start_frame, end_frame))
+    return chunks
+
+
+def array_digest(arr):
+    """SHA-256 пикселей подготовленного изображения."""
+    return hashlib.sha256(memoryview(np.ascontiguousarray(arr)).cast("B")).hexdigest()
+
+
+def chunk_fingerprint(chunk, image_digests, overlay_digest, params):
+    """
+    Отпечаток закодированного клипа: всё, от чего зависят его кадры.
+
+    Изображение, соседнее изображение (только для переходов, которые его показывают),
+    параметры эффектов и кодирования, положение клипа на сетке кадров и число кадров.
+    Номер клипа не входит: одинаковые клипы разных кругов дают один отпечаток.
+    """
+    fps, duration = params["fps"], params["duration"]
+    shows_next = params["transition"] in ("slide", "push", "crossfade")
+    payload = {
+        "version": MANIFEST_VERSION,
+        "image": image_digests[chunk.image],
+        "next": (image_digests[chunk.next_image] if shows_next else True) if chunk.next_image is not None else None,
+        "overlay": overlay_digest,
+        "offset": round(chunk.start_frame / fps - chunk.clip * duration, 6),
+        "frames": chunk.end_frame - chunk.start_frame,
+        "params": {key: value for key, value in params.items() if key != "animated"},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_manifest(parts_dir):
+    """Готовые клипы из манифеста прошлого рендера: {отпечаток: (файл, размер)}."""
+    path = os.path.join(parts_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Манифест %s не прочитан, все клипы будут закодированы заново: %s", path, e)
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return {segment["fingerprint"]: (segment["file"], segment.get("size"))
+            for segment in manifest.get("segments", [])}
+
+
+def save_manifest(parts_dir, chunks, fingerprints, file_names):
+    """Атомарно записывает манифест: порядок клипов, их отпечатки, файлы и размеры файлов."""
+    segments = [{"clip": chunk.clip, "fingerprint": fingerprint, "file": name,
+                 "frames": chunk.end_frame - chunk.start_frame,
+                 "size": os.path.getsize(os.path.join(parts_dir, name))}
+                for chunk, fingerprint, name in zip(chunks, fingerprints, file_names)]
+    path = os.path.join(parts_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "segments": segments}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+class RenderJournal:
+    """
+    Журнал рендера в каталоге клипов: строка JSON на каждый клип, дописывается сразу после его кодирования.
+    После сбоя повторный запуск берёт из журнала готовые клипы и продолжает с первого недостающего.
+    """
+
+    def __init__(self, parts_dir):
+        self.path = os.path.join(parts_dir, JOURNAL_NAME)
+
+    def load(self):
+        """Готовые клипы: {отпечаток: (файл, размер)}. Недописанная при сбое строка пропускается."""
+        completed = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("version") == MANIFEST_VERSION:
+                        completed[entry["fingerprint"]] = (entry["file"], entry["size"])
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def record(self, fingerprint, path):
+        """Отмечает клип готовым; запись сбрасывается на диск до перехода к следующему."""
+        entry = {"version": MANIFEST_VERSION, "fingerprint": fingerprint,
+                 "file": os.path.basename(path), "size": os.path.getsize(path)}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def completed_parts(parts_dir):
+    """
+    Отпечатки клипов, файлы которых можно использовать повторно: из манифеста и журнала,
+    при условии что файл существует и его размер совпадает с записанным.
+    """
+    entries = load_manifest(parts_dir)
+    entries.update(RenderJournal(parts_dir).load())
+    completed = set()
+    for fingerprint, (name, size) in entries.items():
+        path = os.path.join(parts_dir, name)
+        if os.path.isfile(path) and (size is None or os.path.getsize(path) == size):
+            completed.add(fingerprint)
+    return completed
+
+
+def segment_duration(segment, fps):
+    return (segment.end_frame - segment.start_frame) / fps
+
+
+def encode_segment(video, segment, fps, path, export):
+    """Кодирует отрезок клипа video: неподвижный — одним удерживаемым кадром, остальные — покадрово."""
+    nframes = segment.end_frame - segment.start_frame
+    if segment.static:
+        # Кадр берётся из середины отрезка, чтобы не попасть на границу соседнего клипа
+        frame = video.get_frame((segment.start_frame + segment.end_frame - 1) / 2.0 / fps)
+        encode_frames([frame], video.size, fps, path, hold_frames=nframes, **export)
+    else:
+        frames = (video.get_frame(k * (1.0 / fps)) for k in range(segment.start_frame, segment.end_frame))
+        encode_frames(frames, video.size, fps, path, **export)
+
+
+def write_segmented(video, output_path, fps, export, segments, workdir, audio_path=None, prefix="segment"):
+    """Кодирует отрезки в отдельные файлы и склеивает их без перекодирования (с аудио, если задано)."""
+    paths = []
+    for number, segment in enumerate(segments):
+        path = os.path.join(workdir, "%s_%04d.mp4" % (prefix, number))
+        encode_segment(video, segment, fps, path, export)
+        paths.append(path)
+
+    static_frames = sum(s.end_frame - s.start_frame for s in segments if s.static)
+    logger.info("Отрезков: %d, неподвижных кадров без покадровой генерации: %d", len(segments), static_frames)
+
+    durations = [segment_duration(segment, fps) for segment in segments]
+    concat_copy(paths, output_path, audio_path=audio_path, duration=sum(durations) if audio_path else None,
+                durations=durations)
+    return sum(durations)
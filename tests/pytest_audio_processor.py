@@ -2,8 +2,9 @@ import os
 import tempfile
 import pytest
 from pydub.generators import Sine
-from audio_processor import load_audio_clip
-from unittest.mock import patch, MagicMock
+from audio_processor import render_audio_track, AudioTrack
+from media_probe import MediaInfo, probe_media, clear_probe_cache
+from unittest.mock import patch
 
 
 @pytest.fixture
@@ -16,38 +17,42 @@ def temp_wav_file():
     os.remove(path)
 
 
-def test_load_audio_cut(temp_wav_file):
-    """Проверка режима cut: аудио обрезается до видео"""
-    clip = load_audio_clip(temp_wav_file, mode="cut", video_duration=1.5)
-    assert round(clip.duration, 1) == 1.5
-
-
-def test_load_audio_loop(temp_wav_file):
-    """Проверка режима loop: аудио повторяется до нужной длины"""
-    clip = load_audio_clip(temp_wav_file, mode="loop", video_duration=6)
-    assert round(clip.duration) == 6
-
-
-def test_fade_in_out_applied(temp_wav_file):
-    """Проверка применения эффектов fade-in и fade-out"""
-    clip = load_audio_clip(temp_wav_file, mode="cut", video_duration=2, fade_in_duration=0.5, fade_out_duration=0.5)
-    assert clip.duration == 2
-
-
-def test_audio_file_not_found():
-    """Ошибка при передаче несуществующего файла"""
-    with pytest.raises(Exception):
-        load_audio_clip("nonexistent.wav", mode="cut", video_duration=2)
-
-
-@patch("audio_processor.AudioFileClip")
-def test_audio_invalid_mode(mock_clip):
-    """Некорректный режим вызывает warning, но не исключение"""
-    mock_audio = MagicMock()
-    mock_audio.duration = 5.0
-    mock_audio.audio_fadein.return_value = mock_audio
-    mock_audio.audio_fadeout.return_value = mock_audio
-    mock_clip.return_value = mock_audio
-
-    clip = load_audio_clip("dummy.mp3", mode="invalid", video_duration=5.0)
-    assert clip is mock_audio
+def test_render_audio_track_loop_and_fade(temp_wav_file, tmp_path):
+    """Зацикленная дорожка с fade рендерится один раз в AAC нужной длины"""
+    track = render_audio_track(temp_wav_file, mode="loop", video_duration=7.0, workdir=str(tmp_path))
+    assert track.path == str(tmp_path / "audio.m4a")
+    assert track.duration == 7.0
+
+    clear_probe_cache()
+    info = probe_media(track.path)
+    assert info.codec == "aac"
+    assert info.duration == pytest.approx(7.0, abs=0.05)
+
+
+def test_render_audio_track_passthrough(tmp_path):
+    """Без обработки MP4-совместимый трек используется как есть, без запуска ffmpeg"""
+    source = str(tmp_path / "music.m4a")
+    with patch("audio_processor.probe_media", return_value=MediaInfo(30.0, 44100, 2, "aac")), \
+            patch("audio_processor.run_ffmpeg") as mock_run:
+        track = render_audio_track(source, mode="cut", video_duration=12.0, workdir=str(tmp_path),
+                                   fade_in_duration=0, fade_out_duration=0)
+    assert track == AudioTrack(source, 12.0)
+    mock_run.assert_not_called()
+
+
+def test_render_audio_track_reencodes_wav(temp_wav_file, tmp_path):
+    """PCM из WAV нельзя скопировать в MP4 — дорожка перекодируется даже без fade"""
+    track = render_audio_track(temp_wav_file, mode="cut", video_duration=2.0, workdir=str(tmp_path),
+                               fade_in_duration=0, fade_out_duration=0)
+    assert track.path != temp_wav_file and track.duration == 2.0
+
+
+def test_render_audio_track_invalid_mode(tmp_path, caplog):
+    """Некорректный режим вызывает warning и обрабатывается как cut без fade, но не исключение"""
+    source = str(tmp_path / "music.m4a")
+    with patch("audio_processor.probe_media", return_value=MediaInfo(30.0, 44100, 2, "aac")), \
+            patch("audio_processor.run_ffmpeg") as mock_run:
+        track = render_audio_track(source, mode="invalid", video_duration=12.0, workdir=str(tmp_path))
+    assert track == AudioTrack(source, 12.0)
+    mock_run.assert_not_called()
+    assert "Неизвестный режим" in caplog.text
@@ -0,0 +1,51 @@
+from PIL import Image
+from benchmarks.suite import compare_results, make_images, run_stage
+
+
+def _results(**stages):
+    return {"stages": stages}
+
+
+def test_compare_results_flags_growth_above_threshold():
+    """Регрессией считается рост времени или памяти этапа больше порога"""
+    baseline = _results(zoom_in={"seconds": 1.0, "peak_rss_mb": 100.0},
+                        render={"seconds": 10.0, "peak_rss_mb": 300.0})
+    current = _results(zoom_in={"seconds": 1.5, "peak_rss_mb": 110.0},
+                       render={"seconds": 9.0, "peak_rss_mb": 400.0})
+
+    regressions = compare_results(current, baseline, threshold=0.2)
+
+    assert regressions == [("zoom_in", "seconds", 1.0, 1.5, 1.5),
+                           ("render", "peak_rss_mb", 300.0, 400.0, 1.333)]
+
+
+def test_compare_results_skips_missing_stages_and_metrics():
+    """Этапы и метрики, которых нет в одном из прогонов, не сравниваются"""
+    baseline = _results(slide={"seconds": 1.0}, push={"seconds": 1.0})
+    current = _results(slide={"seconds": 1.1, "peak_rss_mb": 50.0})
+
+    assert compare_results(current, baseline, threshold=0.2) == []
+
+
+def test_run_stage_load_images(tmp_path):
+    """Этап load_images загружает сгенерированные изображения и сообщает время и память"""
+    paths = make_images(str(tmp_path), 2, (400, 300))
+    assert [Image.open(p).size for p in paths] == [(400, 300)] * 2
+
+    config = dict(image_dir=str(tmp_path), resolution=(108, 192))
+    result = run_stage("load_images", config)
+
+    assert result["images"] == 2
+    assert result["seconds"] > 0
+    assert result["peak_rss_mb"] is None or result["peak_rss_mb"] > 0
+
+
+def test_peak_rss_without_platform_support(monkeypatch):
+    """Без данных о памяти (Windows) пик — None, и сравнение с базовым прогоном его пропускает"""
+    import benchmarks.suite as suite
+    monkeypatch.setattr(suite, "peak_rss_bytes", lambda children=False: None)
+    assert suite._peak_rss_mb() is None
+
+    baseline = _results(zoom_in={"seconds": 1.0, "peak_rss_mb": 100.0})
+    current = _results(zoom_in={"seconds": 1.0, "peak_rss_mb": suite._peak_rss_mb()})
+    assert compare_results(current, baseline) == []
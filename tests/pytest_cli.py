@@ -1,5 +1,6 @@
+import argparse
 import pytest
-from cli import parse_args
+from cli import parse_args, parse_size, parse_resolution
 
 @pytest.mark.parametrize("arg_list, expected", [
     (
@@ -43,3 +44,62 @@ def test_invalid_mode(monkeypatch):
     monkeypatch.setattr("sys.argv", ["prog", "--images", "img", "--mode", "wrongmode"])
     with pytest.raises(SystemExit):
         parse_args()
+
+
+def test_image_workers(monkeypatch):
+    """--image-workers задаёт число процессов, по умолчанию 1"""
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img"])
+    assert parse_args().image_workers == 1
+
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img", "--image-workers", "4"])
+    assert parse_args().image_workers == 4
+
+
+def test_encode_workers(monkeypatch):
+    """--encode-workers задаёт число процессов кодирования, по умолчанию 1"""
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img"])
+    assert parse_args().encode_workers == 1
+
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img", "--encode-workers", "8"])
+    assert parse_args().encode_workers == 8
+
+
+@pytest.mark.parametrize("value, expected", [("1024", 1024), ("2K", 2048), ("1.5G", int(1.5 * 1024 ** 3)), ("500mb", 500 * 1024 ** 2)])
+def test_parse_size(value, expected):
+    """Размеры с суффиксами переводятся в байты"""
+    assert parse_size(value) == expected
+
+
+def test_frame_cache_options(monkeypatch):
+    """Параметры кэша кадров: каталог, лимит и отключение"""
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img", "--frame-cache", "cache_dir",
+                                     "--frame-cache-size", "1G", "--no-frame-cache"])
+    args = parse_args()
+    assert args.frame_cache == "cache_dir"
+    assert args.frame_cache_size == 1024 ** 3
+    assert args.no_frame_cache is True
+
+
+def test_frame_cache_is_opt_in(monkeypatch):
+    """Кэш кадров выключен по умолчанию; --frame-cache без значения включает каталог по умолчанию"""
+    from frame_cache import DEFAULT_CACHE_DIR
+
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img"])
+    assert parse_args().frame_cache is None
+
+    monkeypatch.setattr("sys.argv", ["prog", "--frame-cache", "--images", "img"])
+    assert parse_args().frame_cache == DEFAULT_CACHE_DIR
+
+
+def test_resolution_and_preview(monkeypatch):
+    """--resolution разбирается в (ширина, высота), некорректное значение отклоняется"""
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img"])
+    args = parse_args()
+    assert args.resolution == (1080, 1920) and args.preview is False
+
+    monkeypatch.setattr("sys.argv", ["prog", "--images", "img", "--resolution", "720X1280", "--preview"])
+    args = parse_args()
+    assert args.resolution == (720, 1280) and args.preview is True
+
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_resolution("720p")
@@ -0,0 +1,82 @@
+import pytest
+from PIL import Image
+from moviepy.editor import VideoFileClip
+from ffmpeg_backend import build_clip_graph, count_clips, render_with_ffmpeg
+
+
+def test_count_clips_covers_total_duration():
+    """Клипов хватает на всю длительность, но не меньше числа изображений"""
+    assert count_clips(3, 1.0, 3.0) == 3
+    assert count_clips(3, 1.0, 7.5) == 8
+    assert count_clips(3, 2.0, 1.0) == 3
+
+
+def test_build_clip_graph_xfade_to_next_image():
+    """Переход xfade стоит в последних transition_duration секундах клипа, начало после перехода отрезается"""
+    graph = build_clip_graph(2.0, 24, transition="push", transition_duration=0.5, length=2.5, overlay_input=2)
+
+    assert "[v0][v1]xfade=transition=slideleft:duration=0.5:offset=2[x]" in graph
+    assert "[x]trim=start=0.5:end=2.5,setpts=PTS-STARTPTS[cut]" in graph
+    assert "[cut][2:v]overlay=0:0[ov]" in graph
+    assert "zoompan" not in graph
+
+    last = build_clip_graph(2.0, 24, transition="push", transition_duration=0.5, length=2.5, has_next=False)
+    assert "xfade" not in last and "[1:v]" not in last
+
+
+def test_build_clip_graph_fade_and_zoom():
+    """fade — затемнение всех клипов, кроме последнего; zoom — zoompan"""
+    graph = build_clip_graph(1.0, 10, transition="fade", transition_duration=0.25, zoom_factor=0.2)
+    last = build_clip_graph(1.0, 10, transition="fade", transition_duration=0.25, zoom_factor=0.2, has_next=False)
+
+    assert "zoompan=z='1+0.2*on/10'" in graph and "zoompan=z='1+0.2*on/10'" in last
+    assert graph.count("fade=t=out:st=0.75:d=0.25") == 1
+    assert "fade=t=out" not in last
+
+
+def test_render_with_ffmpeg_bounds_inputs_per_call(tmp_path, monkeypatch):
+    """Длинный таймлайн: у каждого вызова ffmpeg не больше трёх входов, одинаковые клипы кодируются один раз"""
+    import ffmpeg_backend
+
+    calls = []
+    original = ffmpeg_backend.run_ffmpeg
+
+    def counting_run(args):
+        calls.append(args.count("-i"))
+        original(args)
+
+    monkeypatch.setattr(ffmpeg_backend, "run_ffmpeg", counting_run)
+    images = [Image.new("RGB", (64, 112), color=c) for c in ["red", "green", "blue"]]
+    overlay = Image.new("RGBA", (64, 112))
+    output_path = str(tmp_path / "long.mp4")
+
+    render_with_ffmpeg(images, duration=0.5, fps=10, output_path=output_path, total_duration=60.0,
+                       transition="crossfade", transition_duration=0.2, zoom_factor=0.1, overlay=overlay,
+                       size=(64, 112))
+
+    # Клипы: первый, по одному на каждую пару соседних изображений и последний — 5 из 120
+    assert len(calls) == 5
+    assert max(calls) <= 3
+    with VideoFileClip(output_path) as video:
+        assert video.duration == pytest.approx(60.0, abs=0.1)
+
+
+def test_render_with_ffmpeg_slide_with_audio(tmp_path):
+    """Рендер через ffmpeg даёт видео нужной длительности с аудио и сменой изображений"""
+    from pydub.generators import Sine
+
+    audio_path = str(tmp_path / "tone.wav")
+    Sine(440).to_audio_segment(duration=1500).export(audio_path, format="wav")
+    images = [Image.new("RGB", (1080, 1920), color=c) for c in ["red", "green"]]
+    output_path = str(tmp_path / "ffmpeg.mp4")
+
+    render_with_ffmpeg(images, duration=1.0, fps=10, output_path=output_path, crf=35, audio_path=audio_path,
+                       audio_mode="loop", total_duration=3.5, transition="slide", transition_duration=0.4)
+
+    with VideoFileClip(output_path) as video:
+        assert video.duration == pytest.approx(3.5, abs=0.1)
+        assert video.audio is not None
+        r, g, b = video.get_frame(0.3)[960, 540]
+        assert r > 200 and g < 60
+        r, g, b = video.get_frame(1.3)[960, 540]
+        assert g > 100 and r < 60
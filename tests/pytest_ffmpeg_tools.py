@@ -0,0 +1,18 @@
+import pytest
+from ffmpeg_tools import run_ffmpeg, write_concat_list
+
+
+def test_concat_list_escapes_quotes(tmp_path):
+    """Пути в списке concat абсолютные, одинарные кавычки экранируются"""
+    list_path = write_concat_list(["a.mp4", "it's.mp4"], str(tmp_path / "list.txt"))
+    lines = open(list_path, encoding="utf-8").read().splitlines()
+
+    assert len(lines) == 2
+    assert lines[0].startswith("file '/") and lines[0].endswith("a.mp4'")
+    assert lines[1].endswith("it'\\''s.mp4'")
+
+
+def test_run_ffmpeg_error_raises():
+    """Ошибка ffmpeg превращается в RuntimeError с текстом stderr"""
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        run_ffmpeg(["-i", "definitely_missing_input.mp4", "out.mp4"])
@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from frame_cache import FrameCache
+from image_processor import load_and_process_images
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    img_dir = tmp_path / "imgs"
+    img_dir.mkdir()
+    for idx, color in enumerate(["red", "green"]):
+        Image.new("RGB", (300, 200), color=color).save(img_dir / f"{idx}.jpg")
+    return img_dir
+
+
+def test_put_get_roundtrip(tmp_path):
+    """Кадр сохраняется и читается через memory map"""
+    cache = FrameCache(str(tmp_path / "cache"), max_bytes=10 ** 9)
+    frame = np.full((4, 6, 3), 7, dtype=np.uint8)
+
+    cache.put("abc", frame)
+    loaded = cache.get("abc")
+
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, frame)
+    assert cache.get("missing") is None
+
+
+def test_key_depends_on_content_and_params(tmp_path, image_dir):
+    """Ключ меняется при изменении содержимого файла и параметров"""
+    cache = FrameCache(str(tmp_path / "cache"))
+    path = str(image_dir / "0.jpg")
+
+    key = cache.make_key(path, {"color": (0, 0, 0)})
+    assert key == cache.make_key(path, {"color": (0, 0, 0)})
+    assert key != cache.make_key(path, {"color": (255, 255, 255)})
+
+    Image.new("RGB", (300, 200), color="blue").save(path)
+    os.utime(path, ns=(0, 0))
+    assert key != cache.make_key(path, {"color": (0, 0, 0)})
+
+
+def test_key_depends_on_logo_and_font_content(tmp_path, image_dir):
+    """Правка файла логотипа или шрифта по тому же пути даёт новый ключ"""
+    cache = FrameCache(str(tmp_path / "cache"))
+    path = str(image_dir / "0.jpg")
+    logo_path, font_path = tmp_path / "logo.png", tmp_path / "font.ttf"
+    Image.new("RGBA", (10, 10), (255, 0, 0, 128)).save(logo_path)
+    font_path.write_bytes(b"font v1")
+    params = {"logo_path": str(logo_path), "font_path": str(font_path)}
+
+    key = cache.make_key(path, params)
+    font_path.write_bytes(b"font v2.0")
+    font_key = cache.make_key(path, params)
+    assert font_key != key
+
+    Image.new("RGBA", (10, 10), (0, 255, 0, 128)).save(logo_path)
+    os.utime(logo_path, ns=(0, 0))
+    assert cache.make_key(path, params) != font_key
+
+
+def test_lru_eviction(tmp_path):
+    """При превышении лимита удаляются давно не использованные кадры"""
+    frame = np.zeros((10, 10, 3), dtype=np.uint8)
+    cache = FrameCache(str(tmp_path / "cache"), max_bytes=10 ** 9)
+    for idx, key in enumerate(["old", "used", "new"]):
+        cache.put(key, frame)
+        os.utime(os.path.join(cache.directory, key + ".npy"), (idx, idx))
+
+    cache.get("used")  # Обновляет время использования
+    cache.max_bytes = 2 * os.path.getsize(os.path.join(cache.directory, "new.npy"))
+    cache.evict()
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+
+
+def test_warm_run_skips_decoding(tmp_path, image_dir, monkeypatch):
+    """Повторный запуск берёт кадры из кэша без обработки файлов"""
+    cache = FrameCache(str(tmp_path / "cache"))
+    cold = load_and_process_images(str(image_dir), bgcolor="white", cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Файл не должен обрабатываться повторно")
+
+    monkeypatch.setattr("image_processor.process_image_file", fail)
+    warm = load_and_process_images(str(image_dir), bgcolor="white", cache=cache)
+
+    assert len(warm) == len(cold) == 2
+    assert all(np.array_equal(np.asarray(a), np.asarray(b)) for a, b in zip(cold, warm))
@@ -1,8 +1,11 @@
 import os
 import tempfile
 import pytest
-from PIL import Image
-from image_processor import load_and_process_images, generate_overlay
+import numpy as np
+from unittest.mock import MagicMock
+from PIL import Image, ImageDraw, ImageFont
+from image_processor import (load_and_process_images, generate_overlay, LazyImageSource, overlay_layer,
+                             clear_asset_cache, open_image)
 
 
 @pytest.fixture
@@ -232,3 +235,167 @@ def test_generate_overlay_invalid_logo_coords(monkeypatch, tmp_path):
 
     # Проверяем, что оверлей создан
     assert overlay is not None
+
+
+def test_parallel_processing_keeps_order(temp_image_dir_with_files):
+    """Параллельная обработка возвращает изображения в исходном порядке"""
+    sequential = load_and_process_images(temp_image_dir_with_files)
+    parallel = load_and_process_images(temp_image_dir_with_files, workers=2)
+
+    assert len(parallel) == 3
+    assert [img.getpixel((540, 960)) for img in parallel] == \
+           [img.getpixel((540, 960)) for img in sequential]
+
+
+def test_parallel_processing_logs_worker_warnings(temp_image_dir_with_files, caplog):
+    """Предупреждения рабочих процессов попадают в лог основного процесса"""
+    with caplog.at_level("WARNING"):
+        images = load_and_process_images(temp_image_dir_with_files, workers=2)
+
+    assert len(images) == 3
+    assert "broken.png" in caplog.text
+
+
+def test_lazy_source_skips_broken_and_bounds_memory(temp_image_dir_with_files):
+    """Ленивый источник отсеивает битые файлы и держит в памяти ограниченное число кадров"""
+    source = load_and_process_images(temp_image_dir_with_files, lazy=True)
+
+    assert isinstance(source, LazyImageSource)
+    assert len(source) == 3
+
+    source.max_resident = 2
+    for idx in range(len(source)):
+        assert source[idx].size == (1080, 1920)
+        assert source.get_array(idx).shape == (1920, 1080, 3)
+
+    assert len(source._images) <= 2
+    assert len(source._arrays) <= 2
+    assert source[-1].size == (1080, 1920)
+    with pytest.raises(IndexError):
+        source[3]
+
+
+def test_overlay_assets_loaded_once(tmp_path, monkeypatch):
+    """Шрифт, логотип и слой текст+логотип готовятся один раз для всех изображений и generate_overlay"""
+    for idx in range(3):
+        Image.new("RGB", (200, 100), (idx * 50, 0, 0)).save(tmp_path / ("img_%d.jpg" % idx))
+    logo_path = tmp_path / "logo.png"
+    Image.new("RGBA", (40, 20), (0, 0, 255, 200)).save(logo_path)
+    clear_asset_cache()
+
+    truetype, resize = MagicMock(side_effect=ImageFont.truetype), MagicMock(side_effect=Image.Image.resize)
+    monkeypatch.setattr("image_processor.ImageFont.truetype", truetype)
+    monkeypatch.setattr(Image.Image, "resize", lambda self, *a, **k: resize(self, *a, **k))
+
+    params = dict(text="Caption", logo_path=str(logo_path), logo_scale=0.1)
+    images = load_and_process_images(str(tmp_path), **params)
+    generate_overlay(**params)
+
+    assert len(images) == 4  # три изображения и сам логотип
+    assert truetype.call_count == 1
+    logo_resizes = [c for c in resize.call_args_list if c.args[0].mode == "RGBA" and tuple(c.args[1]) == (108, 54)]
+    assert len(logo_resizes) == 1
+    clear_asset_cache()
+
+
+def test_overlay_layer_matches_direct_drawing(tmp_path):
+    """Наложение готового слоя совпадает с рисованием текста и логотипа прямо на изображении"""
+    logo_path = tmp_path / "logo.png"
+    logo = np.zeros((30, 60, 4), dtype=np.uint8)
+    logo[..., 1] = 255
+    logo[..., 3] = np.linspace(0, 255, 60).astype(np.uint8)
+    Image.fromarray(logo, "RGBA").save(logo_path)
+
+    base = Image.fromarray(np.random.RandomState(0).randint(0, 255, (1920, 1080, 3), dtype=np.uint8))
+    expected = base.copy()
+    draw = ImageDraw.Draw(expected)
+    font = ImageFont.load_default()
+    bbox = draw.textbbox((0, 0), "Caption", font=font)
+    draw.text(((1080 - (bbox[2] - bbox[0])) // 2, 50), "Caption", fill="yellow", font=font)
+    scaled = Image.open(logo_path).convert("RGBA").resize((108, 54), Image.Resampling.LANCZOS)
+    expected.paste(scaled, (10, 20), scaled)
+
+    layer = overlay_layer("Caption", "top", font_color="yellow", font_path="/missing.ttf",
+                          logo_path=str(logo_path), logo_scale=0.1, logo_coords="10,20")
+    actual = base.copy()
+    actual.paste(layer.pixels, layer.box, layer.pixels)
+
+    assert np.array_equal(np.asarray(actual), np.asarray(expected))
+    clear_asset_cache()
+
+
+def test_generate_overlay_matches_process_image_file(tmp_path):
+    """Полупрозрачный логотип через generate_overlay накладывается так же, как в process_image_file"""
+    from image_processor import process_image_file
+    from overlay_compositor import OverlayCompositor
+
+    logo_path = str(tmp_path / "logo.png")
+    Image.new("RGBA", (100, 50), (255, 0, 0, 128)).save(logo_path)
+    image_path = str(tmp_path / "photo.png")
+    Image.fromarray(np.random.RandomState(1).randint(0, 255, (600, 800, 3), dtype=np.uint8)).save(image_path)
+    logo = dict(logo_path=logo_path, logo_scale=0.1, logo_coords="10,20")
+
+    expected = np.asarray(process_image_file(image_path, **logo))
+    overlay = generate_overlay(**logo)
+    # Альфа логотипа применяется один раз: в слое остаются те же 50%
+    assert overlay.getpixel((50, 40))[3] == 128
+
+    base = process_image_file(image_path, skip_overlay=True, **logo)
+    composited = np.asarray(Image.alpha_composite(base.convert("RGBA"), overlay).convert("RGB"))
+    blended = OverlayCompositor(overlay).apply(np.array(base))
+    assert np.abs(composited.astype(int) - expected).max() <= 1
+    assert np.abs(blended.astype(int) - expected).max() <= 1
+    clear_asset_cache()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_open_image_decodes_reduced(tmp_path, fmt):
+    """Крупный файл декодируется в уменьшенном размере, но не меньше вписанного в кадр"""
+    path = tmp_path / ("big." + fmt.lower())
+    Image.new("RGB", (6000, 4000), "orange").save(path, fmt)
+
+    img = open_image(str(path))
+    assert img.mode == "RGB"
+    assert 1080 <= img.width < 3000 and 720 <= img.height < 2000
+
+    with_headroom = open_image(str(path), headroom=2.0)
+    assert with_headroom.width >= 2160 and with_headroom.height >= 1440
+
+
+def test_open_image_rejects_decompression_bomb(tmp_path, monkeypatch):
+    """Размер проверяется по заголовку: слишком большой файл отклоняется и пропускается при загрузке"""
+    Image.new("RGB", (200, 100)).save(tmp_path / "bomb.png")
+    monkeypatch.setattr("image_processor.MAX_SOURCE_PIXELS", 10_000)
+
+    with pytest.raises(ValueError, match="слишком большое"):
+        open_image(str(tmp_path / "bomb.png"))
+    assert load_and_process_images(str(tmp_path)) == []
+
+
+def test_custom_size_scales_layout(temp_image_dir_with_files):
+    """Кадр нужного размера; текст масштабируется вместе с кадром"""
+    images = load_and_process_images(temp_image_dir_with_files, size=(270, 480))
+    assert all(img.size == (270, 480) for img in images)
+
+    font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+    if not os.path.exists(font_path):
+        pytest.skip("Нет масштабируемого шрифта DejaVuSans")
+    full = overlay_layer("Caption", "top", font_size=80, font_path=font_path)
+    small = overlay_layer("Caption", "top", font_size=80, font_path=font_path, size=(270, 480))
+    full_width = full.box[2] - full.box[0]
+    small_width = small.box[2] - small.box[0]
+    assert small_width == pytest.approx(full_width / 4, rel=0.2)
+    clear_asset_cache()
+
+
+def test_zoom_headroom_pads_at_scaled_size(temp_image_dir_with_files, tmp_path):
+    """Для zoom кадр готовится с запасом разрешения; запас входит в ключ кэша кадров"""
+    from frame_cache import FrameCache
+    cache = FrameCache(str(tmp_path / "cache"))
+    plain = load_and_process_images(temp_image_dir_with_files, size=(270, 480), cache=cache)
+    roomy = load_and_process_images(temp_image_dir_with_files, size=(270, 480), cache=cache, headroom=1.5)
+    assert all(img.size == (270, 480) for img in plain)
+    assert all(img.size == (405, 720) for img in roomy)
+
+    lazy = load_and_process_images(temp_image_dir_with_files, size=(270, 480), lazy=True, headroom=1.5)
+    assert lazy[0].size == (405, 720)
@@ -0,0 +1,50 @@
+import pytest
+from pydub.generators import Sine
+from unittest.mock import patch
+import media_probe
+from media_probe import probe_media, parse_probe_output, clear_probe_cache
+
+
+MP4_OUTPUT = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'track.m4a':
+  Duration: 01:02:03.50, start: 0.000000, bitrate: 130 kb/s
+  Stream #0:0[0x1](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, 5.1, fltp, 128 kb/s (default)
+"""
+
+
+@pytest.fixture
+def wav_path(tmp_path):
+    path = str(tmp_path / "tone.wav")
+    Sine(440).to_audio_segment(duration=1500).set_channels(2).export(path, format="wav")
+    clear_probe_cache()
+    yield path
+    clear_probe_cache()
+
+
+def test_parse_probe_output():
+    """Длительность, частота, каналы и кодек извлекаются из вывода ffmpeg"""
+    info = parse_probe_output(MP4_OUTPUT)
+    assert info.duration == pytest.approx(3723.5)
+    assert (info.sample_rate, info.channels, info.codec) == (48000, 6, "aac")
+
+
+def test_probe_wav_and_cache(wav_path):
+    """Реальный файл читается одним запуском ffmpeg, повторный вызов берётся из кэша"""
+    info = probe_media(wav_path)
+    assert info.duration == pytest.approx(1.5, abs=0.01)
+    assert (info.sample_rate, info.channels, info.codec) == (44100, 2, "pcm_s16le")
+
+    with patch("media_probe.subprocess.run") as mock_run:
+        assert probe_media(wav_path) is info
+    mock_run.assert_not_called()
+
+
+def test_probe_missing_or_invalid_file(tmp_path):
+    """Отсутствующий или нечитаемый файл — RuntimeError"""
+    with pytest.raises(RuntimeError):
+        probe_media(str(tmp_path / "missing.wav"))
+
+    broken = tmp_path / "broken.wav"
+    broken.write_bytes(b"not audio")
+    with pytest.raises(RuntimeError):
+        probe_media(str(broken))
+    assert not media_probe._cache
@@ -0,0 +1,56 @@
+from memory_budget import plan_memory, frame_bytes, report_peak_usage, MIN_RESIDENT, MAX_RESIDENT
+
+MB = 1024 ** 2
+SIZE = (1080, 1920)
+
+
+def test_small_job_fits_in_memory():
+    """Небольшая задача помещается в бюджет: кадры в памяти, число процессов не меняется"""
+    plan = plan_memory(4096 * MB, 10, SIZE, image_workers=4, encode_workers=2)
+    assert plan.frame_bytes == frame_bytes(SIZE) == 1080 * 1920 * 3
+    assert not plan.spill
+    assert plan.image_workers == 4 and plan.encode_workers == 2
+    assert plan.memo_bytes == 256 * MB
+
+
+def test_large_job_spills_and_limits_workers():
+    """Большая задача выгружает кадры на диск и ограничивает число процессов"""
+    plan = plan_memory(1536 * MB, 500, SIZE, image_workers=8, encode_workers=8)
+    assert plan.spill
+    assert plan.image_workers == 1
+    assert MIN_RESIDENT <= plan.max_resident <= MAX_RESIDENT
+    # Процессы кодирования: не больше, чем помещается в оставшуюся половину бюджета
+    assert 1 <= plan.encode_workers < 8
+    assert plan.memo_bytes == int(1536 * MB * 0.1)
+
+
+def test_tiny_budget_keeps_minimum():
+    """При очень малом бюджете остаются минимальное окно кадров и по одному процессу"""
+    plan = plan_memory(64 * MB, 3, SIZE, image_workers=4, encode_workers=4)
+    assert plan.spill
+    assert plan.max_resident == MIN_RESIDENT
+    assert plan.image_workers == plan.encode_workers == 1
+
+
+def test_report_peak_usage_against_budget(caplog, monkeypatch):
+    """Итоговый отчёт сравнивает пиковую память с бюджетом и сообщает о превышении"""
+    import memory_budget
+    peaks = {False: 200 * MB, True: 500 * MB}
+    monkeypatch.setattr(memory_budget, "peak_rss_bytes", lambda children=False: peaks[children])
+
+    with caplog.at_level("INFO", logger="memory_budget"):
+        assert report_peak_usage(300 * MB) == 200 * MB
+    assert "основного процесса: 200.0 МБ из бюджета 300.0 МБ" in caplog.text
+    assert "до 500.0 МБ" in caplog.text and "превышен" not in caplog.text
+
+    caplog.clear()
+    peaks[False] = 400 * MB
+    with caplog.at_level("INFO", logger="memory_budget"):
+        report_peak_usage(300 * MB)
+    assert "Бюджет памяти превышен основным процессом на 100.0 МБ" in caplog.text
+
+    caplog.clear()
+    peaks[False] = peaks[True] = None
+    with caplog.at_level("INFO", logger="memory_budget"):
+        assert report_peak_usage(300 * MB) is None
+    assert "недоступна" in caplog.text
@@ -0,0 +1,108 @@
+from PIL import Image
+import metrics
+from metrics import FrameHistogram, RunMetrics, span, start_run, stop_run, timed_frames
+from video_maker import _FrameStore, _make_source_clip
+
+
+def test_histogram_buckets():
+    """Замеры раскладываются по корзинам, минимум и максимум — в миллисекундах"""
+    histogram = FrameHistogram()
+    for seconds in (0.0005, 0.003, 0.003, 0.04, 2.0):
+        histogram.add(seconds)
+
+    data = histogram.to_dict()
+    assert data["count"] == 5
+    assert data["min_ms"] == 0.5 and data["max_ms"] == 2000.0
+    # Корзины: <=1, <=2, <=5, <=10, <=20, <=50, ..., >1000 мс
+    assert data["bucket_counts"] == [1, 0, 2, 0, 0, 1, 0, 0, 0, 0, 1]
+
+
+def test_histogram_merge():
+    """Слияние гистограмм суммирует число, время и корзины и сохраняет общие минимум и максимум"""
+    first, second = FrameHistogram(), FrameHistogram()
+    first.add(0.003)
+    second.add(0.0005)
+    second.add(2.0)
+    first.merge(second)
+    first.merge(FrameHistogram())
+
+    data = first.to_dict()
+    assert data["count"] == 3 and data["total_ms"] == 2003.5
+    assert data["min_ms"] == 0.5 and data["max_ms"] == 2000.0
+    assert data["bucket_counts"] == [1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1]
+
+
+def test_inactive_collection_is_a_no_op():
+    """Без активного сбора фабрика кадров не оборачивается, а этап ничего не записывает"""
+    stop_run()
+    make_frame = lambda t: t
+    assert timed_frames("zoom_in", make_frame) is make_frame
+    with span("load_images"):
+        pass
+
+
+def test_spans_and_frame_timings_from_clips():
+    """Этапы и время кадров zoom из клипа попадают в метрики запуска"""
+    run = start_run()
+    try:
+        source = _FrameStore([Image.new("RGB", (200, 300), "red")])
+        clip = _make_source_clip(source, 0, 1.0, 10, 0.2, 0.0, None, size=(40, 60))
+        with span("encode"):
+            frames = [clip.get_frame(k / 10) for k in range(10)]
+    finally:
+        stop_run()
+
+    assert frames[0].shape == (60, 40, 3)
+    assert metrics._active is None
+    data = run.to_dict()
+    assert [stage["name"] for stage in data["stages"]] == ["encode"]
+    assert data["frames"]["zoom_in"]["count"] == 10
+    assert data["frames"]["zoom_in"]["total_ms"] <= data["stages"][0]["wall"] * 1000
+
+
+def test_frame_timings_from_parallel_chunks(tmp_path):
+    """Гистограммы кадров, собранные в рабочих процессах кодирования клипов, попадают в метрики запуска"""
+    from video_maker import create_video_from_images
+
+    images = [Image.new("RGB", (64, 96), color) for color in ("red", "green")]
+    run = start_run()
+    try:
+        create_video_from_images(images=images, duration=1.0, fps=10, output_path=str(tmp_path / "out.mp4"),
+                                 transition="none", zoom_factor=0.2, encode_workers=2, size=(64, 96))
+    finally:
+        stop_run()
+
+    # Два клипа по 10 кадров; в основном процессе кадры не строятся
+    assert run.frames["zoom_in"].count == 20
+
+
+def test_nested_spans_record_in_completion_order():
+    """Вложенные этапы записываются в порядке завершения"""
+    run = RunMetrics()
+    with run.span("create_video"):
+        with run.span("encode"):
+            sum(range(10000))
+    names = [record.name for record in run.spans]
+    assert names == ["encode", "create_video"]
+    assert run.spans[1].wall >= run.spans[0].wall
+    assert "encode" in run.summary()
+
+
+def test_peak_rss_units_by_platform(monkeypatch):
+    """ru_maxrss: килобайты в Linux, байты в macOS; без модуля resource (Windows) — None"""
+    from types import SimpleNamespace
+    fake = SimpleNamespace(RUSAGE_SELF=0, RUSAGE_CHILDREN=-1,
+                           getrusage=lambda who: SimpleNamespace(ru_maxrss=200 * 1024))
+    monkeypatch.setattr(metrics, "resource", fake)
+
+    monkeypatch.setattr(metrics.sys, "platform", "linux")
+    assert metrics.peak_rss_mb() == 200.0
+    monkeypatch.setattr(metrics.sys, "platform", "darwin")
+    assert metrics.peak_rss_bytes() == 200 * 1024 and metrics.peak_rss_mb() == 0.2
+
+    monkeypatch.setattr(metrics, "resource", None)
+    assert metrics.peak_rss_bytes() is None and metrics.peak_rss_mb(children=True) is None
+    run = RunMetrics()
+    with run.span("load_images"):
+        pass
+    assert run.spans[0].peak_rss_mb is None and run.to_dict()["peak_rss_mb"] is None
@@ -0,0 +1,45 @@
+import numpy as np
+from PIL import Image, ImageDraw
+from overlay_compositor import OverlayCompositor, opaque_regions
+
+
+def _make_overlay():
+    overlay = Image.new("RGBA", (1080, 1920), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    draw.rectangle((100, 1700, 500, 1760), fill=(255, 255, 255, 255))  # «текст»
+    draw.rectangle((860, 1800, 1059, 1899), fill=(200, 30, 30, 128))  # полупрозрачный «логотип»
+    return overlay
+
+
+def test_opaque_regions_cover_text_and_logo_separately():
+    """Текст и логотип попадают в отдельные прямоугольники"""
+    alpha = np.asarray(_make_overlay())[..., 3]
+    assert opaque_regions(alpha) == [(1700, 1761, 100, 501), (1800, 1900, 860, 1060)]
+    assert opaque_regions(np.zeros((10, 10), dtype=np.uint8)) == []
+
+
+def test_compositor_matches_pil_paste():
+    """Наложение на месте совпадает с PIL paste с точностью до округления"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (1920, 1080, 3), dtype=np.uint8)
+    overlay = _make_overlay()
+
+    reference = Image.fromarray(frame).convert("RGBA")
+    reference.paste(overlay, (0, 0), overlay)
+    reference = np.array(reference.convert("RGB"))
+
+    result = frame.copy()
+    assert OverlayCompositor(overlay).apply(result) is result
+    assert np.abs(result.astype(int) - reference.astype(int)).max() <= 1
+    # Вне областей оверлея кадр не меняется
+    assert np.array_equal(result[:1700], frame[:1700])
+
+
+def test_compositor_resizes_overlay_to_frame():
+    """Оверлей другого размера масштабируется под кадр один раз"""
+    overlay = Image.new("RGBA", (540, 960), (0, 0, 0, 0))
+    overlay.paste((0, 0, 255, 255), (0, 0, 540, 960))
+    frame = np.zeros((1920, 1080, 3), dtype=np.uint8)
+
+    OverlayCompositor(overlay).apply(frame)
+    assert (frame == [0, 0, 255]).all()
@@ -0,0 +1,89 @@
+import sys
+import pstats
+import signal
+from PIL import Image
+from profiling import FrameProfiler, profiled_clip, start_profile, stop_profile
+from video_maker import _FrameStore, _make_source_clip
+
+
+def _busy_frame(t):
+    return sum(i * i for i in range(20000))
+
+
+def test_window_limits_profiled_frames(tmp_path):
+    """Профилируются только первые N кадров окна, остальные вызываются без cProfile"""
+    profiler = FrameProfiler(frames=3)
+    make_frame = profiler.wrap(_busy_frame)
+    for k in range(10):
+        make_frame(k)
+    profiler.close()
+
+    assert profiler.frames == 3 and profiler.done
+    paths = profiler.save(str(tmp_path / "out"))
+    assert paths[0].endswith("out.prof")
+    stats = pstats.Stats(paths[0])
+    calls = {func[2]: stat[1] for func, stat in stats.stats.items()}
+    assert calls["_busy_frame"] == 3
+
+
+def test_seconds_window_closes():
+    """Окно по времени закрывается, и обработчик SIGPROF восстанавливается"""
+    profiler = FrameProfiler(frames=None, seconds=0.05)
+    make_frame = profiler.wrap(_busy_frame)
+    while not profiler.done:
+        make_frame(0)
+    profiler.close()
+    assert profiler.frames >= 1
+    assert signal.getsignal(signal.SIGPROF) in (signal.SIG_DFL, None)
+
+
+def test_collapsed_stacks_from_samples(tmp_path):
+    """Сэмпл стека (вызов обработчика SIGPROF напрямую) попадает в collapsed-файл с весом"""
+    profiler = FrameProfiler(frames=1)
+
+    def sampled_frame(t):
+        profiler._sample(signal.SIGPROF, sys._getframe())
+        return t
+
+    profiler.wrap(sampled_frame)(0)
+    profiler.close()
+
+    paths = profiler.save(str(tmp_path / "out"))
+    with open(paths[1], encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1
+    stack, weight = lines[0].rsplit(" ", 1)
+    assert int(weight) >= 1
+    assert stack.endswith("sampled_frame (pytest_profiling.py:%d)" % sampled_frame.__code__.co_firstlineno)
+
+
+def test_collapsed_file_written_without_samples(tmp_path, caplog):
+    """Без сэмплов collapsed-файл всё равно пишется пустым, с предупреждением"""
+    profiler = FrameProfiler(frames=1)
+    profiler.wrap(lambda t: t)(0)
+    profiler.close()
+    profiler.stacks.clear()
+
+    with caplog.at_level("WARNING", logger="profiling"):
+        paths = profiler.save(str(tmp_path / "out"))
+    assert [p.rsplit(".", 1)[1] for p in paths] == ["prof", "collapsed"]
+    with open(paths[1], encoding="utf-8") as f:
+        assert f.read() == ""
+    assert "стек не сэмплировался" in caplog.text
+
+
+def test_profiled_clip_is_a_no_op_when_off():
+    """Без профилировщика клип не оборачивается, с ним профилируются кадры окна"""
+    source = _FrameStore([Image.new("RGB", (40, 60), "red")])
+    clip = _make_source_clip(source, 0, 1.0, 10, 0.0, 0.0, None, size=(40, 60))
+    make_frame = clip.make_frame
+    assert profiled_clip(clip).make_frame is make_frame
+
+    profiler = start_profile(frames=2)
+    try:
+        clip = profiled_clip(clip)
+        for k in range(5):
+            assert clip.get_frame(k / 10).shape == (60, 40, 3)
+    finally:
+        stop_profile()
+    assert profiler.frames == 2
@@ -1,7 +1,9 @@
 import pytest
 import os
+import json
 from unittest.mock import MagicMock, patch
 from types import SimpleNamespace
+from PIL import Image
 from runner import run_vvm
 
 
@@ -9,6 +11,26 @@ from runner import run_vvm
 def minimal_args(tmp_path):
     return SimpleNamespace(
         images=str(tmp_path),
+        image_workers=1,
+        lazy_images=False,
+        frame_cache=None,
+        frame_cache_size=0,
+        no_frame_cache=True,
+        spill_frames=False,
+        reuse_loops=False,
+        still_fastpath=False,
+        backend="moviepy",
+        encode_workers=1,
+        incremental=False,
+        resume=False,
+        audio_fade=1.0,
+        resolution=(1080, 1920),
+        preview=False,
+        metrics_json=None,
+        profile=False,
+        profile_frames=100,
+        profile_seconds=None,
+        memory_budget=None,
         bgcolor="black",
         text=None,
         text_position="bottom",
@@ -34,10 +56,10 @@ def minimal_args(tmp_path):
 
 
 @patch("runner.create_video_from_images")
-@patch("runner.load_audio_clip")
+@patch("runner.render_audio_track")
 @patch("runner.load_and_process_images")
-@patch("runner.AudioFileClip")
-def test_run_vvm_minimal(mock_audiofile, mock_load_images, mock_load_audio, mock_create_video, minimal_args):
+@patch("runner.probe_media")
+def test_run_vvm_minimal(mock_probe, mock_load_images, mock_render_audio, mock_create_video, minimal_args):
     mock_img = MagicMock()
     mock_img.save = MagicMock()
     mock_load_images.return_value = [mock_img] * 3
@@ -51,11 +73,57 @@ def test_run_vvm_minimal(mock_audiofile, mock_load_images, mock_load_audio, mock
 
 
 @patch("runner.generate_overlay", return_value="dummy_overlay")
+@patch("runner.render_with_ffmpeg")
 @patch("runner.create_video_from_images")
-@patch("runner.load_audio_clip")
+@patch("runner.render_audio_track")
 @patch("runner.load_and_process_images")
-@patch("runner.AudioFileClip")
-def test_run_vvm_zoom_overlay_generation(mock_audiofile, mock_load_images, mock_load_audio, mock_create_video, mock_overlay, minimal_args):
+@patch("runner.probe_media")
+def test_run_vvm_ffmpeg_backend(mock_probe, mock_load_images, mock_render_audio, mock_create_video,
+                                mock_render_ffmpeg, mock_overlay, minimal_args):
+    minimal_args.backend = "ffmpeg"
+    minimal_args.zoom = 0.2
+    minimal_args.audio = "track.mp3"
+    minimal_args.mode = "images_loop"
+    mock_probe.return_value.duration = 10.0
+    mock_load_images.return_value = [MagicMock()] * 2
+
+    run_vvm(minimal_args)
+
+    mock_create_video.assert_not_called()
+    mock_render_audio.assert_not_called()
+    kwargs = mock_render_ffmpeg.call_args[1]
+    assert kwargs["audio_path"] == "track.mp3"
+    assert kwargs["audio_mode"] == "cut"
+    assert kwargs["total_duration"] == 10.0
+    assert kwargs["overlay"] == "dummy_overlay"
+
+
+@patch("runner.render_with_ffmpeg")
+@patch("runner.load_and_process_images", return_value=[MagicMock()] * 2)
+def test_run_vvm_ffmpeg_backend_warns_ignored_flags(mock_load_images, mock_render_ffmpeg, minimal_args, caplog):
+    """С --backend ffmpeg каждая опция движка moviepy даёт отдельное предупреждение"""
+    minimal_args.backend = "ffmpeg"
+    minimal_args.encode_workers = 4
+    minimal_args.resume = True
+    minimal_args.reuse_loops = True
+
+    with caplog.at_level("WARNING"):
+        run_vvm(minimal_args)
+
+    mock_render_ffmpeg.assert_called_once()
+    warned = [r.getMessage() for r in caplog.records if "не действует с --backend ffmpeg" in r.getMessage()]
+    assert len(warned) == 3
+    assert any("--encode-workers" in m for m in warned)
+    assert any("--resume" in m for m in warned)
+    assert any("--reuse-loops" in m for m in warned)
+
+
+@patch("runner.generate_overlay", return_value="dummy_overlay")
+@patch("runner.create_video_from_images")
+@patch("runner.render_audio_track")
+@patch("runner.load_and_process_images")
+@patch("runner.probe_media")
+def test_run_vvm_zoom_overlay_generation(mock_probe, mock_load_images, mock_render_audio, mock_create_video, mock_overlay, minimal_args):
     minimal_args.zoom = 0.2  # Активирует skip_overlay
     minimal_args.text = "Overlayed"
     mock_img = MagicMock()
@@ -69,10 +137,10 @@ def test_run_vvm_zoom_overlay_generation(mock_audiofile, mock_load_images, mock_
 
 
 @patch("runner.create_video_from_images")
-@patch("runner.load_audio_clip")
+@patch("runner.render_audio_track")
 @patch("runner.load_and_process_images")
-@patch("runner.AudioFileClip")
-def test_run_vvm_autocover_frame(mock_audiofile, mock_load_images, mock_load_audio, mock_create_video, minimal_args):
+@patch("runner.probe_media")
+def test_run_vvm_autocover_frame(mock_probe, mock_load_images, mock_render_audio, mock_create_video, minimal_args):
     minimal_args.autocover = True
     mock_img = MagicMock()
     mock_img.save = MagicMock()
@@ -89,34 +157,34 @@ def test_run_vvm_empty_images(mock_load_images, mock_create_video, minimal_args)
     mock_create_video.assert_not_called()
 
 
-@patch("runner.AudioFileClip", side_effect=Exception("Broken audio"))
+@patch("runner.probe_media", side_effect=Exception("Broken audio"))
 @patch("runner.load_and_process_images", return_value=[MagicMock(save=MagicMock())])
 @patch("runner.create_video_from_images")
-def test_run_vvm_audiofile_exception(mock_create_video, mock_load_images, mock_audiofile, minimal_args):
+def test_run_vvm_audiofile_exception(mock_create_video, mock_load_images, mock_probe, minimal_args):
     minimal_args.audio = "bad.mp3"
     run_vvm(minimal_args)
     mock_create_video.assert_called_once()
 
 
-@patch("runner.load_audio_clip", side_effect=Exception("Decoder error"))
-@patch("runner.AudioFileClip", return_value=MagicMock(duration=10.0))
+@patch("runner.render_audio_track", side_effect=Exception("Decoder error"))
+@patch("runner.probe_media", return_value=MagicMock(duration=10.0))
 @patch("runner.load_and_process_images", return_value=[MagicMock(save=MagicMock())])
 @patch("runner.create_video_from_images")
-def test_run_vvm_audio_clip_exception(mock_create_video, mock_load_images, mock_audiofile, mock_load_audio, minimal_args):
+def test_run_vvm_audio_clip_exception(mock_create_video, mock_load_images, mock_probe, mock_render_audio, minimal_args):
     minimal_args.audio = "broken.mp3"
     run_vvm(minimal_args)
-    mock_load_audio.assert_called_once()
+    mock_render_audio.assert_called_once()
     mock_create_video.assert_called_once()
 
 
 @patch("runner.create_video_from_images")
-@patch("runner.load_audio_clip")
+@patch("runner.render_audio_track")
 @patch("runner.load_and_process_images")
-@patch("runner.AudioFileClip")
-def test_run_vvm_images_loop_mode(mock_audiofile, mock_load_images, mock_load_audio, mock_create_video, minimal_args):
+@patch("runner.probe_media")
+def test_run_vvm_images_loop_mode(mock_probe, mock_load_images, mock_render_audio, mock_create_video, minimal_args):
     minimal_args.mode = "images_loop"
     minimal_args.audio = "short.mp3"
-    mock_audiofile.return_value.duration = 1.0
+    mock_probe.return_value.duration = 1.0
     mock_load_images.return_value = [MagicMock(save=MagicMock())] * 4
 
     run_vvm(minimal_args)
@@ -125,10 +193,10 @@ def test_run_vvm_images_loop_mode(mock_audiofile, mock_load_images, mock_load_au
 
 
 @patch("runner.create_video_from_images")
-@patch("runner.load_audio_clip")
+@patch("runner.render_audio_track")
 @patch("runner.load_and_process_images")
-@patch("runner.AudioFileClip")
-def test_run_vvm_autocover_by_second(mock_audiofile, mock_load_images, mock_load_audio, mock_create_video, minimal_args):
+@patch("runner.probe_media")
+def test_run_vvm_autocover_by_second(mock_probe, mock_load_images, mock_render_audio, mock_create_video, minimal_args):
     minimal_args.autocover = "1.0"
     minimal_args.duration = 2.0
     mock_img = MagicMock()
@@ -218,3 +286,163 @@ def test_autocover_zero_second(mock_create_video, mock_load_images, minimal_args
     mock_load_images.return_value = [img_mock] * 5
     run_vvm(minimal_args)
     img_mock.save.assert_called_once()
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.render_audio_track")
+@patch("runner.load_and_process_images", return_value=[MagicMock(save=MagicMock())])
+@patch("runner.probe_media", return_value=MagicMock(duration=10.0))
+def test_run_vvm_passes_prepared_audio_track(mock_probe, mock_load_images, mock_render_audio, mock_create_video,
+                                             minimal_args):
+    """Дорожка готовится один раз с параметрами режима и передаётся в рендер вместо AudioClip"""
+    minimal_args.audio = "track.mp3"
+    minimal_args.audio_fade = 0.0
+    run_vvm(minimal_args)
+
+    kwargs = mock_render_audio.call_args.kwargs
+    assert kwargs["path"] == "track.mp3"
+    assert kwargs["mode"] == "cut"
+    assert kwargs["video_duration"] == 1.0
+    assert kwargs["fade_in_duration"] == kwargs["fade_out_duration"] == 0.0
+    assert mock_create_video.call_args.kwargs["audio_clip"] is mock_render_audio.return_value
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.load_and_process_images", return_value=[MagicMock(save=MagicMock())] * 2)
+def test_run_vvm_probes_audio_once(mock_load_images, mock_create_video, minimal_args, tmp_path):
+    """За один запуск аудиофайл пробуется ffmpeg ровно один раз: повторный запрос берётся из кэша"""
+    import wave
+    import media_probe
+
+    audio_path = str(tmp_path / "track.wav")
+    with wave.open(audio_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0\0" * 8000 * 3)
+    minimal_args.audio = audio_path
+    minimal_args.output = str(tmp_path / "out.mp4")
+    media_probe.clear_probe_cache()
+
+    real_run = media_probe.subprocess.run
+    with patch.object(media_probe.subprocess, "run", side_effect=real_run) as mock_run:
+        run_vvm(minimal_args)
+
+    probes = [c for c in mock_run.call_args_list if c.args[0][1:] == ["-hide_banner", "-i", audio_path]]
+    assert len(probes) == 1
+    assert mock_create_video.call_args.kwargs["audio_clip"].duration == pytest.approx(2.0, abs=0.05)
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.generate_overlay", return_value="dummy_overlay")
+@patch("runner.load_and_process_images", return_value=[MagicMock(save=MagicMock())])
+def test_run_vvm_preview(mock_load_images, mock_overlay, mock_create_video, minimal_args):
+    """Черновик: кадр вчетверо меньше, не больше 12 fps, быстрый фильтр и пресет; длительности те же"""
+    minimal_args.preview = True
+    minimal_args.zoom = 0.2
+    run_vvm(minimal_args)
+
+    assert mock_load_images.call_args.kwargs["size"] == (270, 480)
+    assert mock_load_images.call_args.kwargs["resample"] == Image.Resampling.BILINEAR
+    assert mock_overlay.call_args.kwargs["size"] == (270, 480)
+    kwargs = mock_create_video.call_args.kwargs
+    assert (kwargs["size"], kwargs["fps"], kwargs["preset"]) == ((270, 480), 12, "ultrafast")
+    assert kwargs["duration"] == minimal_args.duration
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.load_and_process_images")
+def test_run_vvm_writes_metrics_json(mock_load_images, mock_create_video, minimal_args, tmp_path):
+    """--metrics-json: этапы с временем, CPU и памятью пишутся и при успехе, и при ошибке"""
+    mock_load_images.return_value = [Image.new("RGB", (10, 10))] * 2
+    minimal_args.metrics_json = str(tmp_path / "metrics.json")
+    run_vvm(minimal_args)
+
+    with open(minimal_args.metrics_json, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["status"] == "ok" and data["output"] == "dummy.mp4"
+    assert [stage["name"] for stage in data["stages"]] == ["load_images", "create_video"]
+    for stage in data["stages"]:
+        assert stage["wall"] >= 0 and stage["cpu"] >= 0
+        assert stage["peak_rss_mb"] is None or stage["peak_rss_mb"] > 0
+
+    mock_create_video.side_effect = RuntimeError("ffmpeg")
+    with pytest.raises(RuntimeError):
+        run_vvm(minimal_args)
+    with open(minimal_args.metrics_json, encoding="utf-8") as f:
+        assert json.load(f)["status"] == "error"
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.load_and_process_images")
+@patch("runner.start_profile")
+def test_run_vvm_profile_saved_next_to_output(mock_start_profile, mock_load_images, mock_create_video,
+                                              minimal_args, tmp_path):
+    """--profile: окно кадров передаётся профилировщику, результат сохраняется рядом с выходным файлом"""
+    mock_load_images.return_value = [Image.new("RGB", (10, 10))]
+    minimal_args.profile = True
+    minimal_args.profile_frames = 0
+    minimal_args.profile_seconds = 5.0
+    minimal_args.output = str(tmp_path / "video.mp4")
+    run_vvm(minimal_args)
+
+    mock_start_profile.assert_called_once_with(None, 5.0)
+    mock_start_profile.return_value.save.assert_called_once_with(str(tmp_path / "video"))
+
+    mock_start_profile.reset_mock()
+    minimal_args.backend = "ffmpeg"
+    with patch("runner.render_with_ffmpeg"):
+        run_vvm(minimal_args)
+    mock_start_profile.assert_not_called()
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.load_and_process_images", return_value=[Image.new("RGB", (10, 10))])
+@patch("runner.start_profile")
+def test_run_vvm_profile_with_encode_workers_warns(mock_start_profile, mock_load_images, mock_create_video,
+                                                   minimal_args, tmp_path, caplog):
+    """--profile с --encode-workers > 1 предупреждает, что кадры рабочих процессов в профиль не попадают"""
+    minimal_args.profile = True
+    minimal_args.encode_workers = 4
+    minimal_args.output = str(tmp_path / "video.mp4")
+    with caplog.at_level("WARNING"):
+        run_vvm(minimal_args)
+
+    mock_start_profile.assert_called_once()
+    assert "--encode-workers 1" in caplog.text
+
+
+@patch("runner.report_peak_usage")
+@patch("runner.create_video_from_images")
+@patch("runner.load_and_process_images")
+def test_run_vvm_memory_budget(mock_load_images, mock_create_video, mock_report, minimal_args, tmp_path):
+    """--memory-budget: план выбирается по числу файлов, пик памяти сравнивается с бюджетом в конце"""
+    for idx in range(5):
+        (tmp_path / ("%d.jpg" % idx)).write_bytes(b"")
+    mock_load_images.return_value = [Image.new("RGB", (10, 10))]
+    minimal_args.image_workers = 4
+    minimal_args.encode_workers = 4
+    minimal_args.memory_budget = 32 * 1024 ** 2
+    run_vvm(minimal_args)
+
+    load_kwargs = mock_load_images.call_args.kwargs
+    assert load_kwargs["lazy"] is True and load_kwargs["workers"] == 1
+    plan = mock_create_video.call_args.kwargs["memory_plan"]
+    assert plan.spill and load_kwargs["max_resident"] == plan.max_resident
+    assert mock_create_video.call_args.kwargs["encode_workers"] == 1
+    mock_report.assert_called_once_with(32 * 1024 ** 2)
+
+
+@patch("runner.create_video_from_images")
+@patch("runner.load_and_process_images")
+def test_run_vvm_zoom_headroom(mock_load_images, mock_create_video, minimal_args, tmp_path):
+    """Zoom: изображения готовятся с запасом 1 + zoom, обложка сохраняется в размере кадра"""
+    mock_load_images.return_value = [Image.new("RGB", (1296, 2304))]
+    minimal_args.zoom = 0.2
+    minimal_args.autocover = True
+    minimal_args.output = str(tmp_path / "out.mp4")
+    run_vvm(minimal_args)
+
+    assert mock_load_images.call_args.kwargs["headroom"] == pytest.approx(1.2)
+    with Image.open(str(tmp_path / "thumbnail.png")) as cover:
+        assert cover.size == (1080, 1920)
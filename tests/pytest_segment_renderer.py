@@ -0,0 +1,76 @@
+from segment_renderer import plan_segments, plan_clip_chunks, Segment, ClipChunk
+
+
+def test_plan_none_transition_all_static():
+    """Без переходов и zoom каждое изображение — один неподвижный отрезок"""
+    segments = plan_segments(3, 1.0, 24, "none", 0.5, animated=False, total_duration=3.0)
+    assert segments == [Segment(0, 24, True), Segment(24, 48, True), Segment(48, 72, True)]
+
+
+def test_plan_fade_plateau_and_merged_transitions():
+    """fade: плато неподвижно, соседние fade-out и fade-in объединены в один отрезок"""
+    segments = plan_segments(2, 2.0, 10, "fade", 0.5, animated=False, total_duration=4.0)
+    assert segments == [Segment(0, 5, False), Segment(5, 15, True), Segment(15, 20, False),
+                        Segment(20, 40, True)]
+
+
+def test_plan_slide_and_trim():
+    """slide: неподвижная часть и переход; таймлайн обрезается по длительности"""
+    segments = plan_segments(3, 1.0, 10, "slide", 0.5, animated=False, total_duration=2.2)
+    assert segments == [Segment(0, 5, True), Segment(5, 10, False), Segment(10, 15, True),
+                        Segment(15, 20, False), Segment(20, 22, True)]
+
+
+def test_plan_animated_single_dynamic_segment():
+    """При zoom все кадры динамические и объединяются"""
+    segments = plan_segments(3, 1.0, 10, "slide", 0.5, animated=True, total_duration=3.0)
+    assert segments == [Segment(0, 30, False)]
+
+
+def test_plan_wrap_loop_has_transition_at_end():
+    """Для круга с переходом к первому изображению последний клип тоже заканчивается переходом"""
+    segments = plan_segments(2, 1.0, 10, "push", 0.5, animated=False, total_duration=2.0,
+                             last_has_transition=True)
+    assert segments[-1] == Segment(15, 20, False)
+
+
+def test_plan_clip_chunks_follow_image_boundaries():
+    """Части таймлайна идут по границам изображений по кругу и обрезаются по общей длительности"""
+    chunks = plan_clip_chunks(2, 4, 1.0, 10, 3.5)
+    assert chunks == [ClipChunk(0, 0, 1, 0, 10), ClipChunk(1, 1, 0, 10, 20),
+                      ClipChunk(2, 0, 1, 20, 30), ClipChunk(3, 1, None, 30, 35)]
+
+
+def test_chunk_fingerprint_depends_on_visible_inputs():
+    """Отпечаток учитывает соседнее изображение только для переходов, которые его показывают"""
+    from segment_renderer import chunk_fingerprint
+
+    digests = {0: "a", 1: "b", 2: "c"}
+    params = dict(duration=1.0, fps=10, transition="none", transition_duration=0.25, zoom_factor=0.0,
+                  zoom_out_factor=0.0, animated=False, export={"codec": "libx264"})
+    to_b, to_c = ClipChunk(0, 0, 1, 0, 10), ClipChunk(0, 0, 2, 0, 10)
+
+    assert chunk_fingerprint(to_b, digests, None, params) == chunk_fingerprint(to_c, digests, None, params)
+    # Клип следующего круга с тем же изображением и сеткой кадров совпадает с первым
+    assert chunk_fingerprint(ClipChunk(3, 0, 1, 30, 40), digests, None, params) == \
+        chunk_fingerprint(to_b, digests, None, params)
+
+    slide = dict(params, transition="slide")
+    assert chunk_fingerprint(to_b, digests, None, slide) != chunk_fingerprint(to_c, digests, None, slide)
+    assert chunk_fingerprint(to_b, digests, "logo", slide) != chunk_fingerprint(to_b, digests, None, slide)
+
+
+def test_journal_skips_truncated_entries_and_changed_files(tmp_path):
+    """Журнал доверяет только целым записям и файлам прежнего размера"""
+    from segment_renderer import RenderJournal, completed_parts
+
+    for name in ("clip_a.mp4", "clip_b.mp4"):
+        (tmp_path / name).write_bytes(b"data")
+    journal = RenderJournal(str(tmp_path))
+    journal.record("a", str(tmp_path / "clip_a.mp4"))
+    journal.record("b", str(tmp_path / "clip_b.mp4"))
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"version": 1, "fingerprint": "c", "fi')  # запись оборвана сбоем
+
+    (tmp_path / "clip_b.mp4").write_bytes(b"changed data")
+    assert completed_parts(str(tmp_path)) == {"a"}
@@ -33,3 +33,55 @@ def test_push_transition_duration(temp_clips):
     transition = push_transition(temp_clips[0], temp_clips[1], duration=1.0)
     assert transition.duration == 1.0
     assert transition.size == temp_clips[0].size
+
+
+@pytest.mark.parametrize("transition", ["slide", "push"])
+def test_array_transition_matches_composite(transition):
+    """Кадры slide/push из массивов совпадают с CompositeVideoClip"""
+    import numpy as np
+    from moviepy.editor import ImageClip
+    from utils import TransitionRenderer
+
+    rng = np.random.default_rng(0)
+    old, new = (rng.integers(0, 256, (48, 64, 3), dtype=np.uint8) for _ in range(2))
+    make = slide_transition if transition == "slide" else push_transition
+    composite = make(ImageClip(old).set_duration(0.5), ImageClip(new).set_duration(0.5), duration=0.5)
+
+    renderer = TransitionRenderer()
+    for t in (0.0, 0.1, 0.23, 0.4, 0.49):
+        frame = renderer.render(transition, old, new, t, 0.5)
+        assert np.array_equal(frame, composite.get_frame(t))
+
+
+def test_transition_renderer_memoizes_pairs():
+    """Кадр для той же пары и времени берётся из памяти и не изменяется следующим рендером"""
+    import numpy as np
+    from utils import TransitionRenderer
+
+    old = np.zeros((4, 8, 3), dtype=np.uint8)
+    new = np.full((4, 8, 3), 255, dtype=np.uint8)
+    renderer = TransitionRenderer()
+
+    first = renderer.render("slide", old, new, 0.25, 0.5, key=(0, 1))
+    renderer.render("push", new, old, 0.1, 0.5)
+    assert renderer.render("slide", old, new, 0.25, 0.5, key=(0, 1)) is first
+    assert (first[:, :4] == 0).all() and (first[:, 4:] == 255).all()
+    assert not first.flags.writeable
+
+
+def test_crossfade_frame_blends_in_integers():
+    """Crossfade совпадает с точным смешиванием с точностью до 1 и не смешивает вне окна"""
+    import numpy as np
+    from utils import crossfade_frame
+
+    rng = np.random.default_rng(1)
+    old, new = (rng.integers(0, 256, (16, 16, 3), dtype=np.uint8) for _ in range(2))
+    out = np.empty_like(old)
+
+    frame = crossfade_frame(old, new, 0.125, 0.5, out)
+    reference = old * 0.75 + new * 0.25
+    assert frame is out and frame.dtype == np.uint8
+    assert np.abs(frame - reference).max() <= 1
+
+    assert np.array_equal(crossfade_frame(old, new, 0.0, 0.5, out), old)
+    assert np.array_equal(crossfade_frame(old, new, 0.5, 0.5, out), new)
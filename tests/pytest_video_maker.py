@@ -3,6 +3,7 @@ import tempfile
 import pytest
 from PIL import Image
 from video_maker import create_video_from_images
+from audio_processor import render_audio_track
 from image_processor import generate_overlay
 from pydub.generators import Sine
 from moviepy.editor import AudioFileClip, VideoFileClip, AudioClip
@@ -97,6 +98,20 @@ def test_video_with_audio(temp_images, temp_audio_file):
     os.remove(output_path)
 
 
+def test_video_with_prepared_audio_track(temp_images, temp_audio_file, tmp_path):
+    """Готовая дорожка не декодируется при кодировании: видео склеивается с ней копированием потоков"""
+    track = render_audio_track(temp_audio_file, mode="cut", video_duration=3.0, workdir=str(tmp_path))
+    output_path = str(tmp_path / "out.mp4")
+
+    create_video_from_images(images=temp_images, duration=1.0, fps=24, output_path=output_path,
+                             transition="none", audio_clip=track)
+
+    clip = VideoFileClip(output_path)
+    assert clip.audio is not None
+    assert clip.duration == pytest.approx(3.0, abs=0.1)
+    clip.close()
+
+
 def test_video_duration_matches_audio(temp_images, temp_audio_file):
     audio_clip = AudioFileClip(temp_audio_file)
     expected_duration = round(audio_clip.duration, 1)
@@ -262,3 +277,412 @@ def test_video_export_with_crf(temp_images):
     assert os.path.getsize(output_path) > 0
     os.remove(output_path)
 
+
+
+def test_create_video_from_lazy_source(tmp_path):
+    """Видео собирается из ленивого источника без предварительной загрузки всех кадров"""
+    from image_processor import load_and_process_images
+
+    img_dir = tmp_path / "imgs"
+    img_dir.mkdir()
+    for idx, color in enumerate(["red", "green", "blue"]):
+        Image.new("RGB", (200, 300), color=color).save(img_dir / f"{idx}.png")
+
+    source = load_and_process_images(str(img_dir), lazy=True)
+    output_path = str(tmp_path / "lazy.mp4")
+
+    create_video_from_images(
+        images=source,
+        duration=1.0,
+        fps=12,
+        output_path=output_path,
+        transition="slide",
+        transition_duration=0.5
+    )
+
+    assert os.path.exists(output_path) and os.path.getsize(output_path) > 0
+    assert len(source._images) <= source.max_resident
+
+
+def test_frames_converted_once_and_shared_across_loops(temp_images, monkeypatch, tmp_path):
+    """Изображения не сохраняются в PNG, массивы готовятся один раз на изображение"""
+    import video_maker
+
+    def fail_save(*args, **kwargs):
+        raise AssertionError("PNG не должен создаваться")
+
+    monkeypatch.setattr(Image.Image, "save", fail_save)
+    created = []
+    original_init = video_maker._FrameStore.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        created.append(self)
+
+    monkeypatch.setattr(video_maker._FrameStore, "__init__", tracking_init)
+
+    audio_clip = AudioClip(lambda t: [0], duration=6.0)
+    audio_clip.fps = 44100
+    output_path = str(tmp_path / "shared.mp4")
+
+    create_video_from_images(images=temp_images, duration=1.0, fps=4, output_path=output_path,
+                             transition="none", audio_clip=audio_clip)
+
+    assert os.path.getsize(output_path) > 0
+    assert len(created) == 1 and len(created[0].frames) == len(temp_images)
+
+
+def test_spill_frames_uses_memory_map(temp_images, tmp_path):
+    """В режиме экономии памяти кадры читаются с диска через memory map"""
+    import numpy as np
+    from video_maker import _FrameStore
+
+    store = _FrameStore(temp_images, spill_dir=str(tmp_path))
+    assert all(isinstance(frame, np.memmap) for frame in store.frames)
+    assert store[0].size == (1080, 1920)
+
+    output_path = str(tmp_path / "spill.mp4")
+    create_video_from_images(images=temp_images, duration=1.0, fps=4, output_path=output_path,
+                             transition="none", zoom_factor=0.1, spill_frames=True)
+    assert os.path.getsize(output_path) > 0
+
+
+@pytest.mark.parametrize("audio_duration", [7.5, 9.0])
+def test_reuse_loops_renders_loop_once(temp_images, tmp_path, monkeypatch, audio_duration):
+    """В режиме reuse_loops круг кодируется один раз и склеивается до длины аудио"""
+    from moviepy.video.VideoClip import VideoClip
+
+    writes = []
+    original_write = VideoClip.write_videofile
+
+    def counting_write(self, *args, **kwargs):
+        writes.append(self.duration)
+        return original_write(self, *args, **kwargs)
+
+    monkeypatch.setattr(VideoClip, "write_videofile", counting_write)
+
+    audio_clip = AudioClip(lambda t: [0], duration=audio_duration)
+    audio_clip.fps = 44100
+    output_path = str(tmp_path / "loops.mp4")
+
+    create_video_from_images(images=temp_images, duration=1.0, fps=4, output_path=output_path,
+                             transition="slide", transition_duration=0.5,
+                             audio_clip=audio_clip, reuse_loops=True)
+
+    # Один круг с переходом к первому кадру + финальный (хвост или круг без перехода)
+    assert len(writes) == 2
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - audio_duration) < 0.3
+        assert video.audio is not None
+
+
+@pytest.mark.parametrize("transition", ["none", "fade", "slide"])
+def test_still_fastpath_matches_duration(temp_images, tmp_path, transition):
+    """Режим неподвижных кадров даёт видео той же длительности, что и обычный рендер"""
+    output_path = str(tmp_path / f"still_{transition}.mp4")
+
+    create_video_from_images(images=temp_images, duration=1.0, fps=12, output_path=output_path,
+                             transition=transition, transition_duration=0.25, still_fastpath=True)
+
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - 3.0) < 0.1
+        # Середина второго изображения — зелёный кадр (0, 128, 0)
+        r, g, b = video.get_frame(1.5)[960, 540]
+        assert g > 100 and r < 60 and b < 60
+
+
+def test_crossfade_blends_neighbouring_images(temp_images, tmp_path):
+    """Crossfade смешивает соседние изображения без провала в чёрный"""
+    output_path = str(tmp_path / "crossfade.mp4")
+
+    create_video_from_images(images=temp_images[:2], duration=1.0, fps=10, output_path=output_path,
+                             transition="crossfade", transition_duration=0.4)
+
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - 2.0) < 0.1
+        r, g, b = video.get_frame(0.3)[960, 540]  # до окна перехода — красный
+        assert r > 200 and g < 60
+        r, g, b = video.get_frame(0.8)[960, 540]  # середина окна — смесь красного и зелёного
+        assert 80 < r < 180 and 30 < g < 100
+
+
+def test_still_fastpath_with_reused_loops_and_audio(temp_images, tmp_path):
+    """Неподвижные кадры совместимы с повтором круга и аудио"""
+    audio_clip = AudioClip(lambda t: [0], duration=7.5)
+    audio_clip.fps = 44100
+    output_path = str(tmp_path / "still_loops.mp4")
+
+    create_video_from_images(images=temp_images, duration=1.0, fps=12, output_path=output_path,
+                             transition="push", transition_duration=0.25, audio_clip=audio_clip,
+                             reuse_loops=True, still_fastpath=True)
+
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - 7.5) < 0.15
+        r, g, b = video.get_frame(7.2)[960, 540]  # третий круг, второе изображение
+        assert g > 100 and r < 60
+
+
+def _count_video_frames(path):
+    import re
+    import subprocess
+    from ffmpeg_tools import ffmpeg_binary
+
+    result = subprocess.run([ffmpeg_binary(), "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return int(re.findall(r"frame=\s*(\d+)", result.stderr.decode("utf-8", "replace"))[-1])
+
+
+@pytest.mark.parametrize("transition", ["fade", "slide"])
+def test_parallel_encoding_joins_chunks(temp_images, tmp_path, transition):
+    """Параллельно закодированные клипы склеиваются в видео нужной длительности и числа кадров"""
+    audio_clip = AudioClip(lambda t: [0], duration=4.5)
+    audio_clip.fps = 44100
+    output_path = str(tmp_path / f"parallel_{transition}.mp4")
+
+    create_video_from_images(images=temp_images, duration=1.0, fps=10, output_path=output_path,
+                             transition=transition, transition_duration=0.25, zoom_factor=0.1,
+                             audio_clip=audio_clip, encode_workers=2)
+
+    assert _count_video_frames(output_path) == 45
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - 4.5) < 0.1
+        assert video.audio is not None
+        r, g, b = video.get_frame(3.5)[960, 540]  # второй круг, первое изображение — красное
+        assert r > 200 and g < 60
+
+
+def test_still_fastpath_ignored_by_chunked_encoding_warns(temp_images, tmp_path, monkeypatch, caplog):
+    """При кодировании по клипам --still-fastpath не действует — об этом пишется предупреждение"""
+    import video_maker
+
+    monkeypatch.setattr(video_maker, "_write_chunks", lambda *args, **kwargs: None)
+    with caplog.at_level("WARNING"):
+        create_video_from_images(images=temp_images, duration=1.0, fps=10, output_path=str(tmp_path / "out.mp4"),
+                                 still_fastpath=True, encode_workers=2)
+    assert "--still-fastpath" in caplog.text
+
+
+def test_reuse_loops_ignored_by_chunked_encoding_warns(temp_images, tmp_path, monkeypatch, caplog):
+    """При кодировании по клипам --reuse-loops не действует — об этом пишется предупреждение"""
+    import video_maker
+
+    monkeypatch.setattr(video_maker, "_write_chunks", lambda *args, **kwargs: None)
+    with caplog.at_level("WARNING"):
+        create_video_from_images(images=temp_images, duration=1.0, fps=10, output_path=str(tmp_path / "out.mp4"),
+                                 reuse_loops=True, encode_workers=2)
+    assert "--reuse-loops" in caplog.text
+    assert "--still-fastpath" not in caplog.text
+
+
+def test_chunk_worker_disables_inherited_profiler(monkeypatch):
+    """Рабочий процесс кодирования клипов выключает профилировщик, унаследованный при fork"""
+    import profiling
+    import video_maker
+    from moviepy.editor import ColorClip
+
+    monkeypatch.setattr(video_maker, "_init_worker", lambda *args: None)
+    profiling.start_profile(frames=10)
+    try:
+        video_maker._init_chunk_worker(None, 0)
+        assert profiling._active is None
+        clip = ColorClip((4, 4), color=(0, 0, 0), duration=1)
+        make_frame = clip.make_frame
+        assert video_maker.profiled_clip(clip).make_frame is make_frame
+    finally:
+        profiling.stop_profile()
+
+
+def test_zoom_in_source_box_centered():
+    """Область источника для увеличения в 2 раза — центральная половина кадра"""
+    from video_maker import zoom_in_source_box
+
+    assert zoom_in_source_box((1080, 1920), 1.0) == (0.0, 0.0, 1080.0, 1920.0)
+    assert zoom_in_source_box((1080, 1920), 2.0) == (270.0, 480.0, 810.0, 1440.0)
+
+
+def test_zoom_in_crop_before_resize_matches_full_resize():
+    """Кадр zoom-in совпадает с увеличением всего изображения и обрезкой центра"""
+    import numpy as np
+    from video_maker import make_zoom_in_frame_factory
+
+    gradient = np.tile(np.linspace(0, 255, 1080, dtype=np.uint8), (1920, 1))
+    img = Image.fromarray(np.dstack([gradient] * 3))
+
+    frame = make_zoom_in_frame_factory(img, None, zoom_factor=1.0, duration=1.0)(1.0)
+    reference = np.array(img.resize((2160, 3840), Image.LANCZOS).crop((540, 960, 1620, 2880)))
+
+    assert frame.shape == (1920, 1080, 3)
+    assert np.abs(frame.astype(int) - reference.astype(int)).max() <= 2
+
+
+def test_zoom_out_resamples_fractional_box():
+    """Кадр zoom-out ресэмплируется из дробной центральной области и совпадает с обрезкой и уменьшением"""
+    import numpy as np
+    from video_maker import make_zoom_out_frame_factory, zoom_out_source_box
+
+    gradient = np.tile(np.linspace(0, 255, 1080, dtype=np.uint8), (1920, 1))
+    img = Image.fromarray(np.dstack([gradient] * 3))
+
+    assert zoom_out_source_box((1080, 1920), 0.5) == (270.0, 480.0, 810.0, 1440.0)
+    frame = make_zoom_out_frame_factory(img, None, zoom_out_factor=1.0, duration=1.0)(0.0)
+    reference = np.array(img.crop((270, 480, 810, 1440)).resize((1080, 1920), Image.LANCZOS))
+
+    assert frame.shape == (1920, 1080, 3)
+    assert np.abs(frame.astype(int) - reference.astype(int)).max() <= 2
+
+
+def test_zoom_frames_from_headroom_source():
+    """Источник с запасом разрешения ресэмплируется прямо в кадр: без zoom — всё изображение целиком"""
+    import numpy as np
+    from video_maker import make_zoom_in_frame_factory, make_zoom_out_frame_factory
+
+    gradient = np.tile(np.linspace(0, 255, 1296, dtype=np.uint8), (2304, 1))
+    img = Image.fromarray(np.dstack([gradient] * 3))
+    reference = np.array(img.resize((1080, 1920), Image.LANCZOS))
+
+    zoom_in = make_zoom_in_frame_factory(img, None, zoom_factor=0.2, duration=1.0)
+    zoom_out = make_zoom_out_frame_factory(img, None, zoom_out_factor=0.2, duration=1.0)
+    for frame in (zoom_in(0.0), zoom_out(1.0)):
+        assert frame.shape == (1920, 1080, 3)
+        assert np.abs(frame.astype(int) - reference.astype(int)).max() <= 2
+
+    # В конце увеличения в кадр попадает центральная область 1080x1920 — пиксели не растягиваются
+    center = np.array(img.crop((108, 192, 1188, 2112)))
+    assert np.abs(zoom_in(1.0).astype(int) - center.astype(int)).max() <= 2
+
+
+def test_zoom_render_from_headroom_images(tmp_path):
+    """Изображения с запасом для zoom рендерятся в кадр заданного размера"""
+    output_path = str(tmp_path / "zoom.mp4")
+    images = [Image.new("RGB", (324, 576), color=c) for c in ["red", "green"]]
+    for zoom in ({"zoom_factor": 0.2}, {"zoom_out_factor": 0.2}):
+        create_video_from_images(images=images, duration=0.5, fps=10, output_path=output_path,
+                                 transition="none", size=(270, 480), **zoom)
+        with VideoFileClip(output_path) as clip:
+            assert tuple(clip.size) == (270, 480)
+            assert clip.duration == pytest.approx(1.0, abs=0.1)
+
+
+def test_incremental_render_reencodes_only_changed_clips(temp_images, tmp_path, monkeypatch):
+    """Повторный рендер кодирует только клипы, чьи входы изменились"""
+    import video_maker
+
+    encoded = []
+    original = video_maker._render_chunk
+
+    def counting_render(task):
+        encoded.append(task[0].clip)
+        return original(task)
+
+    monkeypatch.setattr(video_maker, "_render_chunk", counting_render)
+    parts_dir = str(tmp_path / "out.parts")
+    output_path = str(tmp_path / "out.mp4")
+
+    def render(images):
+        encoded.clear()
+        create_video_from_images(images=images, duration=1.0, fps=10, output_path=output_path,
+                                 transition="slide", transition_duration=0.25, parts_dir=parts_dir)
+        return sorted(encoded)
+
+    assert render(temp_images) == [0, 1, 2]
+    assert render(temp_images) == []
+
+    # Новое третье изображение: меняются его клип и переход в него из второго
+    changed = temp_images[:2] + [Image.new("RGB", (1080, 1920), color="white")]
+    assert render(changed) == [1, 2]
+    assert len([name for name in os.listdir(parts_dir) if name.endswith(".mp4")]) == 3
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - 3.0) < 0.1
+        assert video.get_frame(2.5)[960, 540].min() > 200
+
+
+def test_resume_after_crash_continues_from_missing_clip(temp_images, tmp_path, monkeypatch):
+    """После сбоя повторный запуск берёт готовые клипы из журнала и кодирует только недостающие"""
+    import video_maker
+
+    encoded = []
+    original = video_maker._render_chunk
+
+    def crashing_render(task):
+        if task[0].clip == 2:
+            raise RuntimeError("ffmpeg упал")
+        encoded.append(task[0].clip)
+        return original(task)
+
+    monkeypatch.setattr(video_maker, "_render_chunk", crashing_render)
+    parts_dir = str(tmp_path / "out.parts")
+    output_path = str(tmp_path / "out.mp4")
+    kwargs = dict(images=temp_images, duration=1.0, fps=10, output_path=output_path, transition="fade",
+                  transition_duration=0.25, parts_dir=parts_dir, keep_parts=False)
+
+    with pytest.raises(RuntimeError):
+        create_video_from_images(**kwargs)
+    assert encoded == [0, 1]
+    assert os.path.isfile(os.path.join(parts_dir, "journal.jsonl"))
+
+    # Недописанный файл оставшегося клипа не должен считаться готовым
+    with open(os.path.join(parts_dir, "clip_broken.part.mp4"), "wb") as f:
+        f.write(b"\0" * 100)
+
+    encoded.clear()
+    monkeypatch.setattr(video_maker, "_render_chunk", lambda task: (encoded.append(task[0].clip), original(task))[1])
+    create_video_from_images(**kwargs)
+
+    assert encoded == [2]
+    assert not os.path.exists(parts_dir)
+    with VideoFileClip(output_path) as video:
+        assert abs(video.duration - 3.0) < 0.1
+
+
+def test_custom_resolution_preview_render(tmp_path):
+    """Разрешение задаётся параметром: кадр, zoom и оверлей строятся в нём, длительность не меняется"""
+    size = (270, 480)
+    images = [Image.new("RGB", size, color=c) for c in ["red", "green"]]
+    overlay = generate_overlay(text="Preview", size=size)
+    assert overlay.size == size
+    output_path = str(tmp_path / "preview.mp4")
+
+    create_video_from_images(images=images, duration=1.5, fps=12, output_path=output_path, transition="slide",
+                             zoom_factor=0.2, overlays=[overlay] * 2, size=size, preset="ultrafast",
+                             resample=Image.BILINEAR)
+
+    clip = VideoFileClip(output_path)
+    assert tuple(clip.size) == size
+    assert clip.duration == pytest.approx(3.0, abs=0.1)
+    clip.close()
+
+
+def test_memory_plan_spills_lazy_source(tmp_path, monkeypatch):
+    """Под бюджетом памяти ленивый источник декодируется один раз и выгружается в memory map"""
+    import numpy as np
+    import video_maker
+    from image_processor import load_and_process_images
+    from memory_budget import plan_memory
+
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    for idx, color in enumerate(["red", "green", "blue"]):
+        Image.new("RGB", (300, 200), color).save(str(image_dir / ("%d.png" % idx)))
+
+    size = (108, 192)
+    plan = plan_memory(256 * 1024, 3, size)
+    assert plan.spill
+    source = load_and_process_images(str(image_dir), lazy=True, size=size, max_resident=plan.max_resident)
+
+    created = []
+    original_init = video_maker._FrameStore.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        created.append(self)
+
+    monkeypatch.setattr(video_maker._FrameStore, "__init__", tracking_init)
+
+    output_path = str(tmp_path / "budget.mp4")
+    create_video_from_images(images=source, duration=1.0, fps=4, output_path=output_path,
+                             transition="slide", zoom_factor=0.1, size=size, memory_plan=plan)
+    assert os.path.getsize(output_path) > 0
+    assert len(created) == 1
+    assert all(isinstance(frame, np.memmap) for frame in created[0].frames)
+    assert created[0].max_resident == plan.max_resident
+    assert len(created[0]._images) <= plan.max_resident
@@ -1,4 +1,5 @@
 # utils.py
+import numpy as np
 from moviepy.editor import CompositeVideoClip
 
 def slide_transition(old_clip, new_clip, duration=0.5):
@@ -16,3 +17,105 @@ def push_transition(clip1, clip2, duration=1.0):
     out_clip = clip1.set_position(lambda t: (-w * t / duration, 0)).set_end(duration)
     in_clip = clip2.set_position(lambda t: (w - w * t / duration, 0)).set_start(0)
     return CompositeVideoClip([out_clip, in_clip], size=(w, h)).set_duration(duration)
+
+
+def slide_frame(old, new, t, duration, out):
+    """
+    Кадр перехода 'slide' в буфер out: старое изображение неподвижно, новое выезжает справа.
+    Позиция считается так же, как в slide_transition (с отбрасыванием дробной части).
+    """
+    w = out.shape[1]
+    x = min(max(int(w * (1 - t / duration)), 0), w)
+    out[:, :x] = old[:, :x]
+    out[:, x:] = new[:, :w - x]
+    return out
+
+
+def push_frame(old, new, t, duration, out):
+    """Кадр перехода 'push' в буфер out: старое изображение уезжает влево, новое заезжает справа."""
+    w = out.shape[1]
+    shift = min(max(int(w * t / duration), 0), w)
+    x = min(max(int(w - w * t / duration), 0), w)
+    out[:, :w - shift] = old[:, shift:]
+    # Между изображениями может остаться столбец фона из-за округления — как в push_transition
+    out[:, w - shift:x] = 0
+    out[:, x:] = new[:, :w - x]
+    return out
+
+
+def crossfade_weight(t, duration):
+    """Доля нового изображения в момент t в целых 1/256 (0 — только старое, 256 — только новое)."""
+    return min(max(int(round(256 * t / duration)), 0), 256)
+
+
+def crossfade_frame(old, new, t, duration, out, scratch=None):
+    """
+    Кадр перехода 'crossfade' в буфер out: (old * (256 - w) + new * w) >> 8 в целых числах.
+    scratch — пара uint16-буферов формы кадра для промежуточных сумм (без float-массивов).
+    """
+    w = crossfade_weight(t, duration)
+    # Вне окна смешивания кадр просто копируется
+    if w == 0:
+        out[...] = old
+        return out
+    if w == 256:
+        out[...] = new
+        return out
+
+    if scratch is None:
+        scratch = (np.empty(out.shape, dtype=np.uint16), np.empty(out.shape, dtype=np.uint16))
+    acc, tmp = scratch
+    np.multiply(old, 256 - w, out=acc, dtype=np.uint16)
+    np.multiply(new, w, out=tmp, dtype=np.uint16)
+    acc += tmp
+    acc >>= 8
+    out[...] = acc
+    return out
+
+
+class TransitionRenderer:
+    """
+    Рендер кадров slide/push копированием срезов массивов в один переиспользуемый буфер
+    (без CompositeVideoClip, масок и выделения фона на каждый кадр) и crossfade —
+    целочисленным смешиванием в тех же заранее выделенных буферах.
+
+    Кадры переходов между неподвижными изображениями запоминаются по ключу
+    (пара изображений, тип перехода, длительность, время кадра), пока не исчерпан лимит memo_bytes:
+    при повторе кругов те же пары не рендерятся заново.
+    """
+
+    frame_functions = {"slide": slide_frame, "push": push_frame}
+
+    def __init__(self, memo_bytes=256 * 1024 ** 2):
+        self.memo_bytes = memo_bytes
+        self._memo = {}
+        self._memo_size = 0
+        self._buffer = None
+        self._scratch = None
+
+    def render(self, transition, old, new, t, duration, key=None):
+        """
+        Возвращает кадр перехода в момент t. Без key результат лежит в общем буфере
+        и действителен до следующего вызова; запомненные кадры доступны только для чтения.
+        """
+        if key is not None:
+            key = (key, transition, duration, round(t, 6))
+            frame = self._memo.get(key)
+            if frame is not None:
+                return frame
+
+        if self._buffer is None or self._buffer.shape != old.shape:
+            self._buffer = np.empty(old.shape, dtype=np.uint8)
+        if transition == "crossfade":
+            if self._scratch is None or self._scratch[0].shape != old.shape:
+                self._scratch = (np.empty(old.shape, dtype=np.uint16), np.empty(old.shape, dtype=np.uint16))
+            frame = crossfade_frame(old, new, t, duration, self._buffer, self._scratch)
+        else:
+            frame = self.frame_functions[transition](old, new, t, duration, self._buffer)
+
+        if key is not None and self._memo_size + frame.nbytes <= self.memo_bytes:
+            frame = frame.copy()
+            frame.flags.writeable = False
+            self._memo[key] = frame
+            self._memo_size += frame.nbytes
+        return frame
@@ -1,78 +1,471 @@
 # video_maker.py
-from moviepy.editor import ImageClip, concatenate_videoclips, CompositeVideoClip
+from moviepy.editor import concatenate_videoclips
 from moviepy.video.VideoClip import VideoClip
 import numpy as np
 from PIL import Image
 import tempfile
+import shutil
 import os
 import logging
-from utils import slide_transition, push_transition
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from logging.handlers import QueueListener
+from contextlib import nullcontext
+from functools import partial
+from utils import TransitionRenderer
+from image_processor import LazyImageSource, TARGET_SIZE, _init_worker, _ForwardToLoggerHandler
+from ffmpeg_tools import concat_copy, encode_frames, mux_audio
+from segment_renderer import (plan_segments, write_segmented, frame_index, plan_clip_chunks, segment_duration,
+                              array_digest, chunk_fingerprint, completed_parts, save_manifest, RenderJournal)
+from overlay_compositor import OverlayCompositor
+from audio_processor import AudioTrack
+from metrics import span, timed_frames, start_run, stop_run, collecting, merge_frames
+from profiling import profiled_clip, stop_profile
 
 logger = logging.getLogger(__name__)
 
-# Фабрика кадров с эффектом увеличения (zoom-in)
-def make_zoom_in_frame_factory(img, overlay, zoom_factor, duration):
-    w, h = img.size
+def zoom_in_source_box(size, scale):
+    """
+    Прямоугольник исходного изображения (в дробных координатах), который после увеличения
+    в scale раз и центрирования занимает весь кадр. Изображение может быть больше кадра
+    (запас разрешения для zoom) — область считается в долях его размера.
+    """
+    w, h = size
+    box_w, box_h = w / scale, h / scale
+    left = (w - box_w) / 2
+    top = (h - box_h) / 2
+    return (left, top, left + box_w, top + box_h)
+
+def zoom_out_source_box(size, scale):
+    """Центральная область исходного изображения размером scale от исходного (дробные координаты)."""
+    w, h = size
+    box_w, box_h = w * scale, h * scale
+    left = (w - box_w) / 2
+    top = (h - box_h) / 2
+    return (left, top, left + box_w, top + box_h)
+
+def _as_compositor(overlay, size=TARGET_SIZE):
+    if overlay is None or isinstance(overlay, OverlayCompositor):
+        return overlay
+    return OverlayCompositor(overlay, size)
+
+# Фабрика кадров с эффектом увеличения (zoom-in); img — PIL-изображение (возможно, с запасом разрешения),
+# overlay — PIL-слой или готовый OverlayCompositor; size — размер кадра, resample — фильтр ресэмплинга
+def make_zoom_in_frame_factory(img, overlay, zoom_factor, duration, size=TARGET_SIZE, resample=Image.LANCZOS):
+    compositor = _as_compositor(overlay, size)
 
     def make_frame(t):
         # Масштаб изображения со временем
         scale = 1 + zoom_factor * t / duration
-        new_w, new_h = int(w * scale), int(h * scale)
-        resized = img.resize((new_w, new_h), Image.LANCZOS)
 
-        # Центрируем 1080x1920 в кадре
-        left = max((new_w - 1080) // 2, 0)
-        top = max((new_h - 1920) // 2, 0)
-        cropped = resized.crop((left, top, left + 1080, top + 1920))
+        # Ресэмплируем сразу в кадр size только видимую область (без увеличения всего изображения);
+        # дробные координаты области дают плавное движение без скачков на целых пикселях
+        box = zoom_in_source_box(img.size, scale)
+        cropped = img.resize(size, resample, box=box)
 
-        # Наложение оверлея, если задан
-        if overlay:
-            cropped = cropped.convert("RGBA")
-            ov = overlay.copy()
-            if ov.size != cropped.size:
-                ov = ov.resize(cropped.size, Image.LANCZOS)
-            cropped.paste(ov, (0, 0), ov)
-
-        return np.array(cropped.convert("RGB"))
+        frame = np.array(cropped)
+        # Наложение оверлея на месте, только в областях текста и логотипа
+        if compositor:
+            compositor.apply(frame)
+        return frame
 
     return make_frame
 
-# Фабрика кадров с эффектом уменьшения (zoom-out)
-def make_zoom_out_frame_factory(img, overlay, zoom_out_factor, duration):
-    w, h = img.size
+# Фабрика кадров с эффектом уменьшения (zoom-out); img — PIL-изображение (возможно, с запасом разрешения),
+# overlay — PIL-слой или готовый OverlayCompositor; size — размер кадра, resample — фильтр ресэмплинга
+def make_zoom_out_frame_factory(img, overlay, zoom_out_factor, duration, size=TARGET_SIZE,
+                                resample=Image.LANCZOS):
+    compositor = _as_compositor(overlay, size)
 
     def make_frame(t):
         # Вычисляем масштаб уменьшающегося изображения
         scale = 1 / (1 + zoom_out_factor * (1 - t / duration))
-        crop_w, crop_h = int(w * scale), int(h * scale)
-        cx, cy = w // 2, h // 2
-        left = max(cx - crop_w // 2, 0)
-        top = max(cy - crop_h // 2, 0)
-        right = min(left + crop_w, w)
-        bottom = min(top + crop_h, h)
-
-        # Обрезаем и приводим к размеру 1080x1920
-        cropped = img.crop((left, top, right, bottom))
-        resized = cropped.resize((1080, 1920), Image.LANCZOS)
-
-        # Наложение оверлея, если задан
-        if overlay:
-            resized = resized.convert("RGBA")
-            ov = overlay.copy()
-            if ov.size != resized.size:
-                ov = ov.resize(resized.size, Image.LANCZOS)
-            resized.paste(ov, (0, 0), ov)
-
-        return np.array(resized.convert("RGB"))
+
+        # Центральная область ресэмплируется сразу в кадр size: дробные координаты вместо
+        # обрезки по целым пикселям дают плавное движение, как у zoom-in
+        box = zoom_out_source_box(img.size, scale)
+        resized = img.resize(size, resample, box=box)
+
+        frame = np.array(resized)
+        # Наложение оверлея на месте, только в областях текста и логотипа
+        if compositor:
+            compositor.apply(frame)
+        return frame
 
     return make_frame
 
+def _on_demand_clip(make_frame, size, duration):
+    """Создаёт VideoClip без пробного вызова make_frame(0), чтобы не загружать кадр заранее."""
+    clip = VideoClip(duration=duration)
+    clip.make_frame = make_frame
+    clip.size = size
+    return clip
+
+
+class _FrameStore:
+    """
+    Кадры изображений в виде numpy-массивов, подготовленные один раз и общие для всех повторов.
+
+    Если задан spill_dir (режим экономии памяти), массивы сохраняются на диск
+    и читаются через memory map, а PIL-копии для zoom держатся лишь для max_resident кадров
+    (по умолчанию 3). images может быть LazyImageSource — тогда кадры декодируются по одному.
+    Интерфейс совпадает с LazyImageSource: store[idx] — PIL-изображение, get_array(idx) — массив.
+    """
+
+    def __init__(self, images, spill_dir=None, max_resident=None):
+        self.frames = []
+        for idx, img in enumerate(images):
+            arr = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+            if spill_dir:
+                path = os.path.join(spill_dir, f"frame_{idx:03d}.npy")
+                np.save(path, arr)
+                arr = np.load(path, mmap_mode="r")
+            self.frames.append(arr)
+        # Без выгрузки на диск кадры и так в памяти — PIL-копии по умолчанию кэшируем без ограничения
+        if max_resident is None and spill_dir:
+            max_resident = 3
+        self.max_resident = max_resident
+        self._images = OrderedDict()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, idx):
+        if idx in self._images:
+            self._images.move_to_end(idx)
+            return self._images[idx]
+        img = Image.fromarray(np.asarray(self.frames[idx]))
+        self._images[idx] = img
+        if self.max_resident is not None:
+            while len(self._images) > self.max_resident:
+                self._images.popitem(last=False)
+        return img
+
+    def get_array(self, idx):
+        return self.frames[idx]
+
+
+# Клип, кадры которого берутся из источника (_FrameStore или LazyImageSource) во время рендеринга
+def _make_source_clip(source, idx, duration, fps, zoom_factor, zoom_out_factor, overlay,
+                      size=TARGET_SIZE, resample=Image.LANCZOS):
+    if zoom_factor is not None and zoom_factor > 0:
+        def make_frame(t):
+            return make_zoom_in_frame_factory(source[idx], overlay, zoom_factor, duration, size, resample)(t)
+        return _on_demand_clip(timed_frames("zoom_in", make_frame), size, duration).set_fps(fps)
+
+    if zoom_out_factor is not None and zoom_out_factor > 0:
+        def make_frame(t):
+            return make_zoom_out_frame_factory(source[idx], overlay, zoom_out_factor, duration, size, resample)(t)
+        return _on_demand_clip(timed_frames("zoom_out", make_frame), size, duration).set_fps(fps)
+
+    # Без zoom-эффекта: кадр не меняется, возвращается один и тот же массив
+    return _on_demand_clip(lambda t: source.get_array(idx), size, duration)
+
+def _concatenate(clips):
+    """
+    Склеивает части таймлайна. Фон задан явно: без него moviepy считает результат прозрачным
+    и для каждой части держит полноразмерную маску float64 (около 16 МБ на кадр 1080x1920),
+    хотя все части непрозрачны и закрывают кадр целиком.
+    """
+    return concatenate_videoclips(clips, method="compose", bg_color=(0, 0, 0))
+
+# Части таймлайна для клипа c1 с переходом к c2 (c2=None — последний клип, без перехода).
+# pair — ключ пары неподвижных изображений для запоминания кадров перехода в renderer.
+def _transition_parts(c1, c2, transition, duration, transition_duration, renderer=None, pair=None):
+    if c2 is None:
+        return [c1.set_duration(duration)]
+    if transition == "none":
+        return [c1]
+    if transition == "fade":
+        return [c1.fadein(transition_duration).fadeout(transition_duration)]
+    if transition in ("slide", "push", "crossfade"):
+        main_part = c1.set_duration(duration - transition_duration)
+        return [main_part, _array_transition_clip(c1, c2, transition, duration, transition_duration, renderer, pair)]
+    return []
+
+
+def _array_transition_clip(c1, c2, transition, duration, transition_duration, renderer=None, pair=None):
+    """
+    Клип перехода slide/push/crossfade, кадры которого собираются из массивов в TransitionRenderer.
+    Старое изображение берётся с конца своего клипа, новое — с начала (важно при zoom).
+    """
+    renderer = renderer or TransitionRenderer()
+    offset = duration - transition_duration
+
+    def make_frame(t):
+        return renderer.render(transition, c1.get_frame(offset + t), c2.get_frame(t), t, transition_duration,
+                               key=pair)
+
+    return _on_demand_clip(timed_frames(transition, make_frame), c1.size, transition_duration)
+
+
+def _export_params(crf, bitrate, preset="medium"):
+    """Параметры кодирования, общие для итогового файла и промежуточных частей."""
+    ffmpeg_params = []
+    if crf is not None:
+        ffmpeg_params.extend(["-crf", str(crf)])
+    return dict(codec="libx264", bitrate=None if crf is not None else bitrate, ffmpeg_params=ffmpeg_params,
+                preset=preset)
+
+
+def _write_audio_track(audio_clip, workdir):
+    """
+    Записывает аудиодорожку во временный файл для склейки без перекодирования видео.
+    Готовая дорожка (AudioTrack) используется как есть.
+    """
+    if isinstance(audio_clip, AudioTrack):
+        return audio_clip.path
+    audio_path = os.path.join(workdir, "audio.m4a")
+    audio_clip.write_audiofile(audio_path, fps=getattr(audio_clip, "fps", None) or 44100, codec="aac")
+    logger.info("Добавлена аудиодорожка длительностью %.2f сек", audio_clip.duration)
+    return audio_path
+
+
+def _write_part(video, path, fps, export, workdir, plan=None):
+    """
+    Записывает клип без звука: покадрово через moviepy или, если задан план отрезков
+    (режим неподвижных кадров), по отрезкам со склейкой без перекодирования.
+    Возвращает точную длительность записанного видео.
+    """
+    video = profiled_clip(video)
+    if plan is None:
+        video.write_videofile(path, fps=fps, audio=False, **export)
+        return frame_index(video.duration, fps) / fps
+
+    part_dir = tempfile.mkdtemp(dir=workdir)
+    prefix = os.path.splitext(os.path.basename(path))[0]
+    return write_segmented(video, path, fps, export, plan(video), part_dir, prefix=prefix)
+
+
+def _write_reused_loops(loop_clips, total_duration, duration, fps, output_path, export,
+                        audio_clip, transition, transition_duration, plan_for=None,
+                        renderer=None, static_clips=False):
+    """
+    Рендерит один полный круг изображений (с переходом от последнего к первому) один раз,
+    повторяет его склейкой без перекодирования и дописывает хвост до длины аудио.
+    Время рендеринга зависит от числа изображений, а не от длительности аудио.
+    plan_for(last_has_transition) возвращает план отрезков для режима неподвижных кадров.
+    static_clips — клипы без zoom: кадры переходов запоминаются в renderer по парам изображений.
+    """
+    num_images = len(loop_clips)
+    loop_duration = num_images * duration
+    full_loops = int(total_duration // loop_duration)
+    remainder = total_duration - full_loops * loop_duration
+    epsilon = 1e-6
+
+    # Круг с переходом к первому изображению и последний круг без него (как в обычном режиме)
+    wrap_parts, final_parts = [], []
+    for idx in range(num_images):
+        next_clip = loop_clips[(idx + 1) % num_images]
+        pair = (idx, (idx + 1) % num_images) if static_clips else None
+        wrap_parts.extend(_transition_parts(loop_clips[idx], next_clip, transition, duration, transition_duration,
+                                            renderer, pair))
+        final_parts.extend(_transition_parts(loop_clips[idx], next_clip if idx + 1 < num_images else None,
+                                             transition, duration, transition_duration, renderer, pair))
+    final_loop = _concatenate(final_parts)
+
+    if remainder < epsilon:
+        repeats = full_loops - 1
+    else:
+        repeats = full_loops
+        final_loop = final_loop.subclip(0, remainder)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        parts, durations = [], []
+        if repeats > 0:
+            loop_path = os.path.join(workdir, "loop.mp4")
+            logger.info("Рендер одного круга (%d изображений) для повтора %d раз", num_images, repeats)
+            loop_length = _write_part(_concatenate(wrap_parts), loop_path, fps, export,
+                                      workdir, plan_for(True) if plan_for else None)
+            parts.extend([loop_path] * repeats)
+            durations.extend([loop_length] * repeats)
+
+        final_path = os.path.join(workdir, "final.mp4")
+        durations.append(_write_part(final_loop, final_path, fps, export, workdir,
+                                     plan_for(False) if plan_for else None))
+        parts.append(final_path)
+
+        audio_path = _write_audio_track(audio_clip, workdir) if audio_clip else None
+
+        logger.info("Экспорт видео: %s", output_path)
+        concat_copy(parts, output_path, audio_path=audio_path, duration=total_duration, durations=durations)
+
+
+def _render_chunk(task):
+    """
+    Рендерит и кодирует в отдельный файл один клип таймлайна: изображение и переход к следующему.
+    Выполняется в рабочем процессе; клипы строятся так же, как при обычном рендере.
+    """
+    chunk, arrays, overlay, params, path = task
+    duration, fps = params["duration"], params["fps"]
+    source = _FrameStore([Image.fromarray(np.asarray(arr)) for arr in arrays])
+    clips = [_make_source_clip(source, idx, duration, fps, params["zoom_factor"], params["zoom_out_factor"],
+                               overlay, size=params["size"], resample=params["resample"])
+             for idx in range(len(arrays))]
+    pair = (0, 1) if not params["animated"] else None
+    parts = _transition_parts(clips[0], clips[1] if len(clips) > 1 else None, params["transition"], duration,
+                              params["transition_duration"], TransitionRenderer(), pair)
+    video = profiled_clip(_concatenate(parts))
+
+    # Время кадра на общей сетке минус начало клипа в таймлайне
+    offset = chunk.clip * duration
+    frames = (video.get_frame(max(k * (1.0 / fps) - offset, 0.0)) for k in range(chunk.start_frame, chunk.end_frame))
+
+    # Клип пишется под временным именем и переименовывается только целиком:
+    # недописанный при сбое файл никогда не считается готовым
+    tmp_path = os.path.splitext(path)[0] + ".part.mp4"
+    encode_frames(frames, video.size, fps, tmp_path, **params["export"])
+    os.replace(tmp_path, path)
+    logger.debug("Клип #%d закодирован: %s", chunk.clip, path)
+    return path
+
+
+def _write_chunks(source, overlays, chunks, params, output_path, workers=1, audio_clip=None, parts_dir=None,
+                  keep_parts=True):
+    """
+    Кодирует клипы таймлайна в отдельные файлы (каждый начинается с ключевого кадра)
+    и склеивает их concat-демультиплексором без перекодирования; аудио добавляется один раз при склейке.
+
+    Файл клипа называется по его отпечатку: одинаковые клипы кругов кодируются один раз.
+    workers > 1 — клипы рендерятся в пуле процессов. parts_dir — каталог клипов между запусками:
+    готовые клипы отмечаются в журнале, и повторный запуск кодирует только недостающие или изменившиеся.
+    keep_parts=False (только возобновление после сбоя) — каталог удаляется после успешной склейки.
+    """
+    fps = params["fps"]
+    image_digests = {}
+    for chunk in chunks:
+        for idx in (chunk.image, chunk.next_image):
+            if idx is not None and idx not in image_digests:
+                image_digests[idx] = array_digest(source.get_array(idx))
+    fingerprints = [chunk_fingerprint(chunk, image_digests,
+                                      overlays[chunk.image].fingerprint() if overlays and overlays[chunk.image]
+                                      else None, params)
+                    for chunk in chunks]
+    file_names = ["clip_%s.mp4" % fingerprint[:24] for fingerprint in fingerprints]
+
+    with (nullcontext(parts_dir) if parts_dir else tempfile.TemporaryDirectory()) as workdir:
+        os.makedirs(workdir, exist_ok=True)
+        previous = completed_parts(workdir) if parts_dir else set()
+        journal = RenderJournal(workdir) if parts_dir else None
+
+        # Кодируем каждый уникальный клип, если его нет среди готовых файлов прошлого рендера
+        todo, seen = [], set()
+        for chunk, fingerprint, name in zip(chunks, fingerprints, file_names):
+            if name in seen:
+                continue
+            seen.add(name)
+            path = os.path.join(workdir, name)
+            if fingerprint in previous and os.path.isfile(path):
+                continue
+            todo.append((chunk, fingerprint, path))
+        logger.info("Клипов: %d, уникальных: %d, кодируется: %d", len(chunks), len(seen), len(todo))
+
+        def on_done(fingerprint, path):
+            if journal:
+                journal.record(fingerprint, path)
+
+        def make_task(chunk, path):
+            images = [chunk.image] + ([chunk.next_image] if chunk.next_image is not None else [])
+            arrays = [np.asarray(source.get_array(idx)) for idx in images]
+            overlay = overlays[chunk.image] if overlays else None
+            return chunk, arrays, overlay, params, path
+
+        if workers > 1 and len(todo) > 1:
+            _render_chunks_parallel(todo, make_task, workers, on_done)
+        else:
+            for chunk, fingerprint, path in todo:
+                _render_chunk(make_task(chunk, path))
+                on_done(fingerprint, path)
+
+        paths = [os.path.join(workdir, name) for name in file_names]
+        durations = [segment_duration(chunk, fps) for chunk in chunks]
+        audio_path = _write_audio_track(audio_clip, workdir) if audio_clip else None
+        concat_copy(paths, output_path, audio_path=audio_path, duration=sum(durations) if audio_path else None,
+                    durations=durations)
+
+        if parts_dir and not keep_parts:
+            shutil.rmtree(workdir)
+        elif parts_dir:
+            save_manifest(workdir, chunks, fingerprints, file_names)
+            journal.clear()
+            if audio_path and not isinstance(audio_clip, AudioTrack):
+                os.remove(audio_path)
+            # Файлы клипов, которых нет в новом таймлайне, больше не нужны
+            for name in os.listdir(workdir):
+                if name.startswith("clip_") and name.endswith(".mp4") and name not in seen:
+                    os.remove(os.path.join(workdir, name))
+
+
+def _init_chunk_worker(log_queue, log_level):
+    # Профилировщик и сбор метрик, унаследованные от основного процесса при fork, в рабочем процессе
+    # выключаются: их результат остался бы в памяти рабочего процесса. Гистограммы кадров
+    # собираются заново для каждого клипа в _render_chunk_timed и возвращаются в основной процесс
+    _init_worker(log_queue, log_level)
+    stop_profile()
+    stop_run()
+
+
+def _render_chunk_timed(task, collect_frames):
+    """Рендерит клип в рабочем процессе (см. _render_chunk); возвращает путь и гистограммы времени кадра клипа."""
+    run = start_run() if collect_frames else None
+    try:
+        path = _render_chunk(task)
+    finally:
+        stop_run()
+    return path, run.frames if run else {}
+
+
+def _render_chunks_parallel(todo, make_task, workers, on_done):
+    """
+    Рендерит клипы в пуле процессов; логи рабочих процессов передаются в основной.
+    on_done(fingerprint, path) вызывается в основном процессе по готовности каждого клипа;
+    гистограммы времени кадра рабочих процессов добавляются в активный сбор метрик.
+    """
+    collect_frames = collecting()
+    logger.info("Параллельное кодирование: %d клипов, %d процессов", len(todo), workers)
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, _ForwardToLoggerHandler())
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker,
+                                 initargs=(log_queue, logger.getEffectiveLevel())) as executor:
+            # В очереди не больше двух задач на процесс, чтобы не держать в памяти кадры всех клипов
+            pending = {}
+
+            def collect(done):
+                # Готовые клипы отмечаются до того, как всплывёт ошибка соседнего
+                errors = []
+                for future in done:
+                    fingerprint = pending.pop(future)
+                    if future.exception() is not None:
+                        errors.append(future.exception())
+                    else:
+                        path, frames = future.result()
+                        merge_frames(frames)
+                        on_done(fingerprint, path)
+                if errors:
+                    raise errors[0]
+
+            for chunk, fingerprint, path in todo:
+                if len(pending) >= 2 * workers:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                pending[executor.submit(_render_chunk_timed, make_task(chunk, path), collect_frames)] = fingerprint
+            collect(wait(pending).done)
+    finally:
+        listener.stop()
+
+
 # Основная функция сборки видео
 def create_video_from_images(images, duration, fps, output_path, bitrate=None, crf=None,
                              audio_clip=None, transition="fade", transition_duration=0.5,
-                             zoom_factor=0.0, zoom_out_factor=0.0, overlays=None):
+                             zoom_factor=0.0, zoom_out_factor=0.0, overlays=None,
+                             spill_frames=False, reuse_loops=False, still_fastpath=False, encode_workers=1,
+                             parts_dir=None, keep_parts=True, size=TARGET_SIZE, resample=Image.LANCZOS,
+                             preset="medium", memory_plan=None):
+    # size — размер кадра (изображения уже подготовлены в этом размере), resample — фильтр zoom,
+    # preset — пресет x264 (быстрый для черновика), memory_plan — MemoryPlan для рендера под бюджет памяти
     clips = []
-    temp_files = []
 
     logger.info(
         "Параметры: fps=%s, duration=%.2f, transition_duration=%.2f, zoom_factor=%.2f, zoom_out_factor=%.2f",
@@ -84,17 +477,28 @@ def create_video_from_images(images, duration, fps, output_path, bitrate=None, c
         logger.error("Список изображений пуст.")
         return
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # Сохраняем изображения во временные файлы
-        for idx, img in enumerate(images):
-            path = os.path.join(tmpdir, f"frame_{idx:03d}.png")
-            img.save(path)
-            temp_files.append(path)
+    # Ленивый источник отдаёт кадры сам; список изображений переводится в массивы один раз.
+    # Временный каталог нужен только в режиме экономии памяти (spill_frames).
+    # Под бюджетом памяти ленивый источник тоже выгружается на диск: каждое изображение декодируется
+    # один раз, а декодированными остаются только memory_plan.max_resident кадров.
+    lazy = isinstance(images, LazyImageSource)
+    spill = (spill_frames and not lazy) or bool(memory_plan and memory_plan.spill)
+    max_resident = memory_plan.max_resident if memory_plan else None
+
+    with (tempfile.TemporaryDirectory() if spill else nullcontext()) as tmpdir:
+        source = images if lazy and not spill else _FrameStore(images, spill_dir=tmpdir, max_resident=max_resident)
+        # Оверлей готовится к наложению один раз (обычно это один и тот же слой для всех изображений)
+        if overlays:
+            compositors = {}
+            overlays = [compositors.setdefault(id(overlay), _as_compositor(overlay, size)) for overlay in overlays]
+        if spill:
+            logger.info("Кадры выгружены во временный каталог: %s", tmpdir)
 
         num_images = len(images)
         single_loop_duration = num_images * duration
 
-        # Вычисляем количество повторов, если длительность аудио больше одного круга
+        # Вычисляем количество повторов, если длительность аудио больше одного круга.
+        # audio_clip — AudioClip moviepy или готовая дорожка AudioTrack (склеивается без перекодирования)
         if audio_clip:
             total_duration = audio_clip.duration
             epsilon = 1e-6
@@ -105,77 +509,100 @@ def create_video_from_images(images, duration, fps, output_path, bitrate=None, c
         else:
             num_loops = 1
 
-        # Генерируем клипы с применением эффектов
-        for loop_idx in range(num_loops):
-            for idx in range(num_images):
-                path = temp_files[idx]
+        export = _export_params(crf, bitrate, preset)
 
-                if zoom_factor is not None and zoom_factor > 0:
-                    base_img = Image.open(path).convert("RGB")
-                    overlay = overlays[idx] if overlays else None
-                    clip = VideoClip(
-                        make_zoom_in_frame_factory(base_img, overlay, zoom_factor, duration),
-                        duration=duration
-                    ).set_fps(fps)
+        # Режим неподвижных кадров: отрезки без изменений кодируются одним удерживаемым кадром
+        animated = bool(zoom_factor and zoom_factor > 0) or bool(zoom_out_factor and zoom_out_factor > 0)
+
+        renderer = TransitionRenderer(memory_plan.memo_bytes) if memory_plan else TransitionRenderer()
 
-                elif zoom_out_factor is not None and zoom_out_factor > 0:
-                    base_img = Image.open(path).convert("RGB")
+        def plan_for(num_clips, last_has_transition=False):
+            return lambda video: plan_segments(num_clips, duration, fps, transition, transition_duration,
+                                               animated, video.duration, last_has_transition)
+
+        # Кодирование по клипам: параллельно (encode_workers) и/или инкрементально (parts_dir)
+        if parts_dir or (encode_workers and encode_workers > 1):
+            if still_fastpath:
+                logger.warning("Режим неподвижных кадров (--still-fastpath) не применяется при кодировании "
+                               "по клипам (--encode-workers > 1, --incremental, --resume): все кадры рендерятся")
+            if reuse_loops:
+                logger.warning("Повтор кругов (--reuse-loops) не применяется при кодировании по клипам: "
+                               "повторы круга не копируются целиком, одинаковые клипы кодируются один раз")
+            total_duration = audio_clip.duration if audio_clip else num_loops * single_loop_duration
+            chunks = plan_clip_chunks(num_images, num_loops * num_images, duration, fps, total_duration)
+            params = dict(duration=duration, fps=fps, transition=transition,
+                          transition_duration=transition_duration, zoom_factor=zoom_factor,
+                          zoom_out_factor=zoom_out_factor, animated=animated, export=export, size=tuple(size),
+                          resample=resample)
+            logger.info("Экспорт видео (кодирование по клипам): %s", output_path)
+            with span("encode"):
+                _write_chunks(source, overlays, chunks, params, output_path, encode_workers or 1, audio_clip,
+                              parts_dir, keep_parts)
+            return
+
+        # Повтор уже закодированного круга вместо построения клипов для каждого повтора
+        if reuse_loops and num_loops > 1:
+            loop_clips = [_make_source_clip(source, idx, duration, fps, zoom_factor, zoom_out_factor,
+                                            overlays[idx] if overlays else None, size=size, resample=resample)
+                          for idx in range(num_images)]
+            loop_plan = partial(plan_for, num_images) if still_fastpath else None
+            with span("encode"):
+                _write_reused_loops(loop_clips, total_duration, duration, fps, output_path, export,
+                                    audio_clip, transition, transition_duration, loop_plan,
+                                    renderer=renderer, static_clips=not animated)
+            return
+
+        with span("build_clips"):
+            # Генерируем клипы с применением эффектов
+            for loop_idx in range(num_loops):
+                for idx in range(num_images):
                     overlay = overlays[idx] if overlays else None
-                    clip = VideoClip(
-                        make_zoom_out_frame_factory(base_img, overlay, zoom_out_factor, duration),
-                        duration=duration
-                    ).set_fps(fps)
-
-                else:
-                    # Без zoom-эффекта
-                    clip = ImageClip(path).set_duration(duration)
-
-                clips.append(clip)
-                logger.debug("Обработано изображение %s", path)
-
-        # Применяем переходы между кадрами
-        final_clips = []
-        for i in range(len(clips) - 1):
-            c1, c2 = clips[i], clips[i + 1]
-            if transition == "none":
-                final_clips.append(c1)
-            elif transition == "fade":
-                final_clips.append(c1.fadein(transition_duration).fadeout(transition_duration))
-            elif transition == "slide":
-                main_part = c1.set_duration(duration - transition_duration)
-                slide = slide_transition(c1.set_duration(transition_duration),
-                                         c2.set_duration(transition_duration),
-                                         duration=transition_duration)
-                final_clips.append(main_part)
-                final_clips.append(slide)
-            elif transition == "push":
-                main_part = c1.set_duration(duration - transition_duration)
-                push = push_transition(c1.set_duration(transition_duration),
-                                       c2.set_duration(transition_duration),
-                                       duration=transition_duration)
-                final_clips.append(main_part)
-                final_clips.append(push)
-
-        final_clips.append(clips[-1].set_duration(duration))  # Последний кадр
-
-        video = concatenate_videoclips(final_clips, method="compose")
+                    clip = _make_source_clip(source, idx, duration, fps, zoom_factor, zoom_out_factor, overlay,
+                                             size=size, resample=resample)
+                    clips.append(clip)
+                    logger.debug("Подготовлен клип для изображения #%d", idx)
+
+            # Применяем переходы между кадрами; кадры переходов между неподвижными изображениями
+            # запоминаются по паре изображений и повторно используются в следующих кругах
+            final_clips = []
+            for i in range(len(clips)):
+                next_clip = clips[i + 1] if i + 1 < len(clips) else None
+                pair = (i % num_images, (i + 1) % num_images) if not animated else None
+                final_clips.extend(_transition_parts(clips[i], next_clip, transition, duration,
+                                                     transition_duration, renderer, pair))
+
+            video = profiled_clip(_concatenate(final_clips))
+
+        if still_fastpath:
+            if audio_clip:
+                video = video.set_duration(audio_clip.duration)
+            with tempfile.TemporaryDirectory() as workdir:
+                audio_path = _write_audio_track(audio_clip, workdir) if audio_clip else None
+                logger.info("Экспорт видео (режим неподвижных кадров): %s", output_path)
+                with span("encode"):
+                    write_segmented(video, output_path, fps, export, plan_for(len(clips))(video), workdir,
+                                    audio_path=audio_path)
+            return
 
         # Установка длительности в соответствие с аудио
         if audio_clip:
             video = video.set_duration(audio_clip.duration)
+
+        # Готовая дорожка не декодируется вместе с кадрами: видео пишется без звука и склеивается с ней
+        if isinstance(audio_clip, AudioTrack):
+            with tempfile.TemporaryDirectory() as workdir:
+                video_path = os.path.join(workdir, "video.mp4")
+                logger.info("Экспорт видео: %s", output_path)
+                with span("encode"):
+                    video.write_videofile(video_path, fps=fps, audio=False, **export)
+                with span("mux_audio"):
+                    mux_audio(video_path, audio_clip.path, output_path, duration=audio_clip.duration)
+            return
+
+        if audio_clip:
             logger.info("Добавлена аудиодорожка длительностью %.2f сек", audio_clip.duration)
             video = video.set_audio(audio_clip)
 
-        # Подготовка параметров экспорта
-        ffmpeg_params = []
-        if crf is not None:
-            ffmpeg_params.extend(["-crf", str(crf)])
-
         logger.info("Экспорт видео: %s", output_path)
-        video.write_videofile(
-            output_path,
-            fps=fps,
-            codec="libx264",
-            bitrate=None if crf is not None else bitrate,
-            ffmpeg_params=ffmpeg_params
-        )
+        with span("encode"):
+            video.write_videofile(output_path, fps=fps, **export)